@@ -3,77 +3,2004 @@
 #
 #############################################################
 
-from dotenv import dotenv_values
-import gitlab
-from gitlab.v4.objects.projects import Project
+# python-gitlab, requests and dotenv are imported inside the functions that use
+# them, so `--help` and argument errors return without loading them.
 
+from typing import TYPE_CHECKING
+
+from . import cache as variable_cache
+from . import validation
+from .patterns import DEFAULT_MASK_PATTERNS, Matcher, PatternError, selected
 from .gitlab_server import gitlab_client
+from .metrics import RequestMetrics, format_summary
+from .variables import PER_PAGE, iter_variables
 import click
+import json
 import os
-from traceback import print_exc
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exc
 import logging
 
-logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s %(levelname)s\t%(message)s',
-        datefmt='%Y-%m-%d_%H:%M:%S',
-        handlers=[
-            logging.StreamHandler()
-        ],
-    )
+if TYPE_CHECKING:
+    from gitlab.v4.objects.projects import Project
+
 logger = logging.getLogger()
 
 @click.group()
 def cli():
+    # Configured here rather than at import so importing the module has no side effects
+    logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s %(levelname)s\t%(message)s',
+            datefmt='%Y-%m-%d_%H:%M:%S',
+            handlers=[
+                logging.StreamHandler()
+            ],
+        )
+
+
+def _write_variable(gitlabProject, environment, key, value, should_mask, project_var, protected=None,
+                    attributes=None):
+    """Create or update a single variable. ``protected`` is set on the variable unless it is None,
+    and any other ``attributes``, e.g. ``variable_type``, are set as given.
+
+    Returns ``(environment, key, is_update, error)`` where ``error`` is None on success or a
+    ``(message, traceback)`` pair, so results can be reported in order by the caller.
+    """
+    import gitlab
+
+    is_update = project_var is not None
+
+    try:
+        if is_update:
+            new_data = {"value": value}
+            if should_mask:
+                new_data["masked"] = True
+            if protected is not None:
+                new_data["protected"] = protected
+            new_data.update(attributes or {})
+            gitlabProject.variables.update(key, new_data, filter={'environment_scope': environment})
+        else:
+            payload = {
+                "key": key,
+                "value": value,
+                "environment_scope": environment,
+            }
+
+            if should_mask:
+                payload["masked"] = True
+            if protected is not None:
+                payload["protected"] = protected
+            payload.update(attributes or {})
+
+            logger.debug(payload)
+
+            gitlabProject.variables.create(payload)
+    except gitlab.exceptions.GitlabHttpError:
+        return environment, key, is_update, ("Failed to write {} due to error from Gitlab API".format(key), format_exc())
+    except gitlab.exceptions.GitlabError:
+        return environment, key, is_update, ("Failed to write {} due to unexpected Gitlab error".format(key), format_exc())
+
+    return environment, key, is_update, None
+
+
+def _delete_variable(gitlabProject, environment, key):
+    """Delete a single variable from one scope.
+
+    Returns ``(environment, key, error)`` with ``error`` as in `_write_variable`.
+    """
+    import gitlab
+
+    try:
+        gitlabProject.variables.delete(key, filter={'environment_scope': environment})
+    except gitlab.exceptions.GitlabHttpError:
+        return environment, key, ("Failed to delete {} due to error from Gitlab API".format(key), format_exc())
+    except gitlab.exceptions.GitlabError:
+        return environment, key, ("Failed to delete {} due to unexpected Gitlab error".format(key), format_exc())
+
+    return environment, key, None
+
+
+def _index_variables(existing_vars):
+    # Index existing vars by (environment_scope, key) so each lookup is O(1)
+    # and always resolves to the variable in the target scope
+    existing_by_scope_key = {
+        (v.environment_scope, v.key): v for v in existing_vars
+    }
+    logger.debug(list(existing_by_scope_key))
+    return existing_by_scope_key
+
+
+def _plan_writes(env_values, existing_by_scope_key, environment, include, exclude, mask_patterns):
+    """Diff .env values against the indexed project variables.
+
+    Returns ``(pending, unchanged)`` where each pending entry is
+    ``(environment, key, value, should_mask, project_var)`` and ``project_var``
+    is the existing variable when the entry is an update.
+    """
+    pending = []
+    unchanged = 0
+
+    for key, value in env_values.items():
+        if len(include) > 0 and key not in include:
+            continue
+
+        if key in exclude:
+            logger.info("Skipping {}".format(key))
+            continue
+
+        should_mask = key in mask_patterns
+        project_var = existing_by_scope_key.get((environment, key))
+
+        if project_var is not None:
+            # Masking is one-way, so an already-masked var never counts as changed
+            if project_var.value == value and (project_var.masked or not should_mask):
+                logger.debug("Unchanged {}".format(key))
+                unchanged += 1
+                continue
+
+        pending.append((environment, key, value, should_mask, project_var))
+
+    return pending, unchanged
+
+
+def _plan_deletions(targets, existing_vars, include, exclude):
+    """Remote-only keys to prune: variables scoped to a target's environment whose
+    key isn't in its .env values. ``include``/``exclude`` apply as for writes, so
+    keys left out of a write are never deleted either. Returns ``(environment, key)`` pairs."""
+    deletions = []
+    for environment, env_values in targets:
+        for variable in existing_vars:
+            if variable.environment_scope != environment or variable.key in env_values:
+                continue
+            if len(include) > 0 and variable.key not in include:
+                continue
+            if variable.key in exclude:
+                continue
+            deletions.append((environment, variable.key))
+    return sorted(deletions)
+
+
+def _show_deletions(deletions, prefix=""):
+    click.secho(f"{prefix}Pruning {len(deletions)} variable(s) missing from the .env file:", fg="yellow")
+    for environment, key in deletions:
+        click.secho(f"{prefix}  [{environment}] {key}", fg="yellow")
+
+
+def _show_violations(violations, prefix=""):
+    count = len({(v.environment, v.key) for v in violations})
+    click.secho(f"{prefix}{count} variable(s) would be rejected by Gitlab:", fg="red")
+    for environment, key, reason in violations:
+        click.secho(f"{prefix}  [{environment}] {key}: {reason}", fg="red")
+
+
+def _validate_pending(pending, strict=False, prefix=""):
+    """Check pending writes locally, reporting every problem in one batch.
+
+    Returns ``(valid, skipped)``: the writes to send and how many were left
+    out. With ``strict``, raises `validation.ValidationError` instead of
+    leaving any out, before anything is written.
+    """
+    valid, violations = validation.validate(pending)
+    skipped = len(pending) - len(valid)
+    if violations:
+        _show_violations(violations, prefix)
+        if strict:
+            raise validation.ValidationError(
+                f"{prefix}{skipped} variable(s) failed validation, nothing was written"
+            )
+        logger.info(prefix + "Skipping {} invalid variable(s)".format(skipped))
+    return valid, skipped
+
+
+def _preflight(targets, include, exclude, mask_patterns):
+    """Validate every write the targets could need, before any request is made.
+
+    Raises `click.ClickException` on any problem.
+    """
+    pending = [
+        (environment, key, value, key in mask_patterns, None)
+        for environment, env_values in targets
+        for key, value in env_values.items()
+        if selected(key, include, exclude)
+    ]
+    _, violations = validation.validate(pending)
+    if violations:
+        _show_violations(violations)
+        raise click.ClickException("Variables failed validation, nothing was written")
+
+
+def _open_journals(gitlab_url, project, targets, include, exclude, mask_patterns):
+    """One checkpoint journal per target environment, keyed by environment."""
+    from .journal import Journal
+
+    options = [sorted(include), sorted(exclude), list(mask_patterns)]
+    return {
+        environment: Journal.for_target(gitlab_url, project, environment, env_values, options)
+        for environment, env_values in targets
+    }
+
+
+def _resume_targets(targets, journals, resume):
+    """Pick up targets from their journals when resuming.
+
+    Returns ``(pending, already_written, to_diff)``: writes left over from an
+    interrupted run, how many keys it already wrote, and the targets with no
+    usable journal, which still need a fresh diff.
+    """
+    from .journal import remaining_writes
+
+    pending = []
+    already_written = 0
+    to_diff = []
+
+    for environment, env_values in targets:
+        journal = journals[environment]
+        state = journal.load() if resume else None
+        if state is None:
+            to_diff.append((environment, env_values))
+            continue
+
+        plan, written = state
+        remaining = remaining_writes(plan, written, env_values)
+        logger.info("Resuming {} from journal: {} already written, {} remaining".format(
+            environment, len(written), len(remaining)
+        ))
+        journal.resume()
+        pending.extend(remaining)
+        already_written += len(written)
+
+    return pending, already_written, to_diff
+
+
+def _plan_targets(targets, existing_vars, include, exclude, mask_patterns, journals=None):
+    """Diff several ``(environment, env_values)`` targets against one listing,
+    starting a journal for each target that has writes to make, if ``journals`` are given."""
+    existing_by_scope_key = _index_variables(existing_vars)
+    pending = []
+    unchanged = 0
+
+    for environment, env_values in targets:
+        target_pending, target_unchanged = _plan_writes(
+            env_values, existing_by_scope_key, environment, include, exclude, mask_patterns,
+        )
+        if target_pending and journals is not None:
+            journals[environment].start(target_pending)
+        pending.extend(target_pending)
+        unchanged += target_unchanged
+
+    return pending, unchanged
+
+
+def _journal_result(journals, result):
+    """Record a successful write in its target's journal. Returns the result unchanged."""
+    environment, key, _, error = result
+    if error is None:
+        journals[environment].record(environment, key)
+    return result
+
+
+def _finish_journals(journals, failed):
+    # Journals are only needed while keys are outstanding
+    for journal in journals.values():
+        if failed:
+            journal.close()
+        else:
+            journal.complete()
+
+
+def _report_delete_results(results, prefix=""):
+    """Log per-key delete results in order. Returns ``(deleted, failed)``."""
+    deleted = 0
+    failed = 0
+
+    for environment, key, error in results:
+        if error is not None:
+            message, tb = error
+            logger.info(prefix + message)
+            sys.stderr.write(tb)
+            failed += 1
+            continue
+
+        deleted += 1
+        logger.info(prefix + "Deleted variable {} in environment {}".format(key, environment))
+
+    return deleted, failed
+
+
+def _report_write_results(results, prefix=""):
+    """Log per-key write results in order. Returns ``(updated, created, failed)``."""
+    updated = 0
+    created = 0
+    failed = 0
+
+    for environment, key, is_update, error in results:
+        if error is not None:
+            message, tb = error
+            logger.info(prefix + message)
+            sys.stderr.write(tb)
+            failed += 1
+            continue
+
+        if is_update:
+            updated += 1
+        else:
+            created += 1
+
+        logger.info(
+            prefix + "Wrote {} variable {} to Gitlab API in environment {}".format(
+                "updated" if is_update else "new", key, environment
+            )
+        )
+
+    return updated, created, failed
+
+
+def _require_async_engine():
+    try:
+        from . import async_engine
+    except ImportError:
+        raise click.ClickException(
+            'The async engine requires httpx: pip install "populate-secrets-gitlab[async]"'
+        )
+    return async_engine
+
+
+def _start_metrics(timings, metrics_json):
+    """Returns a `RequestMetrics` that is reported when the command exits, or None
+    when neither ``--timings`` nor ``--metrics-json`` was given."""
+    if not timings and not metrics_json:
+        return None
+
+    metrics = RequestMetrics()
+
+    def report():
+        if timings:
+            click.echo(format_summary(metrics.summary()), err=True)
+        if metrics_json:
+            with open(metrics_json, "w") as f:
+                json.dump(metrics.to_json(), f, indent=2)
+
+    # Runs on success and on failure, so slow or failing runs can be inspected too
+    click.get_current_context().call_on_close(report)
+    return metrics
+
+
+def _check_api(engine, api):
+    if engine == "async" and api == "graphql":
+        raise click.UsageError("--api graphql is only supported by the default engine")
+
+
+def _load_project_variables_async(gitlab_host, gitlab_token, project, debug, metrics=None):
+    """Returns ``(project, variables)`` where variables is a lazy iterator over the listing."""
+    import gitlab
+
+    async_engine = _require_async_engine()
+    if debug:
+        logging.getLogger("httpx").setLevel(logging.DEBUG)
+
+    try:
+        return async_engine.iter_project_variables(gitlab_host, gitlab_token, project, metrics=metrics)
+    except gitlab.exceptions.GitlabHttpError:
+        raise click.ClickException("Could not find project: {}".format(project))
+
+
+def _open_cache(gitlab_host, gitlab_token, no_cache):
+    if no_cache:
+        return None
+    return variable_cache.Cache(gitlab_host, gitlab_token)
+
+
+def _lazy_project(gitlabClient, project_id, name):
+    from gitlab.v4.objects.projects import Project
+
+    # A lazy object is enough to reach the variables API without a request
+    return Project(gitlabClient.projects, {"id": project_id, "name": name}, lazy=True)
+
+
+def _get_project(gitlabClient, project, cache):
+    """Look up a project, reusing its cached ID and name when available.
+
+    Raises `gitlab.exceptions.GitlabHttpError` if the project cannot be found.
+    """
+    if cache is not None:
+        cached = cache.get_project(project)
+        if cached is not None:
+            return _lazy_project(gitlabClient, cached["id"], cached["name"])
+
+    gitlabProject = gitlabClient.projects.get(id=project)
+    if cache is not None and gitlabProject:
+        cache.set_project(project, gitlabProject.id, gitlabProject.name)
+    return gitlabProject
+
+
+def _list_variables(gitlabClient, gitlabProject, cache, max_age=None):
+    if cache is None:
+        return iter_variables(gitlabClient, gitlabProject.id)
+    return variable_cache.iter_cached_variables(gitlabClient, cache, gitlabProject.id, max_age=max_age)
+
+
+def _load_project_variables(gitlabClient, project, cache, api, max_age=None, cache_listing=True):
+    """Look up a project and list its variables through the chosen API.
+
+    Returns ``(project, variables)``. The GraphQL path falls back to REST when
+    the server can't answer the query, e.g. on Gitlab versions without it.
+    With ``cache_listing`` false only the project lookup uses the cache, so
+    the listing, values included, is never written to disk.
+    """
+    if api == "graphql":
+        from . import graphql
+
+        try:
+            gitlabProject, variables = graphql.iter_project_variables(gitlabClient, project)
+        except graphql.GraphqlError as e:
+            logger.warning(f"GraphQL listing failed, falling back to REST: {e}")
+        else:
+            return _lazy_project(gitlabClient, gitlabProject.id, gitlabProject.name), variables
+
+    gitlabProject = _get_project(gitlabClient, project, cache)
+    if not gitlabProject:
+        return None, None
+    listing_cache = cache if cache_listing else None
+    return gitlabProject, _list_variables(gitlabClient, gitlabProject, listing_cache, max_age=max_age)
+
+
+def _in_environment(variable, environment):
+    """Whether a variable applies to the environment, i.e. is scoped to it or global."""
+    scope = "global" if variable.environment_scope == "*" else variable.environment_scope
+    return scope == environment or scope == "global"
+
+
+class ProjectNotFoundError(Exception):
     pass
 
+
+def _env_dir_files(env_dir):
+    """``(environment, path)`` pairs for each `<environment>.env` file in a directory."""
+    env_files = []
+    for name in sorted(os.listdir(env_dir)):
+        path = os.path.join(env_dir, name)
+        if name.endswith(".env") and name != ".env" and os.path.isfile(path):
+            scope = name[:-len(".env")]
+            env_files.append(("*" if scope == "global" else scope, path))
+    return env_files
+
+
+def _read_projects_file(path):
+    """Project paths or IDs from a file, one per line; blank lines and `#` comments are ignored."""
+    with open(path) as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def _key_filters(include, exclude):
+    """Compile ``--include``/``--exclude`` CSV patterns into matchers."""
+    try:
+        include = Matcher.from_csv(include)
+        exclude = Matcher.from_csv(exclude)
+    except PatternError as e:
+        raise click.UsageError(str(e))
+
+    if include:
+        logger.info("Including: {}".format("; ".join(include)))
+    if exclude:
+        logger.info("Excluding: {}".format("; ".join(exclude)))
+    return include, exclude
+
+
+def _mask_matcher(mask, mask_rules):
+    """Masking rules from ``--mask-rules``, the default ones with ``--mask``, or none."""
+    if mask_rules:
+        try:
+            return Matcher.from_file(mask_rules)
+        except PatternError as e:
+            raise click.UsageError(f"{mask_rules}: {e}")
+    return Matcher(DEFAULT_MASK_PATTERNS if mask else ())
+
+
+def _write_project(gitlabClient, cache, project, targets, include, exclude, mask_patterns,
+                   concurrency, api="rest", resume=False, prune=False, strict=False, prefix=""):
+    """Diff and write one project's variables for each ``(environment, env_values)``
+    target. Returns ``(unchanged, updated, created, deleted, failed)``.
+
+    With ``resume``, targets left incomplete by an earlier run carry on from
+    their journal instead of being diffed again. With ``prune``, variables in a
+    target's scope that its .env values lack are deleted after the writes.
+    Writes Gitlab would reject are skipped and counted as failed, or with
+    ``strict`` raise `validation.ValidationError` before anything is written.
+    """
+    import gitlab
+
+    gitlabProject: "Project"
+
+    journals = _open_journals(gitlabClient.url, project, targets, include, exclude, mask_patterns)
+    pending, unchanged, to_diff = _resume_targets(targets, journals, resume)
+
+    try:
+        if to_diff or prune:
+            # Get all existing vars
+            # Always revalidate before diffing, so a stale listing can't hide a change
+            gitlabProject, gl_project_vars = _load_project_variables(
+                gitlabClient, project, cache, api, max_age=0
+            )
+        else:
+            # Every target resumes from its journal, so there is nothing to list
+            gitlabProject = _get_project(gitlabClient, project, cache)
+    except (gitlab.exceptions.GitlabHttpError, gitlab.exceptions.GitlabGetError):
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    if not gitlabProject:
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    deletions = []
+    if to_diff or prune:
+        gl_project_vars = list(gl_project_vars)
+        logger.debug(gl_project_vars)
+
+        # Work out which keys actually need a request before touching the API
+        diff_pending, diff_unchanged = _plan_targets(
+            to_diff, gl_project_vars, include, exclude, mask_patterns, journals,
+        )
+        pending.extend(diff_pending)
+        unchanged += diff_unchanged
+
+    try:
+        pending, skipped = _validate_pending(pending, strict, prefix)
+    except validation.ValidationError:
+        _finish_journals(journals, failed=True)
+        raise
+
+    if prune:
+        deletions = _plan_deletions(targets, gl_project_vars, include, exclude)
+        if deletions:
+            _show_deletions(deletions, prefix)
+
+    # Dispatch writes through a bounded pool sharing the one client session.
+    # `map` yields results in submission order, so logging stays deterministic.
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = executor.map(
+                lambda item: _journal_result(journals, _write_variable(gitlabProject, *item)),
+                pending,
+            )
+            updated, created, failed = _report_write_results(results, prefix)
+    except BaseException:
+        # An interrupted run leaves its journals behind for --resume
+        _finish_journals(journals, failed=True)
+        raise
+    failed += skipped
+    _finish_journals(journals, failed)
+
+    # Deletions go through the same bounded, rate-limited pool as the writes
+    deleted = 0
+    if deletions:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = executor.map(lambda item: _delete_variable(gitlabProject, *item), deletions)
+            deleted, delete_failed = _report_delete_results(results, prefix)
+        failed += delete_failed
+
+    if cache is not None and (pending or deletions):
+        cache.invalidate_listing(gitlabProject.id)
+
+    return unchanged, updated, created, deleted, failed
+
+
+async def _write_project_async(gl, project, targets, include, exclude, mask_patterns, resume=False,
+                               prune=False, strict=False, prefix="", cache=None):
+    """Async engine counterpart of `_write_project`."""
+    import gitlab
+
+    journals = _open_journals(gl.url, project, targets, include, exclude, mask_patterns)
+    pending, unchanged, to_diff = _resume_targets(targets, journals, resume)
+
+    try:
+        gitlabProject = await gl.get_project(project)
+    except gitlab.exceptions.GitlabHttpError:
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    deletions = []
+    if to_diff or prune:
+        gl_project_vars = await gl.list_variables(gitlabProject.id)
+        diff_pending, diff_unchanged = _plan_targets(
+            to_diff, gl_project_vars, include, exclude, mask_patterns, journals,
+        )
+        pending.extend(diff_pending)
+        unchanged += diff_unchanged
+
+    try:
+        pending, skipped = _validate_pending(pending, strict, prefix)
+    except validation.ValidationError:
+        _finish_journals(journals, failed=True)
+        raise
+
+    if prune:
+        deletions = _plan_deletions(targets, gl_project_vars, include, exclude)
+        if deletions:
+            _show_deletions(deletions, prefix)
+
+    try:
+        # Writes are pipelined over the pool, up to its connection limit in flight
+        results = await gl.write_variables(
+            gitlabProject.id, pending, on_result=lambda result: _journal_result(journals, result),
+        )
+        updated, created, failed = _report_write_results(results, prefix)
+    except BaseException:
+        _finish_journals(journals, failed=True)
+        raise
+    failed += skipped
+    _finish_journals(journals, failed)
+
+    deleted = 0
+    if deletions:
+        results = await gl.delete_variables(gitlabProject.id, deletions)
+        deleted, delete_failed = _report_delete_results(results, prefix)
+        failed += delete_failed
+
+    if cache is not None and (pending or deletions):
+        cache.invalidate_listing(gitlabProject.id)
+
+    return unchanged, updated, created, deleted, failed
+
+
+def _push_changes(gitlabProject, state, targets, include, exclude, mask_patterns, concurrency, prune=False,
+                  strict=False, prefix=""):
+    """Diff targets against ``state``, the variables last pushed keyed by ``(environment, key)``,
+    and write only what changed. Successful writes and deletions are applied to ``state``, so
+    failed keys are tried again on the next push. Returns ``(unchanged, updated, created, deleted, failed)``.
+    """
+    from .variables import Variable
+
+    pending, unchanged = _plan_targets(targets, state.values(), include, exclude, mask_patterns)
+    pending, skipped = _validate_pending(pending, strict, prefix)
+    deletions = _plan_deletions(targets, state.values(), include, exclude) if prune else []
+    if deletions:
+        _show_deletions(deletions, prefix)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda item: _write_variable(gitlabProject, *item), pending))
+        updated, created, failed = _report_write_results(results, prefix)
+        for (environment, key, value, should_mask, project_var), (*_, error) in zip(pending, results):
+            if error is None:
+                masked = should_mask or (project_var is not None and project_var.masked)
+                state[(environment, key)] = Variable(key, value, environment, masked)
+
+        results = list(executor.map(lambda item: _delete_variable(gitlabProject, *item), deletions))
+        deleted, delete_failed = _report_delete_results(results, prefix)
+        for environment, key, error in results:
+            if error is None:
+                del state[(environment, key)]
+
+    return unchanged, updated, created, deleted, failed + delete_failed + skipped
+
+
+def _watch_projects(gitlabClient, cache, projects, env_files, targets, include, exclude, mask_patterns,
+                    concurrency, project_concurrency, api="rest", prune=False, strict=False, debounce=0.5):
+    """Write ``targets`` to each project, then keep writing just the changed keys each
+    time the .env files are saved, until interrupted.
+
+    Each project is listed once up front; after that the diff is against what
+    was last pushed, kept in memory, so a change costs only its own writes.
+    """
+    import gitlab
+    from dotenv import dotenv_values
+
+    from . import watch
+
+    multiple = len(projects) > 1
+    environments = {environment for environment, _ in targets}
+    paths = [path for _, path in env_files]
+    # Watch from the start, so a save made during the first listing and push isn't missed
+    watcher = watch.file_watcher(paths)
+
+    def start_project(project):
+        try:
+            gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, api, max_age=0)
+        except (gitlab.exceptions.GitlabHttpError, gitlab.exceptions.GitlabGetError):
+            gitlabProject = None
+        if not gitlabProject:
+            raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+        state = {(v.environment_scope, v.key): v for v in variables if v.environment_scope in environments}
+        return gitlabProject, state
+
+    def push_project(project, started, targets):
+        gitlabProject, state = started
+        prefix = f"[{project}] " if multiple else ""
+        try:
+            outcome = _push_changes(
+                gitlabProject, state, targets, include, exclude, mask_patterns, concurrency, prune, strict, prefix,
+            )
+        except validation.ValidationError as e:
+            # Nothing from this save was written; the next save is diffed against the same state
+            logger.info(str(e))
+            return
+        if cache is not None and any(outcome[1:4]):
+            cache.invalidate_listing(gitlabProject.id)
+        logger.info(prefix + "{} unchanged, {} updated, {} created, {} deleted, {} failed".format(*outcome))
+
+    try:
+        with ThreadPoolExecutor(max_workers=project_concurrency) as executor:
+            try:
+                started = list(executor.map(start_project, projects))
+            except (ProjectNotFoundError, gitlab.exceptions.GitlabError) as e:
+                raise click.ClickException(str(e))
+
+            def push(targets):
+                list(executor.map(lambda args: push_project(*args, targets), zip(projects, started)))
+
+            push(targets)
+
+            logger.info("Watching {} for changes, press Ctrl+C to stop".format(", ".join(paths)))
+            try:
+                for _ in watch.changes(watcher, debounce):
+                    missing = [path for path in paths if not os.path.exists(path)]
+                    if missing:
+                        # Mid-save, or removed; an empty target would read as every key deleted
+                        logger.info("Skipping change, missing: {}".format(", ".join(missing)))
+                        continue
+                    logger.info("Change detected, pushing")
+                    push([(environment, dotenv_values(dotenv_path=path)) for environment, path in env_files])
+            except KeyboardInterrupt:
+                logger.info("Stopped watching")
+    finally:
+        watcher.close()
+
+
+def _plan_copy(source_vars, target_by_scope_key, environment, include, exclude):
+    """Diff source variables against the indexed target variables in ``environment``.
+
+    Returns ``(pending, unchanged)`` with pending entries as in `_plan_writes`,
+    plus the source's protected flag and `Variable.attributes`, so copies keep
+    masked, protected, the variable type, raw and the description.
+    """
+    pending = []
+    unchanged = 0
+
+    for variable in source_vars:
+        key = variable.key
+        if not selected(key, include, exclude):
+            continue
+
+        target_var = target_by_scope_key.get((environment, key))
+        if target_var is not None:
+            # Masking is one-way, so an already-masked target never counts as changed
+            if (target_var.value == variable.value and (target_var.masked or not variable.masked)
+                    and target_var.protected == variable.protected
+                    and target_var.attributes() == variable.attributes()):
+                unchanged += 1
+                continue
+
+        pending.append((
+            environment, key, variable.value, variable.masked, target_var, variable.protected, variable.attributes(),
+        ))
+
+    return pending, unchanged
+
+
+def _scope_file_name(scope):
+    """`<scope>.env`, with `global.env` for `*` and characters that can't be in a file name replaced."""
+    name = "global" if scope == "*" else re.sub(r"[^\w.-]", "_", scope)
+    return f"{name}.env"
+
+
+def _scope_file_names(scopes):
+    """Map each scope to a distinct `_scope_file_name`.
+
+    Scopes whose names collide (`*` and `global`, `review/*` and `review_*`) are taken in sorted
+    order: the first keeps the name and the others get a numbered suffix, e.g. `global-2.env`.
+    """
+    names = {}
+    claimed = {}
+    for scope in sorted(scopes):
+        claimed.setdefault(_scope_file_name(scope), scope)
+
+    taken = set(claimed)
+    for scope in sorted(scopes):
+        name = _scope_file_name(scope)
+        if claimed[name] != scope:
+            stem = name[:-len(".env")]
+            suffix = 2
+            while f"{stem}-{suffix}.env" in taken:
+                suffix += 1
+            name = f"{stem}-{suffix}.env"
+            taken.add(name)
+            click.secho(f"Scopes {claimed[stem + '.env']!r} and {scope!r} share a file name, "
+                        f"writing {scope!r} to {name}", fg="yellow")
+        names[scope] = name
+    return names
+
+
+def _write_env_file(path, variables):
+    """Write ``KEY=value`` lines through a single buffered handle.
+
+    Goes through a temp file alongside the target so an existing file is only
+    replaced once every variable has been received. Returns the number written;
+    when there are none the target is left untouched.
+    """
+    count = 0
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            for v in variables:
+                f.write(f"{v.key}={v.value}\n")
+                count += 1
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    if count == 0:
+        os.remove(tmp_path)
+        return 0
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def _download_all_environments(variables, output_dir, stream):
+    """Group one listing by environment scope and write each scope's file once."""
+    by_scope = {}
+    for v in variables:
+        by_scope.setdefault(v.environment_scope, []).append(v)
+
+    if not by_scope:
+        click.secho("No variables found.", fg="yellow")
+        return
+
+    paths = {scope: os.path.join(output_dir, name) for scope, name in _scope_file_names(by_scope).items()}
+    existing = sorted(path for path in paths.values() if os.path.exists(path))
+    if existing:
+        click.secho(f"Files already exist: {', '.join(existing)}", fg="yellow")
+        if not click.confirm("Overwrite them?", default=False):
+            click.secho("Cancelled.", fg="red")
+            return
+
+    for scope in sorted(by_scope):
+        scope_vars = by_scope[scope] if stream else sorted(by_scope[scope], key=lambda v: v.key)
+        count = _write_env_file(paths[scope], scope_vars)
+        click.secho(f"Saved {count} variable(s) to {paths[scope]}", fg="green")
+
+
+def _plan_project(gitlabClient, cache, project, targets, include, exclude, mask_patterns, api="rest",
+                  prune=False, strict=False):
+    """Work out one project's changes without writing anything. Returns its plan file entry."""
+    import gitlab
+
+    from . import plan as write_plan
+
+    try:
+        gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, api, max_age=0)
+    except (gitlab.exceptions.GitlabHttpError, gitlab.exceptions.GitlabGetError):
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    if not gitlabProject:
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    variables = list(variables)
+    pending, unchanged = _plan_targets(targets, variables, include, exclude, mask_patterns)
+    # Invalid writes are left out of the plan
+    pending, _ = _validate_pending(pending, strict, f"[{project}] ")
+    deletions = _plan_deletions(targets, variables, include, exclude) if prune else []
+    environments = [environment for environment, _ in targets]
+    return write_plan.project_plan(
+        project, gitlabProject.id, variables, environments, pending, unchanged, deletions,
+    )
+
+
+def _print_plan(project_plans):
+    symbols = {"create": ("+", "green"), "update": ("~", "yellow"), "delete": ("-", "red")}
+    for entry in project_plans:
+        click.secho(f"{entry['project']} ({entry['project_id']})", bold=True)
+        counts = {action: 0 for action in symbols}
+        for change in entry["changes"]:
+            symbol, colour = symbols[change["action"]]
+            click.secho(f"  {symbol} [{change['environment']}] {change['key']}", fg=colour)
+            counts[change["action"]] += 1
+        click.echo("  {} to create, {} to update, {} to delete, {} unchanged".format(
+            counts["create"], counts["update"], counts["delete"], entry["unchanged"]
+        ))
+
+
+def _apply_project(gitlabClient, entry, concurrency, prefix=""):
+    """Execute one project's saved plan. Returns ``(unchanged, updated, created, deleted, failed)``."""
+    from . import plan as write_plan
+
+    gitlabProject = _lazy_project(gitlabClient, entry["project_id"], entry["project"])
+    pending, deletions = write_plan.changes_to_apply(entry)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = executor.map(lambda item: _write_variable(gitlabProject, *item), pending)
+        updated, created, failed = _report_write_results(results, prefix)
+        results = executor.map(lambda item: _delete_variable(gitlabProject, *item), deletions)
+        deleted, delete_failed = _report_delete_results(results, prefix)
+
+    return entry["unchanged"], updated, created, deleted, failed + delete_failed
+
+
+def _print_write_summary(summary):
+    """Print a per-project table of ``(project, counts or error)`` rows."""
+    headers = ("project", "unchanged", "updated", "created", "deleted", "failed")
+    width = max(len(headers[0]), *(len(str(project)) for project, _ in summary))
+
+    click.echo("  " + headers[0].ljust(width) + "".join(h.rjust(11) for h in headers[1:]))
+    for project, outcome in summary:
+        if isinstance(outcome, Exception):
+            click.secho(f"  {str(project).ljust(width)}  {outcome}", fg="red")
+        else:
+            click.echo("  " + str(project).ljust(width) + "".join(str(n).rjust(11) for n in outcome))
+
+
 @cli.command(help="Populate Gitlab project vars")
 @click.option(
     "--env-file",
+    help="Path to .env file",
+)
+@click.option(
+    "--environment",
+    help="Name of gitlab environment, e.g. `uat`",
+)
+@click.option(
+    "--env-dir",
+    type=click.Path(exists=True, file_okay=False),
+    help="Directory of `<environment>.env` files to write, each to its own environment. "
+         "`global.env` is written to the `*` scope",
+)
+@click.option(
+    "--gitlab-host",
+    required=True,
+    help="Gitlab server host",
+)
+@click.option(
+    "--project",
+    "projects",
+    multiple=True,
+    help="Gitlab project name or ID. Repeat to write to several projects",
+)
+@click.option(
+    "--projects-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="File of Gitlab project names or IDs to write to, one per line",
+)
+@click.option(
+    "--include",
+    help="Environment variables to include when writing. Excludes all others. CSV list of names, globs "
+         "or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--exclude",
+    help="Environment variables to exclude when writing. CSV list of names, globs or `re:` regexes, "
+         "e.g. NODE_ENV,re:.*_PASSWORD$",
+    default=""
+)
+@click.option(
+    "--mask",
+    is_flag=True,
+    default=False,
+    help="Mask variables with strings KEY, SECRET, TOKEN in their name",
+)
+@click.option(
+    "--mask-rules",
+    type=click.Path(exists=True, dir_okay=False),
+    help="File of names, globs or `re:` regexes, one per line, of variables to mask. Replaces the --mask rules",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of variables to write in parallel",
+)
+@click.option(
+    "--project-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of projects to write in parallel when writing to several projects",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="After writing, keep watching the .env file(s) and write changed keys on each save until interrupted",
+)
+@click.option(
+    "--debounce",
+    type=click.FloatRange(min=0),
+    default=0.5,
+    show_default=True,
+    help="With --watch, seconds to wait for saves to stop before pushing a batch",
+)
+@click.option(
+    "--plan-out",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Don't write anything; save the changes that would be made to this file for `apply`",
+)
+@click.option(
+    "--prune",
+    is_flag=True,
+    help="Delete variables in the target environment that are missing from the .env file. "
+         "--include and --exclude apply to deletions too",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="Carry on from the journal of an interrupted run with the same .env values, "
+         "writing only the keys it didn't get to",
+)
+@click.option(
+    "--strict",
+    is_flag=True,
+    help="Abort without writing anything if any variable would be rejected by Gitlab "
+         "(invalid key, value too long, or a masked value that can't be masked). By default those are skipped",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["gitlab", "async"]),
+    default="gitlab",
+    show_default=True,
+    help="API engine: python-gitlab, or asyncio over the REST API (requires httpx)",
+)
+@click.option(
+    "--api",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+    show_default=True,
+    help="API used to look up the project and list its variables. Writes always use REST",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Produce debug output",
+)
+def write(env_file, environment, env_dir, gitlab_host, projects, projects_file, include, exclude, mask, mask_rules,
+          concurrency, project_concurrency, watch, debounce, plan_out, prune, resume, strict, no_cache, engine, api, timings, metrics_json, debug):
+    try:
+        gitlab_token = os.environ["GITLAB_TOKEN"]
+    except KeyError:
+        raise click.ClickException(
+            f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
+        )
+
+    if env_dir:
+        if env_file or environment:
+            raise click.UsageError("--env-dir cannot be combined with --env-file or --environment")
+        env_files = _env_dir_files(env_dir)
+        if not env_files:
+            raise click.ClickException(f"No .env files found in {env_dir}")
+    else:
+        if not env_file or not environment:
+            raise click.UsageError("Provide --env-file and --environment, or --env-dir")
+        if not os.path.exists(env_file):
+            raise click.ClickException(f"Env file not found: {env_file}")
+        env_files = [(environment, env_file)]
+
+    projects = list(projects)
+    if projects_file:
+        projects.extend(_read_projects_file(projects_file))
+    if not projects:
+        raise click.UsageError("Provide at least one --project or a --projects-file")
+
+    from dotenv import dotenv_values
+
+    targets = []
+    for target_environment, target_file in env_files:
+        logger.info("Loading env vars from {}".format(target_file))
+        targets.append((target_environment, dotenv_values(dotenv_path=target_file)))
+
+    env_vars_to_include, env_vars_to_exclude = _key_filters(include, exclude)
+    mask_patterns = _mask_matcher(mask, mask_rules)
+
+    multiple = len(projects) > 1
+    _check_api(engine, api)
+    if plan_out and (engine == "async" or resume):
+        raise click.UsageError("--plan-out can't be combined with --engine async or --resume")
+    if watch and (engine == "async" or resume or plan_out):
+        raise click.UsageError("--watch can't be combined with --engine async, --resume or --plan-out")
+    if strict:
+        _preflight(targets, env_vars_to_include, env_vars_to_exclude, mask_patterns)
+    metrics = _start_metrics(timings, metrics_json)
+    write_args = (targets, env_vars_to_include, env_vars_to_exclude, mask_patterns)
+
+    if watch:
+        pool_size = concurrency * min(project_concurrency, len(projects))
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=pool_size, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+        _watch_projects(
+            gitlabClient, cache, projects, env_files, *write_args, concurrency, project_concurrency,
+            api=api, prune=prune, strict=strict, debounce=debounce,
+        )
+        return
+
+    if plan_out:
+        import gitlab
+
+        from . import plan as write_plan
+
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=project_concurrency, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+        with ThreadPoolExecutor(max_workers=project_concurrency) as executor:
+            try:
+                project_plans = list(executor.map(
+                    lambda project: _plan_project(
+                        gitlabClient, cache, project, *write_args, api=api, prune=prune, strict=strict,
+                    ),
+                    projects,
+                ))
+            except (ProjectNotFoundError, validation.ValidationError, gitlab.exceptions.GitlabError) as e:
+                raise click.ClickException(str(e))
+
+        write_plan.save(plan_out, gitlab_host, project_plans)
+        _print_plan(project_plans)
+        click.secho(f"Plan saved to {plan_out}. Apply it with: populate-secrets-gitlab apply {plan_out}", fg="green")
+        return
+
+    if engine == "async":
+        import asyncio
+
+        async_engine = _require_async_engine()
+        if debug:
+            logging.getLogger("httpx").setLevel(logging.DEBUG)
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+        async def run():
+            max_connections = concurrency * min(project_concurrency, len(projects))
+            async with async_engine.AsyncGitlab(
+                gitlab_host, gitlab_token, max_connections=max_connections, metrics=metrics,
+            ) as gl:
+                semaphore = asyncio.Semaphore(project_concurrency)
+
+                async def run_project(project):
+                    async with semaphore:
+                        prefix = f"[{project}] " if multiple else ""
+                        try:
+                            return await _write_project_async(
+                                gl, project, *write_args, resume=resume, prune=prune, strict=strict, prefix=prefix,
+                                cache=cache,
+                            )
+                        except validation.ValidationError as e:
+                            if not multiple:
+                                raise click.ClickException(str(e))
+                            raise
+
+                return await asyncio.gather(
+                    *(run_project(project) for project in projects),
+                    return_exceptions=multiple,
+                )
+
+        outcomes = asyncio.run(run())
+    else:
+        import gitlab
+
+        # Create gitlab client, with enough pooled connections for every worker
+        pool_size = concurrency * min(project_concurrency, len(projects))
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=pool_size, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+        def run_project(project):
+            prefix = f"[{project}] " if multiple else ""
+            try:
+                return _write_project(
+                    gitlabClient, cache, project, *write_args, concurrency, api=api, resume=resume,
+                    prune=prune, strict=strict, prefix=prefix,
+                )
+            except validation.ValidationError as e:
+                if not multiple:
+                    raise click.ClickException(str(e))
+                logger.info(str(e))
+                return e
+            # OSError covers local failures, e.g. reading or writing the cache, so one project's
+            # problem is reported in the summary instead of aborting the rest
+            except (ProjectNotFoundError, gitlab.exceptions.GitlabError, OSError) as e:
+                if not multiple:
+                    raise
+                logger.info(prefix + str(e))
+                return e
+
+        with ThreadPoolExecutor(max_workers=project_concurrency) as executor:
+            outcomes = list(executor.map(run_project, projects))
+
+    if multiple:
+        summary = list(zip(projects, outcomes))
+        for project, outcome in summary:
+            if not isinstance(outcome, Exception):
+                logger.info(
+                    "[{}] {} unchanged, {} updated, {} created, {} deleted, {} failed".format(project, *outcome)
+                )
+        _print_write_summary(summary)
+        logger.info("Done")
+
+        if any(isinstance(outcome, Exception) or outcome[-1] for _, outcome in summary):
+            raise click.ClickException("Some projects had failures")
+        return
+
+    logger.info(
+        "{} unchanged, {} updated, {} created, {} deleted, {} failed".format(*outcomes[0])
+    )
+    logger.info("Done")
+
+
+@cli.command(help="Apply a plan saved by `write --plan-out`")
+@click.argument(
+    "plan_file",
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of variables to write in parallel",
+)
+@click.option(
+    "--project-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of projects to check and apply in parallel",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Produce debug output",
+)
+def apply(plan_file, concurrency, project_concurrency, no_cache, timings, metrics_json, debug):
+    from . import plan as write_plan
+
+    try:
+        data = write_plan.load(plan_file)
+    except write_plan.PlanError as e:
+        raise click.ClickException(str(e))
+
+    gitlab_host = data["gitlab_url"]
+    try:
+        gitlab_token = os.environ["GITLAB_TOKEN"]
+    except KeyError:
+        raise click.ClickException(
+            f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
+        )
+
+    entries = data["projects"]
+    multiple = len(entries) > 1
+    metrics = _start_metrics(timings, metrics_json)
+
+    pool_size = concurrency * min(project_concurrency, max(len(entries), 1))
+    gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=pool_size, metrics=metrics)
+    if debug:
+        gitlabClient.enable_debug()
+    cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+    # Check every project for drift before touching any of them
+    def unchanged_since_plan(entry):
+        variables = iter_variables(gitlabClient, entry["project_id"])
+        return write_plan.fingerprint(variables, entry["environments"]) == entry["fingerprint"]
+
+    with ThreadPoolExecutor(max_workers=project_concurrency) as executor:
+        matches = list(executor.map(unchanged_since_plan, entries))
+
+    drifted = [entry["project"] for entry, matched in zip(entries, matches) if not matched]
+    if drifted:
+        raise click.ClickException(
+            "Variables changed since the plan was made in: {}. Make a new plan with `write --plan-out`".format(
+                ", ".join(drifted)
+            )
+        )
+
+    def run_project(entry):
+        prefix = f"[{entry['project']}] " if multiple else ""
+        outcome = _apply_project(gitlabClient, entry, concurrency, prefix)
+        if cache is not None:
+            cache.invalidate_listing(entry["project_id"])
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=project_concurrency) as executor:
+        outcomes = list(executor.map(run_project, entries))
+
+    summary = [(entry["project"], outcome) for entry, outcome in zip(entries, outcomes)]
+    if multiple:
+        _print_write_summary(summary)
+    else:
+        logger.info(
+            "{} unchanged, {} updated, {} created, {} deleted, {} failed".format(*outcomes[0])
+        )
+    logger.info("Done")
+
+    if any(outcome[-1] for outcome in outcomes):
+        raise click.ClickException("Some variables failed to apply")
+
+
+# `sync` is `write` under the name that reads naturally with --prune
+cli.add_command(click.Command(
+    name="sync",
+    callback=write.callback,
+    params=write.params,
+    help="Populate Gitlab project vars; with --prune also delete vars missing from the .env file",
+))
+
+
+@cli.command(help="Get Gitlab project vars")
+@click.option(
+    "--environment",
+    required=True,
+    help="Name of gitlab environment, e.g. `uat`",
+)
+@click.option(
+    "--gitlab-host",
+    required=True,
+    help="Gitlab server host",
+)
+@click.option(
+    "--project",
+    required=True,
+    help="Gitlab project name or ID",
+)
+@click.option(
+    "--include",
+    help="Variables to show. Excludes all others. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--exclude",
+    help="Variables not to show. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--export",
+    is_flag=True,
+    help="Export variables to file: $scope.env",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Output variables in API order as pages arrive instead of sorting by key",
+)
+@click.option(
+    "--effective",
+    is_flag=True,
+    help="Show what jobs in the environment actually see: instance, group and project variables resolved "
+         "by precedence, with where each comes from",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["gitlab", "async"]),
+    default="gitlab",
+    show_default=True,
+    help="API engine: python-gitlab, or asyncio over the REST API (requires httpx)",
+)
+@click.option(
+    "--api",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+    show_default=True,
+    help="API used to look up the project and list its variables. Writes always use REST",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Produce debug output",
+)
+def get(environment, gitlab_host, project, include, exclude, export, stream, effective, no_cache, engine, api,
+        timings, metrics_json, debug):
+    gitlab_token = None
+
+    try:
+        gitlab_token = os.environ["GITLAB_TOKEN"]
+    except KeyError:
+        raise click.ClickException(
+            f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
+        )
+
+    logger.info(f"Loading project vars from {project}")
+
+    include, exclude = _key_filters(include, exclude)
+    _check_api(engine, api)
+    _check_effective(effective, engine)
+    if effective and export:
+        raise click.UsageError("--export can't be combined with --effective")
+    metrics = _start_metrics(timings, metrics_json)
+
+    if effective:
+        from .effective import ListingCache
+
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=8, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            try:
+                gitlabProject, variables = _resolve_effective(
+                    gitlabClient, project, environment, ListingCache(), executor,
+                )
+            except ProjectNotFoundError as e:
+                raise click.ClickException(str(e))
+
+        click.secho(f"Getting effective vars for {gitlabProject.name} ({gitlabProject.id})", fg='green')
+        for variable in variables:
+            if selected(variable.key, include, exclude):
+                click.secho(f"[{_origin_label(variable)}] {variable.key}={variable.value}", fg='yellow')
+        logger.info("Done")
+        return
+
+    if engine == "async":
+        gitlabProject, gitlabProjectVariables = _load_project_variables_async(
+            gitlab_host, gitlab_token, project, debug, metrics
+        )
+    else:
+        import gitlab
+
+        # Create gitlab client
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+        # Pages are fetched and decoded lazily as the loop below consumes them
+        try:
+            gitlabProject, gitlabProjectVariables = _load_project_variables(gitlabClient, project, cache, api)
+        except gitlab.exceptions.GitlabHttpError:
+            raise Exception("Could not find project: {}".format(project))
+
+        if not gitlabProject:
+            raise Exception("Could not find project: {}".format(project))
+
+    click.secho(f"Getting vars from {gitlabProject.name} ({gitlabProject.id})", fg='green')
+
+    env_vars = (
+        v for v in gitlabProjectVariables
+        if _in_environment(v, environment) and selected(v.key, include, exclude)
+    )
+    if not stream:
+        env_vars = sorted(env_vars, key=lambda v: v.key)
+
+    # Exported variables are grouped per scope and each scope's file is written once at the end
+    exports = {}
+    for variable in env_vars:
+        click.secho(f"[{variable.environment_scope}] {variable.key}={variable.value}", fg='yellow')
+
+        if export:
+            exports.setdefault(variable.environment_scope, []).append(variable)
+
+    for scope, file_name in _scope_file_names(exports).items():
+        logger.debug(f"Writing {len(exports[scope])} variable(s) to {file_name}")
+        _write_env_file(file_name, exports[scope])
+
+    logger.info("Done")
+
+
+def _print_variable_rows(rows, sensitive):
+    """Print ``(label, variable)`` rows in aligned columns. Returns the number printed."""
+    if not rows:
+        click.secho("No variables found.", fg="yellow")
+        return 0
+
+    # Determine column widths
+    max_key_len = max(len(v.key) for _, v in rows)
+    max_label_len = max(len(label) for label, _ in rows)
+
+    for label, v in rows:
+        if sensitive or not v.masked:
+            display_value = v.value
+        else:
+            display_value = "********"
+
+        key_col = v.key.ljust(max_key_len)
+        label_col = label.ljust(max_label_len)
+        masked_label = " [masked]" if v.masked else ""
+
+        click.echo(f"  {label_col}  {key_col}  {display_value}{masked_label}")
+
+    click.secho(f"\n{len(rows)} variable(s) found.", fg="green")
+    return len(rows)
+
+
+def _origin_label(variable):
+    """Where an `effective.EffectiveVariable` comes from, e.g. `group acme/team [*]`."""
+    if variable.level == "instance":
+        return "instance"
+    return f"{variable.level} {variable.source} [{variable.environment_scope}]"
+
+
+def _fetch_listing(gitlabClient, path, label):
+    """All variables at a listing path, or none, with a warning, if the token can't read them."""
+    import gitlab
+
+    from .variables import Variable
+
+    try:
+        return [Variable.from_json(data) for data in gitlabClient.http_list(path, iterator=True, per_page=PER_PAGE)]
+    except gitlab.exceptions.GitlabError as e:
+        if e.response_code not in (401, 403, 404):
+            raise
+        logger.warning(f"Can't read {label} variables, leaving them out ({e.response_code})")
+        return []
+
+
+def _resolve_effective(gitlabClient, project, environment, listings, executor):
+    """Look up a project and resolve the variables its jobs see in ``environment``.
+
+    The project, ancestor group and instance listings are fetched in parallel
+    on ``executor``; group and instance listings go through the per-run
+    ``listings`` cache. Returns ``(project, effective_variables)``.
+    """
+    import gitlab
+    from urllib.parse import quote
+
+    from . import effective
+
+    try:
+        gitlabProject = gitlabClient.projects.get(id=project)
+    except (gitlab.exceptions.GitlabHttpError, gitlab.exceptions.GitlabGetError):
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    namespace = gitlabProject.namespace
+    # Projects in a user's namespace have no groups above them
+    groups = effective.ancestor_groups(namespace["full_path"]) if namespace.get("kind") == "group" else []
+
+    project_future = executor.submit(lambda: list(iter_variables(gitlabClient, gitlabProject.id)))
+    group_futures = [
+        executor.submit(
+            listings.get, ("group", group),
+            lambda group=group: _fetch_listing(gitlabClient, f"/groups/{quote(group, safe='')}/variables",
+                                               f"group {group}"),
+        )
+        for group in groups
+    ]
+    instance_future = executor.submit(
+        listings.get, ("instance",), lambda: _fetch_listing(gitlabClient, "/admin/ci/variables", "instance"),
+    )
+
+    return gitlabProject, effective.resolve(
+        environment,
+        gitlabProject.path_with_namespace,
+        project_future.result(),
+        [(group, future.result()) for group, future in zip(groups, group_futures)],
+        instance_future.result(),
+    )
+
+
+def _check_effective(effective, engine):
+    if effective and engine == "async":
+        raise click.UsageError("--effective is only supported by the default engine")
+
+
+@cli.command(name="list", help="List Gitlab project vars for an environment")
+@click.option(
+    "--environment",
+    required=True,
+    help="Name of gitlab environment, e.g. `uat`",
+)
+@click.option(
+    "--gitlab-host",
+    required=True,
+    help="Gitlab server host",
+)
+@click.option(
+    "--project",
+    "projects",
+    required=True,
+    multiple=True,
+    help="Gitlab project name or ID. Repeat to list several projects",
+)
+@click.option(
+    "--include",
+    help="Variables to list. Excludes all others. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--exclude",
+    help="Variables not to list. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--sensitive",
+    is_flag=True,
+    default=False,
+    help="Show all values including masked ones",
+)
+@click.option(
+    "--effective",
+    is_flag=True,
+    help="Show what jobs in the environment actually see: instance, group and project variables resolved "
+         "by precedence, with where each comes from",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["gitlab", "async"]),
+    default="gitlab",
+    show_default=True,
+    help="API engine: python-gitlab, or asyncio over the REST API (requires httpx)",
+)
+@click.option(
+    "--api",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+    show_default=True,
+    help="API used to look up the project and list its variables. Writes always use REST",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Produce debug output",
+)
+def list_vars(environment, gitlab_host, projects, include, exclude, sensitive, effective, no_cache, engine, api,
+              timings, metrics_json, debug):
+    try:
+        gitlab_token = os.environ["GITLAB_TOKEN"]
+    except KeyError:
+        raise click.ClickException(
+            f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
+        )
+
+    include, exclude = _key_filters(include, exclude)
+    _check_api(engine, api)
+    _check_effective(effective, engine)
+    metrics = _start_metrics(timings, metrics_json)
+
+    if effective:
+        from .effective import ListingCache
+
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=8, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+
+        # Shared by every project, so groups they have in common are listed once
+        listings = ListingCache()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for project in projects:
+                try:
+                    gitlabProject, variables = _resolve_effective(
+                        gitlabClient, project, environment, listings, executor,
+                    )
+                except ProjectNotFoundError as e:
+                    raise click.ClickException(str(e))
+
+                click.secho(
+                    f"Effective variables for {gitlabProject.name} ({gitlabProject.id}) — environment: {environment}",
+                    fg="green",
+                )
+                rows = [(_origin_label(v), v) for v in variables if selected(v.key, include, exclude)]
+                _print_variable_rows(rows, sensitive)
+        return
+
+    if engine != "async":
+        import gitlab
+
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+    for project in projects:
+        if engine == "async":
+            gitlabProject, variables = _load_project_variables_async(
+                gitlab_host, gitlab_token, project, debug, metrics
+            )
+        else:
+            try:
+                gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, api)
+            except gitlab.exceptions.GitlabHttpError:
+                raise click.ClickException("Could not find project: {}".format(project))
+
+            if not gitlabProject:
+                raise click.ClickException("Could not find project: {}".format(project))
+
+        click.secho(
+            f"Variables for {gitlabProject.name} ({gitlabProject.id}) — environment: {environment}",
+            fg="green",
+        )
+
+        # Column widths need every row, but only the matching ones are kept as pages arrive
+        rows = [
+            (v.environment_scope, v) for v in variables
+            if _in_environment(v, environment) and selected(v.key, include, exclude)
+        ]
+        _print_variable_rows(rows, sensitive)
+
+
+@cli.command(help="Download Gitlab project vars to an .env file")
+@click.option(
+    "--environment",
+    help="Name of gitlab environment, e.g. `uat`",
+)
+@click.option(
+    "--all-environments",
+    is_flag=True,
+    help="Write every environment scope to its own <scope>.env file from a single listing "
+         "(global variables go to global.env)",
+)
+@click.option(
+    "--gitlab-host",
+    required=True,
+    help="Gitlab server host",
+)
+@click.option(
+    "--project",
+    required=True,
+    help="Gitlab project name or ID",
+)
+@click.option(
+    "--include",
+    help="Variables to download. Excludes all others. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--exclude",
+    help="Variables not to download. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--output-dir",
+    default=".",
+    help="Directory to save the .env file (default: current directory)",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Output variables in API order as pages arrive instead of sorting by key",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["gitlab", "async"]),
+    default="gitlab",
+    show_default=True,
+    help="API engine: python-gitlab, or asyncio over the REST API (requires httpx)",
+)
+@click.option(
+    "--api",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+    show_default=True,
+    help="API used to look up the project and list its variables. Writes always use REST",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Produce debug output",
+)
+def download(environment, all_environments, gitlab_host, project, include, exclude, output_dir, stream, no_cache,
+             engine, api, timings, metrics_json, debug):
+    try:
+        gitlab_token = os.environ["GITLAB_TOKEN"]
+    except KeyError:
+        raise click.ClickException(
+            f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
+        )
+
+    if all_environments == bool(environment):
+        raise click.UsageError("Provide either --environment or --all-environments")
+
+    if not os.path.isdir(output_dir):
+        raise click.ClickException(f"Output directory does not exist: {output_dir}")
+
+    include, exclude = _key_filters(include, exclude)
+    _check_api(engine, api)
+    metrics = _start_metrics(timings, metrics_json)
+    if engine == "async":
+        gitlabProject, variables = _load_project_variables_async(
+            gitlab_host, gitlab_token, project, debug, metrics
+        )
+    else:
+        import gitlab
+
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
+
+        try:
+            gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, api)
+        except gitlab.exceptions.GitlabHttpError:
+            raise click.ClickException("Could not find project: {}".format(project))
+
+        if not gitlabProject:
+            raise click.ClickException("Could not find project: {}".format(project))
+
+    click.secho(
+        f"Downloading vars from {gitlabProject.name} ({gitlabProject.id}) — "
+        + ("all environments" if all_environments else f"environment: {environment}"),
+        fg="green",
+    )
+
+    variables = (v for v in variables if selected(v.key, include, exclude))
+    if all_environments:
+        _download_all_environments(variables, output_dir, stream)
+        return
+
+    env_vars = (v for v in variables if _in_environment(v, environment))
+
+    if not stream:
+        env_vars = sorted(env_vars, key=lambda v: v.key)
+
+        if not env_vars:
+            click.secho("No variables found.", fg="yellow")
+            return
+
+    output_path = os.path.join(output_dir, f"{environment}.env")
+
+    if os.path.exists(output_path):
+        click.secho(f"File already exists: {output_path}", fg="yellow")
+        choice = click.prompt(
+            "Choose action",
+            type=click.Choice(["overwrite", "rename", "cancel"], case_sensitive=False),
+            default="cancel",
+        )
+        if choice == "cancel":
+            click.secho("Cancelled.", fg="red")
+            return
+        elif choice == "rename":
+            n = 1
+            while True:
+                output_path = os.path.join(output_dir, f"{environment}-{n}.env")
+                if not os.path.exists(output_path):
+                    break
+                n += 1
+
+    count = _write_env_file(output_path, env_vars)
+    if count == 0:
+        click.secho("No variables found.", fg="yellow")
+        return
+
+    click.secho(f"Saved {count} variable(s) to {output_path}", fg="green")
+
+
+@cli.command(help="Copy variables from one project environment to another, without going through a file")
+@click.option(
+    "--gitlab-host",
     required=True,
-    help="Path to .env file",
+    help="Gitlab server host",
 )
 @click.option(
-    "--environment",
+    "--from-project",
     required=True,
-    help="Name of gitlab environment, e.g. `uat`",
+    help="Gitlab project name or ID to copy from",
 )
 @click.option(
-    "--gitlab-host",
+    "--from-env",
     required=True,
-    help="Gitlab server host",
+    help="Environment scope to copy from, e.g. `uat`, or `*` for global variables",
 )
 @click.option(
-    "--project",
-    required=True,
-    help="Gitlab project name or ID",
+    "--to-project",
+    help="Gitlab project name or ID to copy to (default: --from-project)",
+)
+@click.option(
+    "--to-env",
+    help="Environment scope to copy to (default: --from-env)",
 )
 @click.option(
     "--include",
-    help="Environment variables to include when writing. Excludes all others. CSV list, e.g. NODE_ENV,MY_VAR",
+    help="Variables to copy. Excludes all others. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
     default=""
 )
 @click.option(
     "--exclude",
-    help="Environment variables to exclude when writing. CSV list, e.g. NODE_ENV,MY_VAR",
+    help="Variables not to copy. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
     default=""
 )
 @click.option(
-    "--mask",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of variables to write in parallel",
+)
+@click.option(
+    "--no-cache",
     is_flag=True,
-    default=False,
-    help="Mask variables with strings KEY, SECRET, TOKEN in their name",
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups. Listings are never cached",
+)
+@click.option(
+    "--api",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+    show_default=True,
+    help="API used to look up the projects and list their variables. Writes always use REST",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
 )
 @click.option(
     "--debug",
     is_flag=True,
     help="Produce debug output",
 )
-def write(env_file, environment, gitlab_host, project, include, exclude, mask, debug):
-    # If the var name contains any of these words it will be masked
-    varsToMask = ["KEY", "SECRET", "TOKEN"]  # PASSWORD
-    enableMasking = mask
-
+def copy(gitlab_host, from_project, from_env, to_project, to_env, include, exclude, concurrency, no_cache, api,
+         timings, metrics_json, debug):
     try:
         gitlab_token = os.environ["GITLAB_TOKEN"]
     except KeyError:
@@ -81,107 +2008,92 @@ def write(env_file, environment, gitlab_host, project, include, exclude, mask, d
             f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
         )
 
-    if not os.path.exists(env_file):
-        raise click.ClickException(f"Env file not found: {env_file}")
-
-    # Create gitlab client
-    gitlabClient = gitlab_client(gitlab_host, gitlab_token)
-    if debug:
-        gitlabClient.enable_debug()
-
-    logger.info("Loading env vars from {}".format(env_file))
-
-    env_values = dotenv_values(dotenv_path=env_file)
+    to_project = to_project or from_project
+    to_env = to_env or from_env
+    same_project = str(to_project) == str(from_project)
+    if same_project and to_env == from_env:
+        raise click.UsageError("Provide a different --to-project or --to-env to copy to")
 
-    env_vars_to_include = []
-    env_vars_to_exclude = []
+    include, exclude = _key_filters(include, exclude)
 
-    if len(include) > 0:
-        env_vars_to_include = include.split(",")
-        logger.info("Including: {}".format("; ".join(env_vars_to_include)))
+    import gitlab
 
-    if len(exclude) > 0:
-        env_vars_to_exclude = exclude.split(",")
-        logger.info("Excluding: {}".format("; ".join(env_vars_to_exclude)))
+    metrics = _start_metrics(timings, metrics_json)
+    gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=max(concurrency, 2), metrics=metrics)
+    if debug:
+        gitlabClient.enable_debug()
+    cache = _open_cache(gitlab_host, gitlab_token, no_cache)
 
-    gitlabProject: Project
+    def load(project):
+        try:
+            # Listings hold the values being copied, so they bypass the on-disk cache
+            gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, api, cache_listing=False)
+        except (gitlab.exceptions.GitlabHttpError, gitlab.exceptions.GitlabGetError):
+            gitlabProject = None
+        if not gitlabProject:
+            raise click.ClickException("Could not find project: {}".format(project))
+        return gitlabProject, list(variables)
+
+    # Within one project a single listing serves as both source and target
+    if same_project:
+        sourceProject, source_vars = load(from_project)
+        targetProject, target_vars = sourceProject, source_vars
+    else:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            (sourceProject, source_vars), (targetProject, target_vars) = executor.map(
+                load, [from_project, to_project]
+            )
 
-    try:
-        gitlabProject = gitlabClient.projects.get(id=project)
-    except gitlab.exceptions.GitlabHttpError:
-        raise Exception("Could not find project: {}".format(project))
+    click.secho(
+        f"Copying [{from_env}] from {sourceProject.name} ({sourceProject.id}) "
+        f"to [{to_env}] in {targetProject.name} ({targetProject.id})",
+        fg="green",
+    )
 
-    if not gitlabProject:
-        raise Exception("Could not find project: {}".format(project))
+    source_vars = (v for v in source_vars if v.environment_scope == from_env)
+    pending, unchanged = _plan_copy(source_vars, _index_variables(target_vars), to_env, include, exclude)
 
-    # Get all existing vars
-    gl_project_vars = gitlabProject.variables.list(get_all=True)
-    logger.debug(gl_project_vars)
-    gitlab_project_variable_keys_with_scope = list(map(lambda o: {"environment_scope": o.environment_scope, "key": o.key}, gl_project_vars))
-    logger.debug(gitlab_project_variable_keys_with_scope)
-    gitlab_project_variable_keys_by_scope = dict()
-    for d in gitlab_project_variable_keys_with_scope:
-        gitlab_project_variable_keys_by_scope.setdefault(
-                    d["environment_scope"], []
-                ).append(d["key"])
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = executor.map(lambda item: _write_variable(targetProject, *item), pending)
+        updated, created, failed = _report_write_results(results)
 
-    logger.debug(gitlab_project_variable_keys_by_scope)
+    if cache is not None and pending:
+        cache.invalidate_listing(targetProject.id)
 
-    for key, value in env_values.items():
-        is_update = False
-        if len(env_vars_to_include) > 0 and key not in env_vars_to_include:
-            continue
+    logger.info("{} unchanged, {} updated, {} created, {} failed".format(unchanged, updated, created, failed))
+    logger.info("Done")
 
-        if key in env_vars_to_exclude:
-            logger.info("Skipping {}".format(key))
-            continue
+    if failed:
+        raise click.ClickException("Some variables failed to copy")
 
-        # Write to Gitlab API
-        try:
-            if key in gitlab_project_variable_keys_by_scope.get(environment, []):
-                is_update = True
-                # Update
-                project_var = [v for v in gl_project_vars if v.key == key][0]
-                project_var.value = value
-                if enableMasking and any(x in key for x in varsToMask):
-                    project_var.masked = True
-                project_var.save(filter={'environment_scope': environment})
-            else:
-                # Add
-                payload = {
-                    "key": key,
-                    "value": value,
-                    "environment_scope": environment,
-                }
-
-                if enableMasking and any(x in key for x in varsToMask):
-                    payload["masked"] = True
-
-                logger.debug(payload)
-
-                gitlabProject.variables.create(payload)
-        except gitlab.exceptions.GitlabHttpError:
-            logger.info("Failed to write {} due to error from Gitlab API".format(key))
-            print_exc()
-            continue
-        except gitlab.exceptions.GitlabError:
-            logger.info("Failed to write {} due to unexpected Gitlab error".format(key))
-            print_exc()
-            continue
 
-        logger.info(
-            "Wrote {} variable {} to Gitlab API in environment {}".format(
-                "updated" if is_update else "new", key, environment
-            )
-        )
+def _print_comparison(result, label, against_label):
+    click.secho(f"Comparing {label} with {against_label}", fg="green")
+    for entry in result["added"]:
+        click.secho(f"  + {entry['key']}  {entry['value']}", fg="green")
+    for entry in result["removed"]:
+        click.secho(f"  - {entry['key']}  {entry['value']}", fg="red")
+    for entry in result["changed"]:
+        click.secho(f"  ~ {entry['key']}  {entry['against_value']} -> {entry['value']}", fg="yellow")
+    click.echo("{} added, {} removed, {} changed, {} unchanged".format(
+        len(result["added"]), len(result["removed"]), len(result["changed"]), result["unchanged"]
+    ))
 
-    logger.info("Done")
 
-@cli.command(help="Get Gitlab project vars")
+@cli.command(help="Compare an environment's variables with another environment or a local .env file")
 @click.option(
     "--environment",
     required=True,
-    help="Name of gitlab environment, e.g. `uat`",
+    help="Environment scope to compare, e.g. `uat`, or `*` for global variables",
+)
+@click.option(
+    "--against",
+    help="Environment scope to compare with, e.g. `production`",
+)
+@click.option(
+    "--against-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Local .env file to compare with",
 )
 @click.option(
     "--gitlab-host",
@@ -194,17 +2106,69 @@ def write(env_file, environment, gitlab_host, project, include, exclude, mask, d
     help="Gitlab project name or ID",
 )
 @click.option(
-    "--export",
+    "--include",
+    help="Variables to compare. Excludes all others. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--exclude",
+    help="Variables not to compare. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--sensitive",
     is_flag=True,
-    help="Export variables to file: $scope.env",
+    help="Show values instead of digests that only tell equal from different within this report",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    help="Print the differences as JSON",
+)
+@click.option(
+    "--exit-code",
+    is_flag=True,
+    help="Exit with status 1 if there are any differences",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["gitlab", "async"]),
+    default="gitlab",
+    show_default=True,
+    help="API engine: python-gitlab, or asyncio over the REST API (requires httpx)",
+)
+@click.option(
+    "--api",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+    show_default=True,
+    help="API used to look up the project and list its variables",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
 )
 @click.option(
     "--debug",
     is_flag=True,
     help="Produce debug output",
 )
-def get(environment, gitlab_host, project, export, debug):
-    gitlab_token = None
+def compare(environment, against, against_file, gitlab_host, project, include, exclude, sensitive, as_json,
+            exit_code, no_cache, engine, api, timings, metrics_json, debug):
+    from . import compare as variable_compare
 
     try:
         gitlab_token = os.environ["GITLAB_TOKEN"]
@@ -213,69 +2177,168 @@ def get(environment, gitlab_host, project, export, debug):
             f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
         )
 
-    # Create gitlab client
-    gitlabClient = gitlab_client(gitlab_host, gitlab_token) 
-    if debug:
-        gitlabClient.enable_debug()
+    if bool(against) == bool(against_file):
+        raise click.UsageError("Provide either --against or --against-file")
 
-    logger.info(f"Loading project vars from {project}")
+    include, exclude = _key_filters(include, exclude)
+    _check_api(engine, api)
+    metrics = _start_metrics(timings, metrics_json)
+    if engine == "async":
+        gitlabProject, variables = _load_project_variables_async(
+            gitlab_host, gitlab_token, project, debug, metrics
+        )
+    else:
+        import gitlab
 
-    try:
-        gitlabProject = gitlabClient.projects.get(id=project)
-    except gitlab.exceptions.GitlabHttpError:
-        raise Exception("Could not find project: {}".format(project))
+        gitlabClient = gitlab_client(gitlab_host, gitlab_token, metrics=metrics)
+        if debug:
+            gitlabClient.enable_debug()
+        cache = _open_cache(gitlab_host, gitlab_token, no_cache)
 
-    if not gitlabProject:
-        raise Exception("Could not find project: {}".format(project))
+        try:
+            gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, api)
+        except gitlab.exceptions.GitlabHttpError:
+            raise click.ClickException("Could not find project: {}".format(project))
 
-    click.secho(f"Getting vars from {gitlabProject.name} ({gitlabProject.id})", fg='green')
+        if not gitlabProject:
+            raise click.ClickException("Could not find project: {}".format(project))
 
+    # Both sides come out of the one listing
+    scopes = {environment} if against_file else {environment, against}
+    values_by_scope = {scope: {} for scope in scopes}
+    for variable in variables:
+        if variable.environment_scope in scopes and selected(variable.key, include, exclude):
+            values_by_scope[variable.environment_scope][variable.key] = variable.value
 
-    gitlabProjectVariables = gitlabProject.variables.list(get_all=True)
-    export_opened = set()
-    for variable in sorted(gitlabProjectVariables, key=lambda v: v.key):
-        scope = 'global' if variable.environment_scope == '*' else variable.environment_scope
-        if scope == environment or scope == 'global':
-            click.secho(f"[{variable.environment_scope}] {variable.key}={variable.value}", fg='yellow')
+    if against_file:
+        from dotenv import dotenv_values
 
-            if export:
-                logger.debug(f"Writing {variable.key} to {scope}.env")
-                mode = "a" if scope in export_opened else "w"
-                with open(f"{scope}.env", mode) as f:
-                    f.write(f"{variable.key}={variable.value}\n")
-                export_opened.add(scope)
+        against_values = {
+            key: value for key, value in dotenv_values(dotenv_path=against_file).items()
+            if selected(key, include, exclude)
+        }
+        against_label = against_file
+    else:
+        against_values = values_by_scope[against]
+        against_label = f"[{against}]"
 
-    logger.info("Done")
+    result = variable_compare.diff(values_by_scope[environment], against_values, sensitive)
 
+    if as_json:
+        click.echo(json.dumps({
+            "project": {"id": gitlabProject.id, "name": gitlabProject.name},
+            "environment": environment,
+            "against": {"file": against_file} if against_file else {"environment": against},
+            **result,
+        }, indent=2))
+    else:
+        _print_comparison(result, f"[{environment}] in {gitlabProject.name} ({gitlabProject.id})", against_label)
 
-@cli.command(name="list", help="List Gitlab project vars for an environment")
-@click.option(
-    "--environment",
-    required=True,
-    help="Name of gitlab environment, e.g. `uat`",
-)
+    if exit_code and variable_compare.has_drift(result):
+        sys.exit(1)
+
+
+BACKUP_PASSPHRASE_ENV = "POPULATE_SECRETS_GITLAB_BACKUP_PASSPHRASE"
+
+
+def _list_group_projects(gitlabClient, group):
+    """``{"id", "path", "name"}`` for every project in a group and its subgroups."""
+    from urllib.parse import quote
+
+    pages = gitlabClient.http_list(
+        f"/groups/{quote(str(group), safe='')}/projects", iterator=True, per_page=PER_PAGE,
+        include_subgroups="true", with_shared="false",
+    )
+    for data in pages:
+        yield {"id": data["id"], "path": data["path_with_namespace"], "name": data["name"]}
+
+
+def _restore_project(gitlabClient, cache, document, include, exclude, concurrency, prefix=""):
+    """Diff and write one project's backed up variables, keeping their scopes and flags.
+    Returns ``(unchanged, updated, created, deleted, failed)``; nothing is deleted."""
+    import gitlab
+
+    from .variables import Variable
+
+    project = document["project"]["path"]
+    try:
+        gitlabProject, variables = _load_project_variables(gitlabClient, project, cache, "rest", max_age=0)
+    except (gitlab.exceptions.GitlabHttpError, gitlab.exceptions.GitlabGetError):
+        gitlabProject = None
+    if not gitlabProject:
+        raise ProjectNotFoundError("Could not find project: {}".format(project))
+
+    existing_by_scope_key = _index_variables(variables)
+    backed_up = [Variable.from_json(v) for v in document["variables"]]
+    pending = []
+    unchanged = 0
+    for scope in sorted({v.environment_scope for v in backed_up}):
+        scope_pending, scope_unchanged = _plan_copy(
+            (v for v in backed_up if v.environment_scope == scope), existing_by_scope_key, scope, include, exclude,
+        )
+        pending.extend(scope_pending)
+        unchanged += scope_unchanged
+    pending, skipped = _validate_pending(pending, prefix=prefix)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = executor.map(lambda item: _write_variable(gitlabProject, *item), pending)
+        updated, created, failed = _report_write_results(results, prefix)
+
+    if cache is not None and pending:
+        cache.invalidate_listing(gitlabProject.id)
+
+    return unchanged, updated, created, 0, failed + skipped
+
+
+@cli.command(help="Back up the variables of every project in a group to one compressed archive")
 @click.option(
     "--gitlab-host",
     required=True,
     help="Gitlab server host",
 )
 @click.option(
-    "--project",
+    "--group",
     required=True,
-    help="Gitlab project name or ID",
+    help="Gitlab group path or ID. Projects in subgroups are included",
 )
 @click.option(
-    "--sensitive",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Archive file to write (default: <group>-variables-<timestamp>.jsonl.gz)",
+)
+@click.option(
+    "--encrypt",
     is_flag=True,
-    default=False,
-    help="Show all values including masked ones",
+    help=f"Encrypt the archive with a passphrase, read from {BACKUP_PASSPHRASE_ENV} or prompted for "
+         "(requires cryptography)",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of projects to list in parallel",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
 )
 @click.option(
     "--debug",
     is_flag=True,
     help="Produce debug output",
 )
-def list_vars(environment, gitlab_host, project, sensitive, debug):
+def backup(gitlab_host, group, output, encrypt, concurrency, timings, metrics_json, debug):
+    import gitlab
+
+    from . import backup as variable_backup
+
     try:
         gitlab_token = os.environ["GITLAB_TOKEN"]
     except KeyError:
@@ -283,84 +2346,150 @@ def list_vars(environment, gitlab_host, project, sensitive, debug):
             f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
         )
 
-    gitlabClient = gitlab_client(gitlab_host, gitlab_token)
+    if not output:
+        from datetime import datetime
+
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = "{}-variables-{}.jsonl.gz".format(re.sub(r"[^\w.-]", "_", str(group)), timestamp)
+
+    passphrase = None
+    if encrypt:
+        passphrase = os.environ.get(BACKUP_PASSPHRASE_ENV) or click.prompt(
+            "Passphrase", hide_input=True, confirmation_prompt=True,
+        )
+
+    metrics = _start_metrics(timings, metrics_json)
+    gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=concurrency, metrics=metrics)
     if debug:
         gitlabClient.enable_debug()
 
     try:
-        gitlabProject = gitlabClient.projects.get(id=project)
-    except gitlab.exceptions.GitlabHttpError:
+        projects = list(_list_group_projects(gitlabClient, group))
+    except gitlab.exceptions.GitlabError:
+        raise click.ClickException("Could not find group: {}".format(group))
+    if not projects:
+        raise click.ClickException("No projects found in group: {}".format(group))
+    logger.info("Backing up {} project(s) from {}".format(len(projects), group))
+
+    try:
+        archive = variable_backup.ArchiveWriter(output, gitlab_host, group, passphrase)
+    except ImportError:
         raise click.ClickException(
-            "Could not find project: {}".format(project)
+            'Encrypted backups require cryptography: pip install "populate-secrets-gitlab[encryption]"'
         )
 
-    if not gitlabProject:
-        raise click.ClickException("Could not find project: {}".format(project))
-
-    click.secho(
-        f"Variables for {gitlabProject.name} ({gitlabProject.id}) — environment: {environment}",
-        fg="green",
-    )
-
-    variables = gitlabProject.variables.list(get_all=True)
-
-    env_vars = []
-    for v in variables:
-        scope = "global" if v.environment_scope == "*" else v.environment_scope
-        if scope == environment or scope == "global":
-            env_vars.append(v)
-
-    if not env_vars:
-        click.secho("No variables found.", fg="yellow")
-        return
-
-    # Determine column widths
-    max_key_len = max(len(v.key) for v in env_vars)
-    max_scope_len = max(len(v.environment_scope) for v in env_vars)
-
-    for v in env_vars:
-        if sensitive or not v.masked:
-            display_value = v.value
-        else:
-            display_value = "********"
-
-        scope_label = v.environment_scope
-        key_col = v.key.ljust(max_key_len)
-        scope_col = scope_label.ljust(max_scope_len)
-        masked_label = " [masked]" if v.masked else ""
-
-        click.echo(f"  {scope_col}  {key_col}  {display_value}{masked_label}")
-
-    click.secho(f"\n{len(env_vars)} variable(s) found.", fg="green")
-
+    def fetch(project):
+        try:
+            listing = gitlabClient.http_list(f"/projects/{project['id']}/variables", iterator=True, per_page=PER_PAGE)
+            return project, variable_backup.project_document(project, listing)
+        except gitlab.exceptions.GitlabError as e:
+            return project, e
 
-@cli.command(help="Download Gitlab project vars to an .env file")
-@click.option(
-    "--environment",
-    required=True,
-    help="Name of gitlab environment, e.g. `uat`",
+    failed = []
+    variable_count = 0
+    try:
+        # Listings run in a bounded pool; each document is appended as soon as it's its turn
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for project, document in executor.map(fetch, projects):
+                if isinstance(document, Exception):
+                    logger.info("Failed to back up {}: {}".format(project["path"], document))
+                    failed.append(project["path"])
+                    continue
+                archive.add(document)
+                variable_count += len(document["variables"])
+                logger.debug("Backed up {} variable(s) from {}".format(len(document["variables"]), project["path"]))
+    except BaseException:
+        archive.abort()
+        raise
+    archive.close()
+
+    click.secho(f"Saved {variable_count} variable(s) from {archive.count} project(s) to {output}", fg="green")
+    if failed:
+        raise click.ClickException("Failed to back up: {}".format(", ".join(failed)))
+
+
+@cli.command(help="Restore variables from a `backup` archive")
+@click.argument(
+    "archive",
+    type=click.Path(exists=True, dir_okay=False),
 )
 @click.option(
     "--gitlab-host",
-    required=True,
-    help="Gitlab server host",
+    help="Gitlab server host (default: the host the backup was taken from)",
 )
 @click.option(
     "--project",
-    required=True,
-    help="Gitlab project name or ID",
+    "projects",
+    multiple=True,
+    help="Only restore this project path. Repeat for several",
 )
 @click.option(
-    "--output-dir",
-    default=".",
-    help="Directory to save the .env file (default: current directory)",
+    "--include",
+    help="Variables to restore. Excludes all others. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--exclude",
+    help="Variables not to restore. CSV list of names, globs or `re:` regexes, e.g. NODE_ENV,AWS_*",
+    default=""
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of variables to write in parallel",
+)
+@click.option(
+    "--project-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of projects to restore in parallel",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    envvar="POPULATE_SECRETS_GITLAB_NO_CACHE",
+    help="Don't read or write the local cache of project lookups and variable listings",
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Print request counts and latency per phase when the command finishes",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write request metrics, including every individual request, to this JSON file",
 )
 @click.option(
     "--debug",
     is_flag=True,
     help="Produce debug output",
 )
-def download(environment, gitlab_host, project, output_dir, debug):
+def restore(archive, gitlab_host, projects, include, exclude, concurrency, project_concurrency, no_cache, timings,
+            metrics_json, debug):
+    import gitlab
+
+    from . import backup as variable_backup
+
+    passphrase = os.environ.get(BACKUP_PASSPHRASE_ENV)
+    try:
+        try:
+            header, documents = variable_backup.read_archive(archive, passphrase)
+        except variable_backup.PassphraseRequired:
+            passphrase = click.prompt("Passphrase", hide_input=True)
+            header, documents = variable_backup.read_archive(archive, passphrase)
+        documents = list(documents)
+    except variable_backup.BackupError as e:
+        raise click.ClickException(str(e))
+    except ImportError:
+        raise click.ClickException(
+            'Encrypted backups require cryptography: pip install "populate-secrets-gitlab[encryption]"'
+        )
+
+    gitlab_host = gitlab_host or header["gitlab_url"]
     try:
         gitlab_token = os.environ["GITLAB_TOKEN"]
     except KeyError:
@@ -368,65 +2497,55 @@ def download(environment, gitlab_host, project, output_dir, debug):
             f"GITLAB_TOKEN must be set. Get token from https://{gitlab_host}/-/profile/personal_access_tokens"
         )
 
-    if not os.path.isdir(output_dir):
-        raise click.ClickException(f"Output directory does not exist: {output_dir}")
-
-    gitlabClient = gitlab_client(gitlab_host, gitlab_token)
+    if projects:
+        wanted = set(projects)
+        documents = [d for d in documents if d["project"]["path"] in wanted]
+        missing = wanted - {d["project"]["path"] for d in documents}
+        if missing:
+            raise click.ClickException("Not in the backup: {}".format(", ".join(sorted(missing))))
+
+    include, exclude = _key_filters(include, exclude)
+    multiple = len(documents) > 1
+    metrics = _start_metrics(timings, metrics_json)
+    pool_size = concurrency * min(project_concurrency, max(len(documents), 1))
+    gitlabClient = gitlab_client(gitlab_host, gitlab_token, pool_size=pool_size, metrics=metrics)
     if debug:
         gitlabClient.enable_debug()
+    cache = _open_cache(gitlab_host, gitlab_token, no_cache)
 
-    try:
-        gitlabProject = gitlabClient.projects.get(id=project)
-    except gitlab.exceptions.GitlabHttpError:
-        raise click.ClickException("Could not find project: {}".format(project))
-
-    if not gitlabProject:
-        raise click.ClickException("Could not find project: {}".format(project))
-
-    click.secho(
-        f"Downloading vars from {gitlabProject.name} ({gitlabProject.id}) — environment: {environment}",
-        fg="green",
-    )
-
-    variables = gitlabProject.variables.list(get_all=True)
-
-    env_vars = []
-    for v in variables:
-        scope = "global" if v.environment_scope == "*" else v.environment_scope
-        if scope == environment or scope == "global":
-            env_vars.append(v)
-
-    if not env_vars:
-        click.secho("No variables found.", fg="yellow")
-        return
+    def run_project(document):
+        prefix = f"[{document['project']['path']}] " if multiple else ""
+        try:
+            return _restore_project(gitlabClient, cache, document, include, exclude, concurrency, prefix)
+        except (ProjectNotFoundError, gitlab.exceptions.GitlabError, OSError) as e:
+            if not multiple:
+                raise click.ClickException(str(e))
+            logger.info(prefix + str(e))
+            return e
+
+    with ThreadPoolExecutor(max_workers=project_concurrency) as executor:
+        outcomes = list(executor.map(run_project, documents))
+
+    summary = [(document["project"]["path"], outcome) for document, outcome in zip(documents, outcomes)]
+    if multiple:
+        _print_write_summary(summary)
+    elif summary:
+        logger.info("{} unchanged, {} updated, {} created, {} deleted, {} failed".format(*outcomes[0]))
+    logger.info("Done")
 
-    env_vars.sort(key=lambda v: v.key)
+    if any(isinstance(outcome, Exception) or outcome[-1] for _, outcome in summary):
+        raise click.ClickException("Some variables failed to restore")
 
-    output_path = os.path.join(output_dir, f"{environment}.env")
 
-    if os.path.exists(output_path):
-        click.secho(f"File already exists: {output_path}", fg="yellow")
-        choice = click.prompt(
-            "Choose action",
-            type=click.Choice(["overwrite", "rename", "cancel"], case_sensitive=False),
-            default="cancel",
-        )
-        if choice == "cancel":
-            click.secho("Cancelled.", fg="red")
-            return
-        elif choice == "rename":
-            n = 1
-            while True:
-                output_path = os.path.join(output_dir, f"{environment}-{n}.env")
-                if not os.path.exists(output_path):
-                    break
-                n += 1
+@cli.group(name="cache", help="Manage the local cache of project lookups and variable listings")
+def cache_group():
+    pass
 
-    with open(output_path, "w") as f:
-        for v in env_vars:
-            f.write(f"{v.key}={v.value}\n")
 
-    click.secho(f"Saved {len(env_vars)} variable(s) to {output_path}", fg="green")
+@cache_group.command(name="clear", help="Delete all cached data")
+def cache_clear():
+    variable_cache.clear()
+    click.secho(f"Cleared cache at {variable_cache.cache_dir()}", fg="green")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+"""Asyncio engine for the project variables REST API.
+
+Talks to `/projects/:id/variables` directly through a pooled `httpx.AsyncClient`
+instead of python-gitlab, so listing pages and writes can be in flight at the
+same time. Requires the optional `httpx` dependency:
+`pip install "populate-secrets-gitlab[async]"`.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from traceback import format_exc
+from types import SimpleNamespace
+from urllib.parse import quote
+
+import gitlab
+import httpx
+
+from . import util
+from .rate_limit import RateLimiter
+from .variables import PER_PAGE, Variable
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Paces and retries requests through a `RateLimiter`, like
+    `rate_limit.RateLimitedSession` does for python-gitlab."""
+
+    def __init__(self, transport, limiter=None, metrics=None):
+        self._transport = transport
+        self.limiter = limiter or RateLimiter()
+        self.metrics = metrics
+
+    async def handle_async_request(self, request):
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.limiter.wait_time())
+            response = await self._transport.handle_async_request(request)
+            self.limiter.observe(response.headers)
+
+            if not self.limiter.should_retry(request.method, response.status_code, attempt, response.headers):
+                if self.metrics is not None:
+                    # The body is still a stream at this level, so count the advertised size
+                    self.metrics.record(
+                        request.method, str(request.url), response.status_code,
+                        time.perf_counter() - started, attempt,
+                        int(response.headers.get("Content-Length") or 0),
+                    )
+                return response
+
+            delay = self.limiter.retry_delay(response.headers, attempt)
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class AsyncGitlab:
+    def __init__(self, gitlab_host, gitlab_token, max_connections=20, transport=None, limiter=None,
+                 metrics=None):
+        base_url = util.prepare_gitlab_host(gitlab_host).rstrip("/")
+        self.url = base_url
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            )
+        self._client = httpx.AsyncClient(
+            base_url=f"{base_url}/api/v4",
+            headers={"PRIVATE-TOKEN": gitlab_token},
+            # Requests queue on the pool rather than time out waiting for a connection
+            timeout=httpx.Timeout(30.0, pool=None),
+            transport=RateLimitedTransport(transport, limiter, metrics),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+
+    async def _request(self, method, path, **kwargs):
+        response = await self._client.request(method, path, **kwargs)
+        if response.status_code >= 400:
+            raise gitlab.exceptions.GitlabHttpError(
+                error_message=response.text,
+                response_code=response.status_code,
+                response_body=response.content,
+            )
+        return response
+
+    async def get_project(self, project):
+        response = await self._request("GET", f"/projects/{quote(str(project), safe='')}")
+        data = response.json()
+        return SimpleNamespace(id=data["id"], name=data["name"])
+
+    async def _get_page(self, project_id, page):
+        return await self._request(
+            "GET",
+            f"/projects/{project_id}/variables",
+            params={"per_page": PER_PAGE, "page": page},
+        )
+
+    async def iter_pages(self, project_id):
+        """Yield pages of variables in order as they arrive."""
+        first = await self._get_page(project_id, 1)
+        yield [Variable.from_json(v) for v in first.json()]
+
+        total_pages = first.headers.get("X-Total-Pages")
+        if total_pages:
+            # Page count is known up front, so request the rest concurrently
+            tasks = [
+                asyncio.ensure_future(self._get_page(project_id, page))
+                for page in range(2, int(total_pages) + 1)
+            ]
+            try:
+                for task in tasks:
+                    response = await task
+                    yield [Variable.from_json(v) for v in response.json()]
+            finally:
+                for task in tasks:
+                    task.cancel()
+        else:
+            # Gitlab omits the totals for very large collections; walk the pages instead
+            next_page = first.headers.get("X-Next-Page")
+            while next_page:
+                response = await self._get_page(project_id, int(next_page))
+                yield [Variable.from_json(v) for v in response.json()]
+                next_page = response.headers.get("X-Next-Page")
+
+    async def list_variables(self, project_id):
+        return [v async for page in self.iter_pages(project_id) for v in page]
+
+    async def write_variable(self, project_id, environment, key, value, should_mask, project_var):
+        """Create or update one variable, returning the same result tuple as
+        `app._write_variable`."""
+        is_update = project_var is not None
+        payload = {"key": key, "value": value, "environment_scope": environment}
+        if should_mask:
+            payload["masked"] = True
+
+        try:
+            if is_update:
+                await self._request(
+                    "PUT",
+                    f"/projects/{project_id}/variables/{quote(key, safe='')}",
+                    params={"filter[environment_scope]": environment},
+                    json=payload,
+                )
+            else:
+                await self._request("POST", f"/projects/{project_id}/variables", json=payload)
+        except gitlab.exceptions.GitlabHttpError:
+            return environment, key, is_update, ("Failed to write {} due to error from Gitlab API".format(key), format_exc())
+        except httpx.HTTPError:
+            return environment, key, is_update, ("Failed to write {} due to unexpected Gitlab error".format(key), format_exc())
+
+        return environment, key, is_update, None
+
+    async def write_variables(self, project_id, pending, on_result=None):
+        """Write ``(environment, key, value, should_mask, project_var)`` entries.
+
+        ``on_result`` is called with each result as soon as its write completes.
+        """
+        async def write(item):
+            result = await self.write_variable(project_id, *item)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        # gather keeps results in submission order; the pool bounds what is in flight
+        return await asyncio.gather(*(write(item) for item in pending))
+
+    async def delete_variable(self, project_id, environment, key):
+        """Delete one variable, returning the same result tuple as `app._delete_variable`."""
+        try:
+            await self._request(
+                "DELETE",
+                f"/projects/{project_id}/variables/{quote(key, safe='')}",
+                params={"filter[environment_scope]": environment},
+            )
+        except gitlab.exceptions.GitlabHttpError:
+            return environment, key, ("Failed to delete {} due to error from Gitlab API".format(key), format_exc())
+        except httpx.HTTPError:
+            return environment, key, ("Failed to delete {} due to unexpected Gitlab error".format(key), format_exc())
+
+        return environment, key, None
+
+    async def delete_variables(self, project_id, deletions):
+        """Delete ``(environment, key)`` pairs, pipelined like `write_variables`."""
+        return await asyncio.gather(
+            *(self.delete_variable(project_id, environment, key) for environment, key in deletions)
+        )
+
+
+def iter_project_variables(gitlab_host, gitlab_token, project, max_pages_buffered=4, **client_kwargs):
+    """Fetch a project and stream its variables. Returns ``(project, variables)``.
+
+    The event loop runs on a background thread and hands pages over through a
+    bounded queue, so callers can consume variables synchronously as they
+    arrive without the whole listing being held in memory.
+    """
+    pages = queue.Queue(maxsize=max_pages_buffered)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        async with AsyncGitlab(gitlab_host, gitlab_token, **client_kwargs) as gl:
+            gitlab_project = await gl.get_project(project)
+            pages.put(("project", gitlab_project))
+            async for page in gl.iter_pages(gitlab_project.id):
+                # Block in a worker thread so in-flight page requests keep running
+                await loop.run_in_executor(None, pages.put, ("page", page))
+        pages.put(("done", None))
+
+    def worker():
+        try:
+            asyncio.run(run())
+        except BaseException as e:
+            pages.put(("error", e))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+    kind, gitlab_project = pages.get()
+    if kind == "error":
+        raise gitlab_project
+
+    def variables():
+        while True:
+            kind, payload = pages.get()
+            if kind == "error":
+                raise payload
+            if kind == "done":
+                return
+            yield from payload
+
+    return gitlab_project, variables()
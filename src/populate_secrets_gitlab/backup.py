@@ -0,0 +1,143 @@
+"""Group backup archives.
+
+An archive is a gzip-compressed JSON Lines file. The first line is a header
+naming the Gitlab host and group; each following line is one project's
+document: its ID, path and name, and every variable as the API lists it, with
+its scope, flags, type and description.
+Documents are appended as listings arrive, so the archive never needs to be
+held in memory whole.
+
+When encrypted, each document is compressed and then encrypted with Fernet
+(AES-128-CBC with an HMAC), using a key derived from a passphrase with
+PBKDF2-SHA256. The salt and iteration count go in the header, which is not
+encrypted. Encryption needs the `cryptography` package.
+
+Archives hold variable values, so they are created readable by the current
+user only.
+"""
+
+import base64
+import gzip
+import json
+import os
+import zlib
+
+ARCHIVE_FORMAT = "populate-secrets-gitlab-backup"
+ARCHIVE_VERSION = 1
+KDF_ITERATIONS = 600_000
+
+
+class BackupError(Exception):
+    pass
+
+
+class PassphraseRequired(BackupError):
+    pass
+
+
+def _fernet(passphrase, salt, iterations):
+    # Imported here so unencrypted backups work without cryptography installed
+    from cryptography.fernet import Fernet
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(passphrase.encode())))
+
+
+def project_document(project, variables):
+    """The archive entry for one project, from a ``{"id", "path", "name"}`` dict and the variables' JSON."""
+    return {
+        "project": project,
+        "variables": [dict(variable) for variable in variables],
+    }
+
+
+class ArchiveWriter:
+    """Writes an archive through a temp file, replacing ``path`` only once `close` succeeds.
+
+    Raises ImportError on creation if a ``passphrase`` is given without
+    cryptography installed.
+    """
+
+    def __init__(self, path, gitlab_url, group, passphrase=None):
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        self.count = 0
+
+        header = {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "gitlab_url": str(gitlab_url),
+                  "group": group, "encrypted": passphrase is not None}
+        self._fernet = None
+        if passphrase is not None:
+            salt = os.urandom(16)
+            self._fernet = _fernet(passphrase, salt, KDF_ITERATIONS)
+            header["kdf"] = {"salt": base64.b64encode(salt).decode(), "iterations": KDF_ITERATIONS}
+
+        fd = os.open(self._tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        # gzip doesn't close a file object it was handed, so keep it to close after
+        self._raw = os.fdopen(fd, "wb")
+        self._file = gzip.open(self._raw, "wt", encoding="utf-8")  # noqa: SIM115 - closed by close()/abort()
+        self._file.write(json.dumps(header) + "\n")
+
+    def add(self, document):
+        line = json.dumps(document)
+        if self._fernet is not None:
+            line = self._fernet.encrypt(zlib.compress(line.encode())).decode()
+        self._file.write(line + "\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+        self._raw.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self._raw.close()
+        os.remove(self._tmp_path)
+
+
+def read_archive(path, passphrase=None):
+    """Returns ``(header, documents)``, with documents decoded lazily as they are consumed.
+
+    Raises `BackupError` if the file isn't an archive or can't be decrypted
+    with ``passphrase``, and `PassphraseRequired` if it is encrypted and no
+    passphrase is given.
+    """
+    f = gzip.open(path, "rt", encoding="utf-8")  # noqa: SIM115 - closed once documents are read
+    try:
+        header = json.loads(f.readline())
+    except (OSError, EOFError, ValueError) as e:
+        f.close()
+        raise BackupError(f"Not a backup archive: {path}: {e}")
+
+    if not isinstance(header, dict) or header.get("format") != ARCHIVE_FORMAT:
+        f.close()
+        raise BackupError(f"Not a backup archive: {path}")
+    if header.get("version") != ARCHIVE_VERSION:
+        f.close()
+        raise BackupError(f"Unsupported backup archive version in {path}")
+
+    fernet = None
+    if header.get("encrypted"):
+        if passphrase is None:
+            f.close()
+            raise PassphraseRequired(f"{path} is encrypted; a passphrase is needed to read it")
+        kdf = header["kdf"]
+        fernet = _fernet(passphrase, base64.b64decode(kdf["salt"]), kdf["iterations"])
+
+    def documents():
+        with f:
+            for line in f:
+                yield json.loads(line) if fernet is None else _decrypt(fernet, line, path)
+
+    return header, documents()
+
+
+def _decrypt(fernet, line, path):
+    from cryptography.fernet import InvalidToken
+
+    try:
+        return json.loads(zlib.decompress(fernet.decrypt(line.strip().encode())))
+    except InvalidToken:
+        raise BackupError(f"Can't decrypt {path}: wrong passphrase or corrupted archive")
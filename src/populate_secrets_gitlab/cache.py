@@ -0,0 +1,208 @@
+"""On-disk cache of project lookups and variable listings.
+
+Entries live under `$XDG_CACHE_HOME/populate-secrets-gitlab`, namespaced by a
+hash of the Gitlab host and token so different accounts never see each other's
+data. Files are created readable by the current user only, since listings hold
+variable values.
+
+Listings are stored per page together with the page's `ETag`. Within the TTL a
+listing is served straight from disk; after that it is revalidated with
+conditional requests, so unchanged pages cost a `304` instead of a full body.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from .variables import PER_PAGE, Variable
+
+DEFAULT_TTL = 300
+PROJECT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100
+
+
+def cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "populate-secrets-gitlab")
+
+
+def clear():
+    """Remove every cached entry, for all hosts and tokens."""
+    shutil.rmtree(cache_dir(), ignore_errors=True)
+
+
+def _write_json(path, data):
+    # Write privately and atomically so a crash never leaves a torn entry behind. mkstemp
+    # creates the file 0600 under a name of its own, so concurrent writers never share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Cache:
+    def __init__(self, gitlab_host, gitlab_token, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        namespace = hashlib.sha256(f"{gitlab_host}\0{gitlab_token}".encode()).hexdigest()[:16]
+        self.path = os.path.join(cache_dir(), namespace)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Projects share one file, so concurrent lookups must not interleave its read-modify-write
+        self._projects_lock = threading.Lock()
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+
+    def _projects_path(self):
+        return os.path.join(self.path, "projects.json")
+
+    def _listing_path(self, project_id):
+        return os.path.join(self.path, f"variables-{project_id}.json")
+
+    def get_project(self, project):
+        """Returns the cached ``{"id", "name"}`` for a project path or ID, or None."""
+        entry = (_read_json(self._projects_path()) or {}).get(str(project))
+        if entry is None or time.time() - entry["cached_at"] > PROJECT_TTL:
+            return None
+        return entry
+
+    def set_project(self, project, project_id, name):
+        with self._projects_lock:
+            projects = _read_json(self._projects_path()) or {}
+            projects[str(project)] = {"id": project_id, "name": name, "cached_at": time.time()}
+            _write_json(self._projects_path(), projects)
+
+    def get_listing(self, project_id):
+        path = self._listing_path(project_id)
+        entry = _read_json(path)
+        if entry is not None:
+            # Reads count as use for LRU eviction
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Evicted or invalidated by another thread since it was read
+                pass
+        return entry
+
+    def set_listing(self, project_id, pages):
+        _write_json(self._listing_path(project_id), {"fetched_at": time.time(), "pages": pages})
+        self._evict()
+
+    def invalidate_listing(self, project_id):
+        try:
+            os.remove(self._listing_path(project_id))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        listings = []
+        for name in os.listdir(self.path):
+            if not (name.startswith("variables-") and name.endswith(".json")):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                listings.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                # Another thread got to it first
+                continue
+        listings.sort(reverse=True)
+        for _, path in listings[self.max_entries:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _get_page(gitlabClient, project_id, page, etag):
+    headers = dict(gitlabClient.headers)
+    if etag:
+        headers["If-None-Match"] = etag
+
+    response = gitlabClient.session.get(
+        f"{gitlabClient.api_url}/projects/{project_id}/variables",
+        params={"per_page": PER_PAGE, "page": page},
+        headers=headers,
+        timeout=gitlabClient.timeout,
+        verify=gitlabClient.ssl_verify,
+    )
+    if response.status_code not in (200, 304):
+        import gitlab
+
+        raise gitlab.exceptions.GitlabHttpError(
+            error_message=response.text,
+            response_code=response.status_code,
+            response_body=response.content,
+        )
+    return response
+
+
+def _next_page(response, page_number, cached_next=None):
+    """The following page's number, from this response's pagination headers.
+    ``cached_next`` is used only when a 304 carries no pagination headers at all."""
+    if "X-Next-Page" not in response.headers and "X-Total-Pages" not in response.headers:
+        return cached_next
+    next_page = response.headers.get("X-Next-Page")
+    if next_page:
+        return next_page
+    total_pages = response.headers.get("X-Total-Pages")
+    if total_pages and page_number < int(total_pages):
+        return str(page_number + 1)
+    return None
+
+
+def iter_cached_variables(gitlabClient, cache, project_id, max_age=None):
+    """Yield a project's variables, from the cache when it is fresh enough.
+
+    ``max_age`` defaults to the cache's TTL; pass 0 to always revalidate.
+    Fetched pages are yielded as they arrive and the cache entry is written
+    once the last one has been read, so streaming callers still stream.
+    """
+    max_age = cache.ttl if max_age is None else max_age
+    entry = cache.get_listing(project_id)
+
+    if entry is not None and time.time() - entry["fetched_at"] < max_age:
+        for page in entry["pages"]:
+            yield from (Variable(*v) for v in page["variables"])
+        return
+
+    cached_pages = entry["pages"] if entry is not None else []
+    pages = []
+    page_number = 1
+
+    while page_number:
+        cached = cached_pages[page_number - 1] if page_number <= len(cached_pages) else None
+        response = _get_page(gitlabClient, project_id, page_number, cached and cached["etag"])
+
+        if response.status_code == 304 and cached is not None:
+            # The ETag only covers this page's body; whether another page follows can change
+            # under it, e.g. when a variable is appended after a full last page
+            pages.append(dict(cached, next=_next_page(response, page_number, cached["next"])))
+        else:
+            pages.append({
+                "etag": response.headers.get("ETag"),
+                "next": _next_page(response, page_number),
+                "variables": [list(Variable.from_json(d)) for d in response.json()],
+            })
+
+        yield from (Variable(*v) for v in pages[-1]["variables"])
+        page_number = int(pages[-1]["next"]) if pages[-1]["next"] else None
+
+    cache.set_listing(project_id, pages)
+
+
+def load_variables(gitlabClient, cache, project_id, max_age=None):
+    """Return a project's variables as a list, from the cache when it is fresh enough."""
+    return list(iter_cached_variables(gitlabClient, cache, project_id, max_age=max_age))
@@ -0,0 +1,50 @@
+"""Differences between two sets of variable values, for `compare`.
+
+Both sides are plain ``key -> value`` maps, so a scope from a listing and a
+local .env file compare the same way. Unless values are asked for, they are
+reported as short HMAC-SHA256 digests under a random key made for each report:
+equal values get equal digests within one report, which is enough to tell
+whether they are the same, but a digest can't be checked against guesses
+offline, or matched against another run's.
+"""
+
+import hashlib
+import hmac
+import os
+
+DIGEST_LENGTH = 12
+
+
+def redact(value, key):
+    if value is None:
+        return None
+    return "hmac:" + hmac.new(key, value.encode(), hashlib.sha256).hexdigest()[:DIGEST_LENGTH]
+
+
+def diff(values, against, sensitive=False, digest_key=None):
+    """Compare ``values`` with the ``against`` baseline.
+
+    Returns a dict of ``added`` (keys only in ``values``), ``removed`` (keys
+    only in ``against``) and ``changed`` entries sorted by key, plus the number
+    of ``unchanged`` keys. Values are digests unless ``sensitive``; ``digest_key``
+    is the HMAC key, random by default.
+    """
+    digest_key = digest_key or os.urandom(32)
+    show = (lambda value: value) if sensitive else (lambda value: redact(value, digest_key))
+
+    added = [{"key": key, "value": show(values[key])} for key in sorted(values.keys() - against.keys())]
+    removed = [{"key": key, "value": show(against[key])} for key in sorted(against.keys() - values.keys())]
+
+    changed = []
+    unchanged = 0
+    for key in sorted(values.keys() & against.keys()):
+        if values[key] == against[key]:
+            unchanged += 1
+            continue
+        changed.append({"key": key, "value": show(values[key]), "against_value": show(against[key])})
+
+    return {"added": added, "removed": removed, "changed": changed, "unchanged": unchanged}
+
+
+def has_drift(result):
+    return bool(result["added"] or result["removed"] or result["changed"])
@@ -0,0 +1,111 @@
+"""Effective variables: what a job in an environment actually sees.
+
+Jobs get instance, group and project variables together. When a key is
+defined at several levels, the project variable wins, then the closest
+subgroup's, up to the top-level group, then the instance's. Within one level,
+the variable whose environment scope matches the environment most
+specifically wins: an exact scope over a wildcard like `review/*`, and any
+of those over `*`. Instance variables have no scope and apply everywhere.
+
+Group and instance listings are shared by every project resolved in a run, so
+`ListingCache` fetches each one once however many projects ask for it.
+"""
+
+import re
+import threading
+from concurrent.futures import Future
+from typing import NamedTuple, Optional
+
+
+class EffectiveVariable(NamedTuple):
+    key: str
+    value: Optional[str]
+    masked: bool
+    protected: bool
+    environment_scope: str
+    # "project", "group" or "instance"
+    level: str
+    # Project or group path; None for instance variables
+    source: Optional[str]
+
+
+def scope_matches(scope, environment):
+    """Whether an environment scope applies to an environment. `*` in a scope matches any characters."""
+    if scope == environment or scope == "*":
+        return True
+    if "*" not in scope:
+        return False
+    pattern = ".*".join(re.escape(part) for part in scope.split("*"))
+    return re.fullmatch(pattern, environment) is not None
+
+
+def scope_specificity(scope):
+    """Sort key ranking matching scopes, most specific last."""
+    if scope == "*":
+        return (0, 0)
+    if "*" in scope:
+        # A wildcard with more fixed characters narrows the match further
+        return (1, len(scope.replace("*", "")))
+    return (2, 0)
+
+
+def ancestor_groups(namespace_path):
+    """Paths of a namespace and every group above it, top-level first, e.g.
+    ``a``, ``a/b``, ``a/b/c`` for ``a/b/c``."""
+    parts = namespace_path.split("/")
+    return ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def _pick_level(variables, environment, level, source):
+    """The most specific matching variable per key within one level."""
+    picked = {}
+    for variable in variables:
+        scope = getattr(variable, "environment_scope", "*") or "*"
+        if not scope_matches(scope, environment):
+            continue
+        current = picked.get(variable.key)
+        if current is not None and scope_specificity(current.environment_scope) >= scope_specificity(scope):
+            continue
+        picked[variable.key] = EffectiveVariable(
+            variable.key, variable.value, variable.masked, variable.protected, scope, level, source,
+        )
+    return picked
+
+
+def resolve(environment, project, project_vars, group_listings, instance_vars):
+    """Effective variables for ``environment``, sorted by key.
+
+    ``group_listings`` are ``(group_path, variables)`` pairs, top-level group
+    first, as from `ancestor_groups`.
+    """
+    effective = _pick_level(instance_vars, environment, "instance", None)
+    for group, variables in group_listings:
+        effective.update(_pick_level(variables, environment, "group", group))
+    effective.update(_pick_level(project_vars, environment, "project", project))
+    return [effective[key] for key in sorted(effective)]
+
+
+class ListingCache:
+    """Per-run memo of listings, safe to share between threads.
+
+    The first caller for a key fetches it; callers arriving while that fetch
+    is in flight wait for its result rather than starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def get(self, key, fetch):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(fetch())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
@@ -1,5 +1,18 @@
-import gitlab
 from . import util
 
-def gitlab_client(gitlab_host, gitlab_token):
-    return gitlab.Gitlab(util.prepare_gitlab_host(gitlab_host), private_token=gitlab_token)
+def gitlab_client(gitlab_host, gitlab_token, pool_size=None, limiter=None, metrics=None):
+    # Imported here so the CLI can start without loading python-gitlab and requests
+    import gitlab
+    import requests
+    from .rate_limit import RateLimitedSession
+
+    # Every request is paced and retried through the shared rate limiter,
+    # and timed into `metrics` when one is given
+    session = RateLimitedSession(limiter, metrics)
+    if pool_size:
+        # Keep one pooled connection per worker so parallel writes reuse sockets
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+    return gitlab.Gitlab(util.prepare_gitlab_host(gitlab_host), private_token=gitlab_token, session=session)
@@ -0,0 +1,126 @@
+"""GraphQL read path for project variables.
+
+Looks the project up and reads its CI variables through `/api/graphql` with a
+single query per page, so the lookup and the first page of variables share a
+round trip. Requests go through the python-gitlab client's session and so are
+rate limited and timed like REST calls.
+
+Gitlab's GraphQL API has no mutations for CI variables, so writes always use
+the REST API.
+"""
+
+from types import SimpleNamespace
+
+from .variables import PER_PAGE, Variable
+
+# GraphQL braces clash with str.format, so the queries are assembled by concatenation
+VARIABLE_FIELDS = """
+      ciVariables(first: """ + str(PER_PAGE) + """, after: $after) {
+        nodes { key value environmentScope masked protected variableType raw description }
+        pageInfo { hasNextPage endCursor }
+      }
+"""
+
+PROJECT_BY_PATH_QUERY = """
+query($project: ID!, $after: String) {
+  project(fullPath: $project) {
+    id
+    name
+""" + VARIABLE_FIELDS + """
+  }
+}
+"""
+
+PROJECT_BY_ID_QUERY = """
+query($project: [ID!], $after: String) {
+  projects(ids: $project) {
+    nodes {
+      id
+      name
+""" + VARIABLE_FIELDS + """
+    }
+  }
+}
+"""
+
+
+class GraphqlError(Exception):
+    """The GraphQL API rejected a query, e.g. because the Gitlab version lacks a field."""
+
+
+def _query(gitlabClient, query, variables):
+    import gitlab
+
+    response = gitlabClient.session.post(
+        f"{gitlabClient.url}/api/graphql",
+        json={"query": query, "variables": variables},
+        headers=gitlabClient.headers,
+        timeout=gitlabClient.timeout,
+        verify=gitlabClient.ssl_verify,
+    )
+    if response.status_code >= 400:
+        raise gitlab.exceptions.GitlabHttpError(
+            error_message=response.text,
+            response_code=response.status_code,
+            response_body=response.content,
+        )
+
+    body = response.json()
+    if body.get("errors"):
+        raise GraphqlError("; ".join(e.get("message", str(e)) for e in body["errors"]))
+    return body["data"]
+
+
+def _get_project_page(gitlabClient, project, after):
+    import gitlab
+
+    if str(project).isdigit():
+        data = _query(gitlabClient, PROJECT_BY_ID_QUERY, {
+            "project": [f"gid://gitlab/Project/{project}"], "after": after,
+        })
+        nodes = data["projects"]["nodes"]
+        gitlab_project = nodes[0] if nodes else None
+    else:
+        data = _query(gitlabClient, PROJECT_BY_PATH_QUERY, {"project": str(project), "after": after})
+        gitlab_project = data["project"]
+
+    if gitlab_project is None:
+        raise gitlab.exceptions.GitlabHttpError(error_message="404 Project Not Found", response_code=404)
+    return gitlab_project
+
+
+def _decode(node):
+    return Variable(
+        node["key"],
+        node.get("value"),
+        node.get("environmentScope") or "*",
+        bool(node.get("masked")),
+        bool(node.get("protected")),
+        # GraphQL spells the type as an enum, e.g. FILE for REST's "file"
+        (node.get("variableType") or "ENV_VAR").lower(),
+        bool(node.get("raw")),
+        node.get("description"),
+    )
+
+
+def iter_project_variables(gitlabClient, project):
+    """Fetch a project and its variables. Returns ``(project, variables)``.
+
+    The first page is read eagerly along with the project; later pages are
+    fetched lazily as ``variables`` is consumed. Raises `GraphqlError` if the
+    server can't answer the query at all.
+    """
+    first = _get_project_page(gitlabClient, project, None)
+    gitlab_project = SimpleNamespace(id=int(first["id"].rsplit("/", 1)[-1]), name=first["name"])
+
+    def variables():
+        connection = first["ciVariables"]
+        while True:
+            for node in connection["nodes"]:
+                yield _decode(node)
+            if not connection["pageInfo"]["hasNextPage"]:
+                return
+            after = connection["pageInfo"]["endCursor"]
+            connection = _get_project_page(gitlabClient, project, after)["ciVariables"]
+
+    return gitlab_project, variables()
@@ -0,0 +1,111 @@
+"""Append-only checkpoint journals for resumable writes.
+
+Each `write` keeps one journal per project and environment under
+`$XDG_STATE_HOME/populate-secrets-gitlab/journals`. It is named by a hash of
+the Gitlab host, project, environment, .env values and key filters, so a
+journal only ever applies to the exact same change set. The first line records
+the planned writes. After that, one line is appended as each key lands. A
+journal is removed once every planned key has been written.
+
+Journals never hold variable values, only keys. On `--resume` the values are
+read again from the unchanged .env file.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from .variables import Variable
+
+
+def journal_dir():
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "populate-secrets-gitlab", "journals")
+
+
+def journal_id(gitlab_url, project, environment, env_values, options):
+    data = json.dumps([str(gitlab_url), str(project), environment, sorted(env_values.items()), options])
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def for_target(cls, gitlab_url, project, environment, env_values, options):
+        name = journal_id(gitlab_url, project, environment, env_values, options) + ".jsonl"
+        return cls(os.path.join(journal_dir(), name))
+
+    def load(self):
+        """Returns ``(plan, written)`` from an earlier run, or None if there is no usable journal.
+
+        ``plan`` is a list of ``(environment, key, is_update, should_mask)`` and
+        ``written`` the set of ``(environment, key)`` that landed.
+        """
+        try:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+
+        try:
+            plan = [tuple(entry) for entry in json.loads(lines[0])["plan"]]
+        except (IndexError, ValueError, KeyError):
+            return None
+
+        written = set()
+        for line in lines[1:]:
+            try:
+                written.add(tuple(json.loads(line)["written"]))
+            except (ValueError, KeyError):
+                # A torn last line from a crash mid-append; anything after it is lost too
+                break
+        return plan, written
+
+    def start(self, pending):
+        """Begin a fresh journal for ``(environment, key, value, should_mask, project_var)`` entries."""
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        plan = [[environment, key, project_var is not None, should_mask]
+                for environment, key, _, should_mask, project_var in pending]
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        self._file = os.fdopen(fd, "w")
+        self._file.write(json.dumps({"plan": plan}) + "\n")
+        self._file.flush()
+
+    def resume(self):
+        """Reopen an existing journal for appending."""
+        self._file = open(self.path, "a")  # noqa: SIM115 - kept open across writes, closed by close()
+
+    def record(self, environment, key):
+        with self._lock:
+            self._file.write(json.dumps({"written": [environment, key]}) + "\n")
+            # Flush each line so a killed process still leaves every landed key behind
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def remaining_writes(plan, written, env_values):
+    """Rebuild pending write entries for planned keys that haven't landed yet."""
+    pending = []
+    for environment, key, is_update, should_mask in plan:
+        if (environment, key) in written or key not in env_values:
+            continue
+        # Only whether it's an update matters to the writers, so a placeholder record will do
+        project_var = Variable(key, None, environment) if is_update else None
+        pending.append((environment, key, env_values[key], should_mask, project_var))
+    return pending
@@ -0,0 +1,125 @@
+"""Per-request timing of Gitlab API calls.
+
+`RequestMetrics` collects one record per logical request sent through
+`rate_limit.RateLimitedSession` or `async_engine.RateLimitedTransport`. Latency
+covers the whole request as the caller sees it, including pacing and any
+retries. Records are grouped into phases by endpoint, so a slow run can be
+traced to project lookup, variable listing or writes.
+"""
+
+import math
+import re
+import threading
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+PHASES = ("lookup", "list", "graphql", "write", "delete", "other")
+
+
+class RequestRecord(NamedTuple):
+    method: str
+    endpoint: str
+    phase: str
+    status: int
+    latency: float
+    retries: int
+    bytes: int
+
+
+def endpoint_template(url):
+    """The API path of a URL with IDs and keys replaced, e.g. ``/projects/:id/variables/:key``."""
+    path = urlsplit(url).path
+    path = path.split("/api/v4", 1)[-1]
+    path = re.sub(r"^/(projects|groups)/[^/]+", r"/\1/:id", path)
+    return re.sub(r"/variables/[^/]+", "/variables/:key", path)
+
+
+def request_phase(method, endpoint):
+    if endpoint == "/api/graphql":
+        return "graphql"
+    if "/variables" in endpoint:
+        if method == "GET":
+            return "list"
+        return "delete" if method == "DELETE" else "write"
+    if re.fullmatch(r"/(projects|groups)/:id", endpoint):
+        return "lookup"
+    return "other"
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class RequestMetrics:
+    """Thread-safe collector of `RequestRecord` entries."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def record(self, method, url, status, latency, retries, size):
+        endpoint = endpoint_template(url)
+        record = RequestRecord(
+            method, endpoint, request_phase(method, endpoint), status, latency, retries, size
+        )
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        with self._lock:
+            records = list(self.records)
+
+        phases = {}
+        for phase in PHASES:
+            in_phase = [r for r in records if r.phase == phase]
+            if not in_phase:
+                continue
+            latencies = sorted(r.latency for r in in_phase)
+            phases[phase] = {
+                "requests": len(in_phase),
+                "errors": sum(1 for r in in_phase if r.status >= 400),
+                "retries": sum(r.retries for r in in_phase),
+                "bytes": sum(r.bytes for r in in_phase),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "max": latencies[-1],
+            }
+
+        endpoints = {}
+        for r in records:
+            name = f"{r.method} {r.endpoint}"
+            endpoints[name] = endpoints.get(name, 0) + 1
+
+        return {
+            "requests": len(records),
+            "retries": sum(r.retries for r in records),
+            "bytes": sum(r.bytes for r in records),
+            "phases": phases,
+            "endpoints": endpoints,
+        }
+
+    def to_json(self):
+        """The summary plus every individual request, for dashboards."""
+        summary = self.summary()
+        with self._lock:
+            summary["records"] = [r._asdict() for r in self.records]
+        return summary
+
+
+def format_summary(summary):
+    """Render `RequestMetrics.summary` as a plain text table."""
+    lines = [
+        "{} request(s), {} retried, {} byte(s) received".format(
+            summary["requests"], summary["retries"], summary["bytes"]
+        ),
+        "  {:<8}{:>10}{:>8}{:>9}{:>10}{:>10}{:>10}{:>12}".format(
+            "phase", "requests", "errors", "retries", "p50 ms", "p95 ms", "max ms", "bytes"
+        ),
+    ]
+    for phase, stats in summary["phases"].items():
+        lines.append("  {:<8}{:>10}{:>8}{:>9}{:>10.1f}{:>10.1f}{:>10.1f}{:>12}".format(
+            phase, stats["requests"], stats["errors"], stats["retries"],
+            stats["p50"] * 1000, stats["p95"] * 1000, stats["max"] * 1000, stats["bytes"],
+        ))
+    return "\n".join(lines)
@@ -0,0 +1,93 @@
+"""Key patterns for `--include`, `--exclude` and masking rules.
+
+A pattern is an exact key (`NODE_ENV`), a glob (`AWS_*`) or a regular
+expression prefixed with `re:` (`re:.*_PASSWORD$`). Globs and regexes must
+match the whole key. A `Matcher` compiles a list of patterns once: exact keys
+go in a set and every glob and regex is joined into a single regex, so checking
+a key costs one set lookup and at most one regex match however many patterns
+there are. Regexes that can't be joined without changing their meaning — those
+with groups, which backreferences and group names depend on, or with global
+inline flags like `(?i)` — are kept apart and tried one by one.
+"""
+
+import fnmatch
+import re
+
+# Substrings that made a key masked with `--mask` before masking rules were configurable
+DEFAULT_MASK_PATTERNS = ("*KEY*", "*SECRET*", "*TOKEN*")
+
+GLOB_CHARACTERS = frozenset("*?[")
+
+
+class PatternError(ValueError):
+    pass
+
+
+class Matcher:
+    def __init__(self, patterns=()):
+        self.patterns = []
+        literals = set()
+        expressions = []
+        separate = []
+
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern:
+                continue
+            self.patterns.append(pattern)
+
+            if pattern.startswith("re:"):
+                expression = pattern[len("re:"):]
+                try:
+                    compiled = re.compile(expression)
+                except re.error as e:
+                    raise PatternError(f"Invalid regular expression {pattern!r}: {e}")
+                if compiled.groups or compiled.flags & ~re.UNICODE:
+                    separate.append(compiled)
+                else:
+                    expressions.append(expression)
+            elif GLOB_CHARACTERS.intersection(pattern):
+                expressions.append(fnmatch.translate(pattern))
+            else:
+                literals.add(pattern)
+
+        self.literals = frozenset(literals)
+        self._regex = None
+        if expressions:
+            try:
+                self._regex = re.compile("|".join(f"(?:{e})" for e in expressions))
+            except re.error:
+                # Each expression compiled on its own, so match them one by one instead
+                separate.extend(re.compile(e) for e in expressions)
+        self._separate = tuple(separate)
+
+    @classmethod
+    def from_csv(cls, value):
+        return cls(value.split(",") if value else ())
+
+    @classmethod
+    def from_file(cls, path):
+        """Patterns from a file, one per line; blank lines and `#` comments are ignored."""
+        with open(path) as f:
+            return cls(line.split("#", 1)[0] for line in f)
+
+    def __contains__(self, key):
+        if key in self.literals:
+            return True
+        if self._regex is not None and self._regex.fullmatch(key) is not None:
+            return True
+        return any(regex.fullmatch(key) is not None for regex in self._separate)
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __repr__(self):
+        return f"Matcher({self.patterns!r})"
+
+
+def selected(key, include, exclude):
+    """Whether a key passes the filters: in ``include`` (when given) and not in ``exclude``."""
+    return (len(include) == 0 or key in include) and key not in exclude
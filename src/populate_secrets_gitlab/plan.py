@@ -0,0 +1,94 @@
+"""Serialized write plans, for reviewing a change set before applying it.
+
+`write --plan-out` saves the creates, updates and deletions it would make for
+each project, along with a fingerprint of the variables in the target scopes
+as they were listed. `apply` re-lists each project, refuses to go ahead if a
+fingerprint no longer matches, and otherwise executes exactly the saved
+changes without diffing again.
+
+Plans carry the values they will write, so they are created readable by the
+current user only.
+"""
+
+import hashlib
+import json
+import os
+
+from .variables import Variable
+
+PLAN_VERSION = 1
+
+
+class PlanError(Exception):
+    pass
+
+
+def fingerprint(variables, environments):
+    """A digest of every variable in the given scopes, independent of listing order."""
+    environments = set(environments)
+    entries = sorted(
+        [v.environment_scope, v.key, v.value, v.masked, v.protected]
+        for v in variables
+        if v.environment_scope in environments
+    )
+    return hashlib.sha256(json.dumps(entries).encode()).hexdigest()
+
+
+def project_plan(project, project_id, variables, environments, pending, unchanged, deletions):
+    """The plan entry for one project, from `app._plan_writes` style pending entries
+    and ``(environment, key)`` deletions."""
+    changes = [
+        {
+            "action": "update" if project_var is not None else "create",
+            "environment": environment,
+            "key": key,
+            "value": value,
+            "masked": should_mask,
+        }
+        for environment, key, value, should_mask, project_var in pending
+    ]
+    changes += [{"action": "delete", "environment": environment, "key": key} for environment, key in deletions]
+
+    return {
+        "project": str(project),
+        "project_id": project_id,
+        "environments": sorted(environments),
+        "fingerprint": fingerprint(variables, environments),
+        "unchanged": unchanged,
+        "changes": changes,
+    }
+
+
+def save(path, gitlab_url, project_plans):
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"version": PLAN_VERSION, "gitlab_url": gitlab_url, "projects": project_plans}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise PlanError(f"Not a valid plan file: {path}: {e}")
+
+    if not isinstance(data, dict) or data.get("version") != PLAN_VERSION:
+        raise PlanError(f"Unsupported plan file version in {path}")
+    return data
+
+
+def changes_to_apply(entry):
+    """Split a project plan into pending write entries and ``(environment, key)`` deletions."""
+    pending = []
+    deletions = []
+    for change in entry["changes"]:
+        environment, key = change["environment"], change["key"]
+        if change["action"] == "delete":
+            deletions.append((environment, key))
+            continue
+        # Only whether it's an update matters to the writers, so a placeholder record will do
+        project_var = Variable(key, None, environment) if change["action"] == "update" else None
+        pending.append((environment, key, change["value"], change["masked"], project_var))
+    return pending, deletions
@@ -0,0 +1,174 @@
+"""Client-side rate limiting for the Gitlab API.
+
+Gitlab reports its budget on every response through the `RateLimit-*` headers
+and answers `429 Too Many Requests` once it is spent. `RateLimiter` tracks those
+headers with a token bucket that slows requests down as the remaining budget
+shrinks, and decides when and how long to back off before retrying a throttled
+or failed request. It is shared by every request a client makes, whichever
+thread or event loop sends it.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Statuses worth retrying. A 429 was turned away before it was handled, so any
+# method is retried. Server errors are only retried for idempotent methods, since
+# the server, or a proxy's upstream, may already have applied a create; the one
+# exception is a 503 carrying Retry-After, where the server asks for the retry.
+RETRY_STATUSES = {429}
+IDEMPOTENT_RETRY_STATUSES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+# Start pacing once less than this fraction of the window's budget is left
+SLOWDOWN_FRACTION = 0.2
+
+
+class TokenBucket:
+    """Thread-safe token bucket. A ``rate`` of None means unlimited."""
+
+    def __init__(self, rate=None, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take a token and return how many seconds the caller must wait for it.
+
+        Tokens may go negative, so concurrent callers queue up behind each
+        other instead of all waking at once.
+        """
+        with self._lock:
+            if self.rate is None:
+                return 0.0
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    def __init__(self, max_retries=5, backoff_base=0.5, backoff_max=60.0, max_rate=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_rate = max_rate
+        self.bucket = TokenBucket(rate=max_rate)
+
+    def wait_time(self):
+        """Seconds to wait before sending the next request."""
+        return self.bucket.reserve()
+
+    def observe(self, headers):
+        """Adjust the pace from a response's `RateLimit-*` headers."""
+        remaining = headers.get("RateLimit-Remaining")
+        reset = headers.get("RateLimit-Reset")
+        limit = headers.get("RateLimit-Limit")
+        if remaining is None or reset is None:
+            return
+
+        try:
+            remaining = int(remaining)
+            window = max(1.0, float(reset) - time.time())
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            return
+
+        if limit is None or remaining < limit * SLOWDOWN_FRACTION:
+            # Spread what is left of the budget evenly over the rest of the window
+            rate = max(remaining, 1) / window
+            if self.max_rate is not None:
+                rate = min(rate, self.max_rate)
+            self.bucket.set_rate(rate)
+        else:
+            self.bucket.set_rate(self.max_rate)
+
+    def should_retry(self, method, status_code, attempt, headers=None):
+        if attempt >= self.max_retries:
+            return False
+        if status_code in RETRY_STATUSES:
+            return True
+        if status_code == 503 and headers is not None and "Retry-After" in headers:
+            return True
+        return status_code in IDEMPOTENT_RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+    def retry_delay(self, headers, attempt):
+        """Seconds to wait before retry number ``attempt`` (0-based)."""
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            delay = _parse_retry_after(retry_after)
+            if delay is not None:
+                return min(delay, self.backoff_max)
+
+        reset = headers.get("RateLimit-Reset")
+        if reset is not None and headers.get("RateLimit-Remaining") == "0":
+            try:
+                return min(max(0.0, float(reset) - time.time()), self.backoff_max)
+            except ValueError:
+                pass
+
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+class RateLimitedSession(requests.Session):
+    """A requests session that paces and retries every request through a `RateLimiter`."""
+
+    def __init__(self, limiter=None, metrics=None):
+        super().__init__()
+        self.limiter = limiter or RateLimiter()
+        self.metrics = metrics
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            time.sleep(self.limiter.wait_time())
+            response = super().send(request, **kwargs)
+            self.limiter.observe(response.headers)
+
+            if not self.limiter.should_retry(request.method, response.status_code, attempt, response.headers):
+                if self.metrics is not None:
+                    # Streamed bodies haven't been read yet, so fall back to the advertised size
+                    if kwargs.get("stream"):
+                        size = int(response.headers.get("Content-Length") or 0)
+                    else:
+                        size = len(response.content)
+                    self.metrics.record(
+                        request.method, request.url, response.status_code,
+                        time.perf_counter() - started, attempt, size,
+                    )
+                return response
+
+            delay = self.limiter.retry_delay(response.headers, attempt)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
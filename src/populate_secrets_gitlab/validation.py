@@ -0,0 +1,74 @@
+"""Local checks against Gitlab's rules for CI/CD variables.
+
+Gitlab rejects a create or update with a 400 if the key isn't a valid variable
+name, the value is too long, or a masked value can't be masked: under 8
+characters, more than one line, or characters outside the Base64 alphabet and
+`@ : . ~`. Checking pending writes locally finds every such problem at once,
+without spending a request on each.
+"""
+
+import re
+from typing import NamedTuple
+
+MAX_KEY_LENGTH = 255
+MAX_VALUE_LENGTH = 10_000
+MIN_MASKED_LENGTH = 8
+
+KEY_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+# RFC 4648 Base64 and URL-safe Base64 characters, plus the extras Gitlab allows
+MASKABLE_PATTERN = re.compile(r"[A-Za-z0-9+/=_@:.~-]+")
+
+
+class Violation(NamedTuple):
+    environment: str
+    key: str
+    reason: str
+
+
+class ValidationError(Exception):
+    pass
+
+
+def check(key, value, masked):
+    """Reasons Gitlab would reject the variable, or an empty list."""
+    reasons = []
+
+    if len(key) > MAX_KEY_LENGTH:
+        reasons.append(f"key is longer than {MAX_KEY_LENGTH} characters")
+    if not KEY_PATTERN.fullmatch(key):
+        reasons.append("key may only contain letters, digits and _")
+
+    if value is None:
+        reasons.append("has no value")
+        return reasons
+    if len(value) > MAX_VALUE_LENGTH:
+        reasons.append(f"value is longer than {MAX_VALUE_LENGTH} characters")
+
+    if masked:
+        if len(value) < MIN_MASKED_LENGTH:
+            reasons.append(f"masked value is shorter than {MIN_MASKED_LENGTH} characters")
+        if "\n" in value or "\r" in value:
+            reasons.append("masked value spans more than one line")
+        elif value and not MASKABLE_PATTERN.fullmatch(value):
+            reasons.append("masked value contains characters other than Base64 and @:.~")
+
+    return reasons
+
+
+def validate(pending):
+    """Split pending ``(environment, key, value, should_mask, project_var, ...)`` writes
+    into the valid ones and a `Violation` per problem with the rest."""
+    valid = []
+    violations = []
+
+    for entry in pending:
+        environment, key, value, should_mask, project_var = entry[:5]
+        # An existing masked variable stays masked, so its new value must be maskable too
+        masked = should_mask or (project_var is not None and project_var.masked)
+        reasons = check(key, value, masked)
+        if reasons:
+            violations.extend(Violation(environment, key, reason) for reason in reasons)
+        else:
+            valid.append(entry)
+
+    return valid, violations
@@ -0,0 +1,51 @@
+"""Lightweight read path for project variables.
+
+python-gitlab wraps every listed variable in a `ProjectVariable` RESTObject with
+a manager reference and attribute-tracking dicts. The commands only ever read a
+handful of fields, so listings are fetched as raw JSON pages and decoded into
+compact immutable `Variable` records instead.
+"""
+
+import sys
+from typing import NamedTuple, Optional
+
+PER_PAGE = 100
+
+
+class Variable(NamedTuple):
+    key: str
+    value: Optional[str]
+    environment_scope: str = "*"
+    masked: bool = False
+    protected: bool = False
+    # "env_var" or "file"
+    variable_type: str = "env_var"
+    raw: bool = False
+    description: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data["key"],
+            data.get("value"),
+            data.get("environment_scope", "*"),
+            bool(data.get("masked", False)),
+            bool(data.get("protected", False)),
+            # Interned so the few distinct types share one string across a listing
+            sys.intern(data.get("variable_type") or "env_var"),
+            bool(data.get("raw", False)),
+            data.get("description"),
+        )
+
+    def attributes(self):
+        """Settings besides the value and flags that a copy or restore must carry over."""
+        return {"variable_type": self.variable_type, "raw": self.raw, "description": self.description}
+
+
+def iter_variables(gitlabClient, project_id):
+    """Lazily yield a project's variables as `Variable` records, page by page."""
+    pages = gitlabClient.http_list(
+        f"/projects/{project_id}/variables", iterator=True, per_page=PER_PAGE
+    )
+    for data in pages:
+        yield Variable.from_json(data)
@@ -0,0 +1,129 @@
+"""File change notification for `write --watch`.
+
+On Linux the .env files' directories are watched with inotify, through libc
+so no extra dependency is needed. Directories rather than files are watched
+because many editors save by writing a new file and renaming it over the old
+one. Elsewhere, or if inotify can't be set up, the files are polled for changes
+to their size, modification time or inode.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    def __init__(self, paths):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        # Raises AttributeError where libc has no inotify, e.g. on macOS
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        directories = {}
+        for path in paths:
+            directory, name = os.path.split(os.path.abspath(path))
+            directories.setdefault(directory, set()).add(name)
+
+        # File names to look out for, by watch descriptor
+        self._names = {}
+        for directory, names in directories.items():
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self._fd)
+                raise OSError(errno, f"Can't watch {directory}")
+            self._names[wd] = {os.fsencode(name) for name in names}
+
+    def wait(self, timeout=None):
+        """Block until a watched file changes, or ``timeout`` seconds pass. Returns whether one changed."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+
+        data = os.read(self._fd, 64 * 1024)
+        changed = False
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name in self._names.get(wd, ()):
+                changed = True
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    def __init__(self, paths, interval=0.25):
+        self.paths = list(paths)
+        self.interval = interval
+        self._snapshot = self._stat()
+
+    def _stat(self):
+        snapshot = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                snapshot.append(None)
+            else:
+                snapshot.append((st.st_mtime_ns, st.st_size, st.st_ino))
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Block until a watched file changes, or ``timeout`` seconds pass. Returns whether one changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._stat()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+
+            if deadline is None:
+                time.sleep(self.interval)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+def file_watcher(paths):
+    """An inotify watcher where available, otherwise a polling one."""
+    try:
+        return InotifyWatcher(paths)
+    except (AttributeError, OSError):
+        return PollingWatcher(paths)
+
+
+def changes(watcher, debounce):
+    """Yield once per burst of changes, after ``debounce`` seconds pass without another,
+    so a run of quick saves is handled as one."""
+    while True:
+        if not watcher.wait():
+            continue
+        while watcher.wait(debounce):
+            pass
+        yield
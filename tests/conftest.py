@@ -0,0 +1,22 @@
+import pytest
+
+from .fake_gitlab import FakeGitlab
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache(tmp_path_factory, monkeypatch):
+    """Keep the on-disk cache and write journals out of the user's home, and the cache off by default.
+
+    Command tests mock the python-gitlab client, which the cache's conditional
+    requests bypass; tests exercising the cache re-enable it explicitly.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path_factory.mktemp("state")))
+    monkeypatch.setenv("POPULATE_SECRETS_GITLAB_NO_CACHE", "1")
+
+
+@pytest.fixture(scope="session")
+def fake_gitlab():
+    """One fake Gitlab server process for the whole run; tests `reset` it before use."""
+    with FakeGitlab() as fake:
+        yield fake
@@ -0,0 +1,461 @@
+"""A local fake Gitlab API server for benchmarks and integration tests.
+
+Implements just enough of the v4 REST API for this tool: project lookup, group
+project listing, the project variables endpoints, and group and instance
+variable listings, with Gitlab-style pagination headers and ETags,
+plus the project `ciVariables` GraphQL query the `--api graphql` path sends. It
+runs in a separate process so the client under test can be measured on its
+own. Behaviour is configured at runtime through `POST /__control`:
+
+    latency       seconds to sleep before answering each request
+    page_size     maximum items per listing page (Gitlab caps this at 100)
+    rate_limit    requests allowed per `rate_window` seconds, then 429s
+    error_rate    fraction of requests answered with a random 5xx; setting it
+                  reseeds the generator, so a run's errors are reproducible
+    fail_keys     variable keys whose writes are rejected with a 400
+    graphql       whether `/api/graphql` answers variable queries (default true)
+    variables     replaces the stored variables of project 1 (`group/project`)
+    other_variables  replaces the stored variables of project 2 (`group/other`)
+    extra_projects   replaces projects 3 and up, as `{"path": ..., "variables": [...]}` entries
+    group_variables  replaces group variables, as `{group_path: [...]}`
+    instance_variables  replaces instance variables; null answers 403 as for non-admins
+    reset_stats   zero the request counters
+
+`GET /__stats` returns request counts per route and method.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlsplit
+
+# Server errors are only retried for idempotent requests, so a failed create is left for a rerun
+ERROR_STATUSES = (500, 502, 503, 504)
+
+
+def _project(project_id, path):
+    namespace = path.rsplit("/", 1)[0]
+    return {
+        "id": project_id,
+        "name": path.rsplit("/", 1)[-1],
+        "path_with_namespace": path,
+        "namespace": {"full_path": namespace, "kind": "group"},
+    }
+
+
+DEFAULT_PROJECT = _project(1, "group/project")
+OTHER_PROJECT = _project(2, "group/other")
+
+
+class FakeGitlabState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.projects = {1: dict(DEFAULT_PROJECT), 2: dict(OTHER_PROJECT)}
+        self.variables = {1: {}, 2: {}}
+        self.group_variables = {}
+        self.instance_variables = []
+        self.config = {
+            "latency": 0.0,
+            "page_size": 100,
+            "rate_limit": None,
+            "rate_window": 60,
+            "error_rate": 0.0,
+            "fail_keys": [],
+            "graphql": True,
+        }
+        self.stats = Counter()
+        self.window_start = time.time()
+        self.window_count = 0
+        self.random = random.Random(0)
+
+    def find_project(self, ref):
+        for project in self.projects.values():
+            if ref in (str(project["id"]), project["path_with_namespace"]):
+                return project
+        return None
+
+
+class FakeGitlabHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def _send(self, status, body=None, headers=None):
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _rate_limit_headers(self):
+        """Apply the configured rate limit. Returns (allowed, headers)."""
+        limit = self.state.config["rate_limit"]
+        if not limit:
+            return True, {}
+
+        window = self.state.config["rate_window"]
+        now = time.time()
+        with self.state.lock:
+            if now - self.state.window_start >= window:
+                self.state.window_start = now
+                self.state.window_count = 0
+            self.state.window_count += 1
+            used = self.state.window_count
+            reset = self.state.window_start + window
+
+        headers = {
+            "RateLimit-Limit": str(limit),
+            "RateLimit-Remaining": str(max(0, limit - used)),
+            "RateLimit-Reset": str(int(reset)),
+        }
+        if used > limit:
+            headers["Retry-After"] = str(max(1, int(reset - now)))
+            return False, headers
+        return True, headers
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        # Always drain the body, even for requests answered early, so keep-alive connections stay in sync
+        body = self._read_body()
+
+        if parts == ["__stats"]:
+            with self.state.lock:
+                stats = {f"{m} {r}": n for (m, r), n in self.state.stats.items()}
+            return self._send(200, {"requests": sum(self.state.stats.values()), "by_route": stats})
+        if parts == ["__control"]:
+            return self._control(body)
+
+        if self.state.config["latency"]:
+            time.sleep(self.state.config["latency"])
+
+        allowed, headers = self._rate_limit_headers()
+        route = "/" + "/".join(parts)
+        if parts[:3] == ["api", "v4", "projects"] and len(parts) > 3:
+            route = "/projects/:id" + "".join("/variables" if p == "variables" else "/:key" for p in parts[4:])
+        elif parts[:3] == ["api", "v4", "groups"] and len(parts) > 3:
+            route = "/groups/:id/" + "/".join(parts[4:])
+        elif parts[:2] == ["api", "v4"]:
+            route = "/" + "/".join(parts[2:])
+        with self.state.lock:
+            self.state.stats[(method, route)] += 1
+        if not allowed:
+            return self._send(429, {"message": "Retry later"}, headers)
+
+        with self.state.lock:
+            error = self.state.random.random() < self.state.config["error_rate"]
+            status = self.state.random.choice(ERROR_STATUSES)
+        if error:
+            return self._send(status, {"message": HTTPStatus(status).phrase}, headers)
+
+        if parts == ["api", "graphql"] and method == "POST":
+            return self._graphql(body, headers)
+        if parts[:3] == ["api", "v4", "groups"] and parts[4:] == ["projects"] and method == "GET":
+            return self._list_group_projects(parts[3], query, headers)
+        if parts[:3] == ["api", "v4", "groups"] and parts[4:] == ["variables"] and method == "GET":
+            with self.state.lock:
+                variables = self.state.group_variables.get(parts[3])
+            if variables is None:
+                return self._send(404, {"message": "404 Group Not Found"}, headers)
+            return self._send(200, variables, headers)
+        if parts == ["api", "v4", "admin", "ci", "variables"] and method == "GET":
+            with self.state.lock:
+                variables = self.state.instance_variables
+            if variables is None:
+                return self._send(403, {"message": "403 Forbidden"}, headers)
+            return self._send(200, variables, headers)
+        if parts[:3] != ["api", "v4", "projects"] or len(parts) < 4:
+            return self._send(404, {"message": "404 Not Found"}, headers)
+
+        project = self.state.find_project(parts[3])
+        if project is None:
+            return self._send(404, {"message": "404 Project Not Found"}, headers)
+
+        rest = parts[4:]
+        if not rest and method == "GET":
+            return self._send(200, project, headers)
+        if rest == ["variables"] and method == "GET":
+            return self._list_variables(project, query, headers)
+        if rest == ["variables"] and method == "POST":
+            return self._create_variable(project, body, headers)
+        if len(rest) == 2 and rest[0] == "variables" and method in ("PUT", "DELETE"):
+            scope = query.get("filter[environment_scope]", "*")
+            return self._change_variable(project, rest[1], scope, body if method == "PUT" else None, headers)
+        return self._send(404, {"message": "404 Not Found"}, headers)
+
+    def _control(self, body):
+        with self.state.lock:
+            for key in ("latency", "page_size", "rate_limit", "rate_window", "error_rate", "fail_keys", "graphql"):
+                if key in body:
+                    self.state.config[key] = body[key]
+            if "error_rate" in body:
+                self.state.random = random.Random(0)
+            if "extra_projects" in body:
+                for project_id in [i for i in self.state.projects if i > 2]:
+                    del self.state.projects[project_id]
+                    del self.state.variables[project_id]
+                for project_id, extra in enumerate(body["extra_projects"], start=3):
+                    self.state.projects[project_id] = _project(project_id, extra["path"])
+                    self.state.variables[project_id] = {
+                        (v.get("environment_scope", "*"), v["key"]): _variable(v) for v in extra.get("variables", [])
+                    }
+            if "group_variables" in body:
+                self.state.group_variables = {
+                    group: [_variable(v) for v in variables] for group, variables in body["group_variables"].items()
+                }
+            if "instance_variables" in body:
+                instance = body["instance_variables"]
+                self.state.instance_variables = None if instance is None else [_variable(v) for v in instance]
+            for project_id, name in ((1, "variables"), (2, "other_variables")):
+                if name in body:
+                    self.state.variables[project_id] = {
+                        (v.get("environment_scope", "*"), v["key"]): _variable(v) for v in body[name]
+                    }
+            if body.get("reset_stats"):
+                self.state.stats.clear()
+                self.state.window_start = time.time()
+                self.state.window_count = 0
+            dump = {
+                "variables": [dict(v) for v in self.state.variables[1].values()],
+                "other_variables": [dict(v) for v in self.state.variables[2].values()],
+                "projects": {
+                    project["path_with_namespace"]: [dict(v) for v in self.state.variables[project_id].values()]
+                    for project_id, project in self.state.projects.items()
+                },
+            }
+        self._send(200, dump if body.get("dump") else {})
+
+    def _list_variables(self, project, query, headers):
+        page_size = min(int(query.get("per_page", 20)), self.state.config["page_size"])
+        page = int(query.get("page", 1))
+        with self.state.lock:
+            variables = list(self.state.variables[project["id"]].values())
+
+        total_pages = max(1, -(-len(variables) // page_size))
+        items = variables[(page - 1) * page_size:page * page_size]
+        etag = f'W/"{hashlib.sha1(json.dumps(items).encode()).hexdigest()}"'
+
+        headers = dict(headers, **{
+            "X-Page": str(page),
+            "X-Per-Page": str(page_size),
+            "X-Total": str(len(variables)),
+            "X-Total-Pages": str(total_pages),
+            "ETag": etag,
+        })
+        if page < total_pages:
+            headers["X-Next-Page"] = str(page + 1)
+            next_query = urlencode({"page": page + 1, "per_page": page_size})
+            host = self.headers.get("Host")
+            headers["Link"] = f'<http://{host}/api/v4/projects/{project["id"]}/variables?{next_query}>; rel="next"'
+
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, None, headers)
+        return self._send(200, items, headers)
+
+    def _list_group_projects(self, group, query, headers):
+        subgroups = query.get("include_subgroups") == "true"
+        with self.state.lock:
+            projects = [
+                dict(p) for p in self.state.projects.values()
+                if p["path_with_namespace"].startswith(group + "/")
+                and (subgroups or "/" not in p["path_with_namespace"][len(group) + 1:])
+            ]
+        if not projects:
+            return self._send(404, {"message": "404 Group Not Found"}, headers)
+
+        page_size = min(int(query.get("per_page", 20)), self.state.config["page_size"])
+        page = int(query.get("page", 1))
+        total_pages = max(1, -(-len(projects) // page_size))
+        headers = dict(headers, **{"X-Page": str(page), "X-Total-Pages": str(total_pages)})
+        if page < total_pages:
+            next_query = urlencode(dict(query, page=page + 1))
+            host = self.headers.get("Host")
+            headers["Link"] = f'<http://{host}/api/v4/groups/{quote(group, safe="")}/projects?{next_query}>; rel="next"'
+        return self._send(200, projects[(page - 1) * page_size:page * page_size], headers)
+
+    def _graphql(self, body, headers):
+        if not self.state.config["graphql"]:
+            error = "Field 'ciVariables' doesn't exist on type 'Project'"
+            return self._send(200, {"errors": [{"message": error}]}, headers)
+
+        variables = body.get("variables", {})
+        by_id = isinstance(variables["project"], list)
+        ref = variables["project"][0].rsplit("/", 1)[-1] if by_id else variables["project"]
+        project = self.state.find_project(ref)
+
+        node = None
+        if project is not None:
+            first = int(re.search(r"ciVariables\(first: (\d+)", body["query"]).group(1))
+            start = int(variables.get("after") or 0)
+            with self.state.lock:
+                stored = list(self.state.variables[project["id"]].values())
+            page = stored[start:start + min(first, self.state.config["page_size"])]
+            end = start + len(page)
+            node = {
+                "id": f"gid://gitlab/Project/{project['id']}",
+                "name": project["name"],
+                "ciVariables": {
+                    "nodes": [{
+                        "key": v["key"],
+                        "value": v["value"],
+                        "environmentScope": v["environment_scope"],
+                        "masked": v["masked"],
+                        "protected": v["protected"],
+                        "variableType": v["variable_type"].upper(),
+                        "raw": v["raw"],
+                        "description": v["description"],
+                    } for v in page],
+                    "pageInfo": {"hasNextPage": end < len(stored), "endCursor": str(end)},
+                },
+            }
+
+        if by_id:
+            return self._send(200, {"data": {"projects": {"nodes": [node] if node else []}}}, headers)
+        return self._send(200, {"data": {"project": node}}, headers)
+
+    def _create_variable(self, project, body, headers):
+        variable = _variable(body)
+        if variable["key"] in self.state.config["fail_keys"]:
+            return self._send(400, {"message": {"value": ["is invalid"]}}, headers)
+
+        with self.state.lock:
+            existing = self.state.variables[project["id"]]
+            index = (variable["environment_scope"], variable["key"])
+            if index in existing:
+                return self._send(400, {"message": {"key": [f"({variable['key']}) has already been taken"]}}, headers)
+            existing[index] = variable
+        return self._send(201, variable, headers)
+
+    def _change_variable(self, project, key, scope, body, headers):
+        if body is not None and key in self.state.config["fail_keys"]:
+            return self._send(400, {"message": {"value": ["is invalid"]}}, headers)
+
+        with self.state.lock:
+            existing = self.state.variables[project["id"]]
+            if (scope, key) not in existing:
+                return self._send(404, {"message": "404 Variable Not Found"}, headers)
+            if body is None:
+                del existing[(scope, key)]
+                return self._send(204, None, headers)
+            variable = existing[(scope, key)]
+            variable.update({k: v for k, v in body.items() if k in variable})
+        return self._send(200, variable, headers)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def _variable(data):
+    return {
+        "variable_type": data.get("variable_type", "env_var"),
+        "key": data["key"],
+        "value": data.get("value", ""),
+        "protected": bool(data.get("protected", False)),
+        "masked": bool(data.get("masked", False)),
+        "raw": bool(data.get("raw", False)),
+        "environment_scope": data.get("environment_scope", "*"),
+        "description": data.get("description"),
+    }
+
+
+def serve(port_pipe):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitlabHandler)
+    server.daemon_threads = True
+    server.state = FakeGitlabState()
+    port_pipe.send(server.server_address[1])
+    server.serve_forever()
+
+
+class FakeGitlab:
+    """Runs the fake server in a child process. Use as a context manager."""
+
+    def __enter__(self):
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve, args=(child,), daemon=True)
+        self.process.start()
+        self.url = f"http://127.0.0.1:{parent.recv()}"
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
+
+    def _call(self, method, path, body=None):
+        import requests
+
+        response = requests.request(method, self.url + path, json=body)
+        response.raise_for_status()
+        return response.json()
+
+    def configure(self, **config):
+        return self._call("POST", "/__control", config)
+
+    def reset(self, variables=(), other_variables=(), extra_projects=(), group_variables=None,
+              instance_variables=(), **config):
+        """Replace the stored variables, apply config and zero the counters."""
+        defaults = {
+            "latency": 0.0, "page_size": 100, "rate_limit": None, "error_rate": 0.0, "fail_keys": [], "graphql": True,
+        }
+        self.configure(
+            variables=list(variables), other_variables=list(other_variables), extra_projects=list(extra_projects),
+            group_variables=group_variables or {},
+            instance_variables=None if instance_variables is None else list(instance_variables), reset_stats=True,
+            **dict(defaults, **config),
+        )
+
+    def variables(self, other=False):
+        """The stored variables of project 1, or of project 2 with ``other``."""
+        return self.configure(dump=True)["other_variables" if other else "variables"]
+
+    def project_variables(self):
+        """Stored variables of every project, by project path."""
+        return self.configure(dump=True)["projects"]
+
+    def rows(self, *fields, other=False):
+        """Sorted tuples of ``fields`` from the stored variables of project 1, or project 2 with ``other``."""
+        return sorted(tuple(v[field] for field in fields) for v in self.variables(other))
+
+    def stats(self):
+        return self._call("GET", "/__stats")
+
+
+def invoke(*args, env=None):
+    """Run the CLI with a token set, as tests against the fake server do, and return the click result."""
+    import click.testing
+
+    from populate_secrets_gitlab.app import cli
+
+    with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token", **(env or {})}):
+        return click.testing.CliRunner().invoke(cli, list(args))
@@ -1,37 +1,41 @@
 """Tests for app.py commands.
 
 Mocks only at the gitlab API boundary (gitlab.Gitlab client / project.variables).
+Variable listings are served as raw JSON from `client.http_list`.
 """
 
 import os
 from unittest.mock import MagicMock, patch
 
 import click.testing
+import gitlab
 import pytest
 
 from populate_secrets_gitlab.app import cli
 
 
 def _make_variable(key, value, environment_scope="*", masked=False):
-    v = MagicMock()
-    v.key = key
-    v.value = value
-    v.environment_scope = environment_scope
-    v.masked = masked
-    return v
+    return {
+        "key": key,
+        "value": value,
+        "environment_scope": environment_scope,
+        "masked": masked,
+        "protected": False,
+    }
 
 
 def _make_project(name="test-project", project_id=42, variables=None):
     proj = MagicMock()
     proj.name = name
     proj.id = project_id
-    proj.variables.list.return_value = variables or []
+    proj.variable_data = variables or []
     return proj
 
 
 def _make_gitlab_client(project):
     client = MagicMock()
     client.projects.get.return_value = project
+    client.http_list.side_effect = lambda *args, **kwargs: iter(project.variable_data)
     return client
 
 
@@ -83,8 +87,122 @@ class TestWriteFreshEnvironment:
         )
 
         assert result.exit_code == 0, result.output
-        assert existing_var.value == "localhost"
-        existing_var.save.assert_called_once()
+        project.variables.update.assert_called_once_with(
+            "DB_HOST", {"value": "localhost"}, filter={"environment_scope": "uat"},
+        )
+        project.variables.create.assert_not_called()
+
+    def test_update_targets_var_in_matching_scope(self, tmp_path):
+        global_var = _make_variable("DB_HOST", "global-value", environment_scope="*")
+        uat_var = _make_variable("DB_HOST", "old-value", environment_scope="uat")
+        result, project = _invoke_write(
+            tmp_path, "DB_HOST=localhost\n", "uat", variables=[global_var, uat_var],
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.update.assert_called_once_with(
+            "DB_HOST", {"value": "localhost"}, filter={"environment_scope": "uat"},
+        )
+
+
+# --- Diff-based write: unchanged variables are skipped ---
+
+class TestWriteSkipsUnchanged:
+    def test_unchanged_var_is_not_saved(self, tmp_path):
+        existing_var = _make_variable("DB_HOST", "localhost", environment_scope="uat")
+        result, project = _invoke_write(
+            tmp_path, "DB_HOST=localhost\n", "uat", variables=[existing_var],
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.update.assert_not_called()
+        project.variables.create.assert_not_called()
+
+    def test_unmasked_var_needing_mask_is_updated(self, tmp_path):
+        existing_var = _make_variable("API_KEY", "abc12345", environment_scope="uat")
+        result, project = _invoke_write(
+            tmp_path, "API_KEY=abc12345\n", "uat",
+            extra_args=["--mask"], variables=[existing_var],
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.update.assert_called_once_with(
+            "API_KEY", {"value": "abc12345", "masked": True},
+            filter={"environment_scope": "uat"},
+        )
+
+    def test_already_masked_var_with_same_value_is_unchanged(self, tmp_path):
+        existing_var = _make_variable(
+            "API_KEY", "abc12345", environment_scope="uat", masked=True,
+        )
+        result, project = _invoke_write(
+            tmp_path, "API_KEY=abc12345\n", "uat",
+            extra_args=["--mask"], variables=[existing_var],
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.update.assert_not_called()
+
+    def test_only_changed_keys_are_written(self, tmp_path):
+        variables = [
+            _make_variable("SAME", "1", environment_scope="uat"),
+            _make_variable("CHANGED", "old", environment_scope="uat"),
+        ]
+        result, project = _invoke_write(
+            tmp_path, "SAME=1\nCHANGED=new\nNEW_VAR=x\n", "uat", variables=variables,
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.update.assert_called_once()
+        assert project.variables.update.call_args[0][0] == "CHANGED"
+        project.variables.create.assert_called_once()
+        assert project.variables.create.call_args[0][0]["key"] == "NEW_VAR"
+
+
+# --- Concurrent write ---
+
+class TestWriteConcurrency:
+    def test_concurrent_write_creates_every_key(self, tmp_path):
+        env = "".join(f"VAR_{i}=v{i}\n" for i in range(20))
+        result, project = _invoke_write(
+            tmp_path, env, "uat", extra_args=["--concurrency", "4"],
+        )
+
+        assert result.exit_code == 0, result.output
+        created_keys = {c[0][0]["key"] for c in project.variables.create.call_args_list}
+        assert created_keys == {f"VAR_{i}" for i in range(20)}
+
+    def test_failed_key_does_not_stop_other_writes(self, tmp_path):
+        import gitlab
+
+        env_file = tmp_path / ".env"
+        env_file.write_text("GOOD_A=1\nBAD=2\nGOOD_B=3\n")
+        project = _make_project()
+
+        def create(payload):
+            if payload["key"] == "BAD":
+                raise gitlab.exceptions.GitlabCreateError("boom", 400)
+
+        project.variables.create.side_effect = create
+        client = _make_gitlab_client(project)
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                result = click.testing.CliRunner().invoke(cli, [
+                    "write", "--env-file", str(env_file), "--environment", "uat",
+                    "--gitlab-host", "gitlab.example.com", "--project", "test/project",
+                    "--concurrency", "3",
+                ])
+
+        assert result.exit_code == 0, result.output
+        assert project.variables.create.call_count == 3
+
+    def test_concurrency_must_be_positive(self, tmp_path):
+        result, project = _invoke_write(
+            tmp_path, "A=1\n", "uat", extra_args=["--concurrency", "0"],
+        )
+
+        assert result.exit_code == 2
         project.variables.create.assert_not_called()
 
 
@@ -103,14 +221,14 @@ class TestMaskingHeuristic:
 
     def test_key_containing_SECRET_is_masked(self, tmp_path):
         _, project = _invoke_write(
-            tmp_path, "MY_SECRET=shhh\n", "prod", extra_args=["--mask"],
+            tmp_path, "MY_SECRET=shhh-1234\n", "prod", extra_args=["--mask"],
         )
         payload = project.variables.create.call_args[0][0]
         assert payload["masked"] is True
 
     def test_key_containing_TOKEN_is_masked(self, tmp_path):
         _, project = _invoke_write(
-            tmp_path, "AUTH_TOKEN=abc\n", "prod", extra_args=["--mask"],
+            tmp_path, "AUTH_TOKEN=abc12345\n", "prod", extra_args=["--mask"],
         )
         payload = project.variables.create.call_args[0][0]
         assert payload["masked"] is True
@@ -128,6 +246,101 @@ class TestMaskingHeuristic:
         assert "masked" not in payload
 
 
+# --- Pre-flight validation ---
+
+class TestPreflightValidation:
+    def test_invalid_writes_are_skipped_and_reported(self, tmp_path):
+        result, project = _invoke_write(
+            tmp_path, "API_TOKEN=short\nBAD-KEY=1\nGOOD=1\n", "uat", extra_args=["--mask"],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "2 variable(s) would be rejected by Gitlab:" in result.output
+        assert "[uat] API_TOKEN: masked value is shorter than 8 characters" in result.output
+        assert "[uat] BAD-KEY: key may only contain letters, digits and _" in result.output
+        project.variables.create.assert_called_once_with({"key": "GOOD", "value": "1", "environment_scope": "uat"})
+
+    def test_update_to_already_masked_var_is_checked(self, tmp_path):
+        existing_var = _make_variable("PASSWORD", "long-enough", environment_scope="uat", masked=True)
+        result, project = _invoke_write(
+            tmp_path, "PASSWORD=has spaces in it\n", "uat", variables=[existing_var],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "masked value contains characters other than Base64" in result.output
+        project.variables.update.assert_not_called()
+
+    def test_strict_aborts_before_any_request(self, tmp_path):
+        result, project = _invoke_write(
+            tmp_path, "API_TOKEN=short\nGOOD=1\n", "uat", extra_args=["--mask", "--strict"],
+        )
+
+        assert result.exit_code == 1
+        assert "Variables failed validation, nothing was written" in result.output
+        project.variables.create.assert_not_called()
+
+    def test_strict_passes_valid_writes(self, tmp_path):
+        result, project = _invoke_write(
+            tmp_path, "API_TOKEN=long-enough-token\n", "uat", extra_args=["--mask", "--strict"],
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.create.assert_called_once()
+
+
+# --- Include/exclude patterns and masking rules ---
+
+class TestKeyPatterns:
+    def test_glob_include_and_regex_exclude(self, tmp_path):
+        result, project = _invoke_write(
+            tmp_path, "AWS_REGION=x\nAWS_DB_PASSWORD=y\nNODE_ENV=z\n", "uat",
+            extra_args=["--include", "AWS_*", "--exclude", "re:.*_PASSWORD$"],
+        )
+
+        assert result.exit_code == 0, result.output
+        project.variables.create.assert_called_once_with(
+            {"key": "AWS_REGION", "value": "x", "environment_scope": "uat"}
+        )
+
+    def test_mask_rules_file(self, tmp_path):
+        rules = tmp_path / "mask-rules"
+        rules.write_text("*_PASSWORD\n")
+        result, project = _invoke_write(
+            tmp_path, "DB_PASSWORD=long-enough\nAPI_KEY=long-enough\n", "uat",
+            extra_args=["--mask-rules", str(rules)],
+        )
+
+        assert result.exit_code == 0, result.output
+        payloads = {c[0][0]["key"]: c[0][0] for c in project.variables.create.call_args_list}
+        assert payloads["DB_PASSWORD"]["masked"] is True
+        assert "masked" not in payloads["API_KEY"]
+
+    def test_invalid_pattern_is_a_usage_error(self, tmp_path):
+        result, project = _invoke_write(tmp_path, "A=1\n", "uat", extra_args=["--include", "re:("])
+
+        assert result.exit_code == 2
+        assert "Invalid regular expression" in result.output
+        project.variables.create.assert_not_called()
+
+    def test_list_filters_keys(self):
+        project = _make_project(variables=[
+            _make_variable("AWS_REGION", "x", environment_scope="uat"),
+            _make_variable("NODE_ENV", "y", environment_scope="uat"),
+        ])
+        client = _make_gitlab_client(project)
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                result = click.testing.CliRunner().invoke(cli, [
+                    "list", "--environment", "uat", "--gitlab-host", "gitlab.example.com",
+                    "--project", "test/project", "--exclude", "AWS_*",
+                ])
+
+        assert result.exit_code == 0, result.output
+        assert "NODE_ENV" in result.output
+        assert "AWS_REGION" not in result.output
+
+
 # --- Token-missing error consistency (Task 3) ---
 
 class TestMissingTokenError:
@@ -285,3 +498,274 @@ class TestScopeFiltering:
                 ])
 
         assert "PROD_VAR" not in result.output
+
+
+# --- Streaming output (get/download --stream) ---
+
+class TestStreaming:
+    def _invoke(self, args, variables):
+        project = _make_project(variables=variables)
+        client = _make_gitlab_client(project)
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                result = click.testing.CliRunner().invoke(cli, args + [
+                    "--environment", "uat",
+                    "--gitlab-host", "gitlab.example.com",
+                    "--project", "test/project",
+                ])
+
+        return result, project
+
+    def test_variables_are_listed_lazily_as_raw_json(self):
+        project = _make_project()
+        client = _make_gitlab_client(project)
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                click.testing.CliRunner().invoke(cli, [
+                    "list", "--environment", "uat", "--gitlab-host", "h", "--project", "p",
+                ])
+
+        client.http_list.assert_called_once_with(
+            "/projects/42/variables", iterator=True, per_page=100,
+        )
+        project.variables.list.assert_not_called()
+
+    def test_get_stream_keeps_api_order(self):
+        variables = [
+            _make_variable("B_VAR", "2", environment_scope="uat"),
+            _make_variable("A_VAR", "1", environment_scope="uat"),
+        ]
+        result, _ = self._invoke(["get", "--stream"], variables)
+
+        assert result.exit_code == 0, result.output
+        assert result.output.index("B_VAR") < result.output.index("A_VAR")
+
+    def test_get_sorts_by_default(self):
+        variables = [
+            _make_variable("B_VAR", "2", environment_scope="uat"),
+            _make_variable("A_VAR", "1", environment_scope="uat"),
+        ]
+        result, _ = self._invoke(["get"], variables)
+
+        assert result.output.index("A_VAR") < result.output.index("B_VAR")
+
+    def test_download_stream_writes_file(self, tmp_path):
+        variables = [
+            _make_variable("B_VAR", "2", environment_scope="uat"),
+            _make_variable("OTHER", "x", environment_scope="prod"),
+            _make_variable("A_VAR", "1", environment_scope="*"),
+        ]
+        result, _ = self._invoke(["download", "--stream", "--output-dir", str(tmp_path)], variables)
+
+        assert result.exit_code == 0, result.output
+        assert (tmp_path / "uat.env").read_text() == "B_VAR=2\nA_VAR=1\n"
+        assert not (tmp_path / "uat.env.tmp").exists()
+
+    def test_download_stream_without_matches_leaves_existing_file(self, tmp_path):
+        existing = tmp_path / "uat.env"
+        existing.write_text("KEEP=1\n")
+
+        project = _make_project(variables=[_make_variable("P", "x", environment_scope="prod")])
+        client = _make_gitlab_client(project)
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                result = click.testing.CliRunner().invoke(cli, [
+                    "download", "--stream", "--output-dir", str(tmp_path),
+                    "--environment", "uat", "--gitlab-host", "h", "--project", "p",
+                ], input="overwrite\n")
+
+        assert result.exit_code == 0, result.output
+        assert "No variables found." in result.output
+        assert existing.read_text() == "KEEP=1\n"
+        assert not (tmp_path / "uat.env.tmp").exists()
+
+
+# --- Multi-project fan-out ---
+
+class TestWriteMultipleProjects:
+    def _invoke(self, tmp_path, projects, args):
+        env_file = tmp_path / ".env"
+        env_file.write_text("SENTRY_DSN=https://sentry\n")
+
+        client = MagicMock()
+
+        def get_project(id):
+            if id not in projects:
+                raise gitlab.exceptions.GitlabGetError("404 Project Not Found", 404)
+            return projects[id]
+
+        client.projects.get.side_effect = get_project
+        client.http_list.side_effect = lambda path, **kwargs: iter([])
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                return click.testing.CliRunner().invoke(cli, [
+                    "write", "--env-file", str(env_file), "--environment", "uat",
+                    "--gitlab-host", "gitlab.example.com",
+                ] + args)
+
+    def test_writes_to_every_project(self, tmp_path):
+        projects = {
+            "g/a": _make_project(name="a", project_id=1),
+            "g/b": _make_project(name="b", project_id=2),
+        }
+        result = self._invoke(tmp_path, projects, ["--project", "g/a", "--project", "g/b"])
+
+        assert result.exit_code == 0, result.output
+        for project in projects.values():
+            project.variables.create.assert_called_once()
+        assert "g/a" in result.output and "g/b" in result.output
+
+    def test_projects_file(self, tmp_path):
+        projects_file = tmp_path / "projects.txt"
+        projects_file.write_text("# shared\ng/a\n\ng/b  # second\n")
+        projects = {
+            "g/a": _make_project(name="a", project_id=1),
+            "g/b": _make_project(name="b", project_id=2),
+        }
+        result = self._invoke(tmp_path, projects, ["--projects-file", str(projects_file)])
+
+        assert result.exit_code == 0, result.output
+        for project in projects.values():
+            project.variables.create.assert_called_once()
+
+    def test_missing_project_fails_run_but_others_are_written(self, tmp_path):
+        projects = {"g/a": _make_project(name="a", project_id=1)}
+        result = self._invoke(tmp_path, projects, ["--project", "g/a", "--project", "g/missing"])
+
+        assert result.exit_code == 1
+        assert "Could not find project: g/missing" in result.output
+        projects["g/a"].variables.create.assert_called_once()
+
+    def test_requires_a_project(self, tmp_path):
+        result = self._invoke(tmp_path, {}, [])
+
+        assert result.exit_code == 2
+        assert "--project" in result.output
+
+
+# --- Multi-environment write from --env-dir ---
+
+class TestWriteEnvDir:
+    def _invoke(self, tmp_path, files, variables=None, extra_args=None):
+        env_dir = tmp_path / "config"
+        env_dir.mkdir()
+        for name, content in files.items():
+            (env_dir / name).write_text(content)
+
+        project = _make_project(variables=variables or [])
+        client = _make_gitlab_client(project)
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                result = click.testing.CliRunner().invoke(cli, [
+                    "write", "--env-dir", str(env_dir),
+                    "--gitlab-host", "gitlab.example.com", "--project", "test/project",
+                ] + (extra_args or []))
+
+        return result, project, client
+
+    def test_each_file_written_to_its_scope_from_one_listing(self, tmp_path):
+        result, project, client = self._invoke(
+            tmp_path,
+            {"uat.env": "A=1\n", "production.env": "A=2\n", "global.env": "G=g\n", "notes.txt": "x"},
+            variables=[_make_variable("A", "1", environment_scope="uat")],
+        )
+
+        assert result.exit_code == 0, result.output
+        client.http_list.assert_called_once()
+        created = sorted(
+            (c[0][0]["environment_scope"], c[0][0]["key"], c[0][0]["value"])
+            for c in project.variables.create.call_args_list
+        )
+        assert created == [("*", "G", "g"), ("production", "A", "2")]
+        project.variables.update.assert_not_called()
+
+    def test_env_dir_cannot_be_combined_with_env_file(self, tmp_path):
+        result, _, _ = self._invoke(tmp_path, {"uat.env": "A=1\n"}, extra_args=["--environment", "uat"])
+
+        assert result.exit_code == 2
+        assert "--env-dir" in result.output
+
+    def test_env_file_requires_environment(self, tmp_path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            result = click.testing.CliRunner().invoke(cli, [
+                "write", "--env-file", str(env_file),
+                "--gitlab-host", "h", "--project", "p",
+            ])
+
+        assert result.exit_code == 2
+
+
+# --- Download every environment from one listing ---
+
+class TestDownloadAllEnvironments:
+    def _invoke(self, tmp_path, variables, extra_args=None, input=None):
+        project = _make_project(variables=variables)
+        client = _make_gitlab_client(project)
+
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                result = click.testing.CliRunner().invoke(cli, [
+                    "download", "--output-dir", str(tmp_path),
+                    "--gitlab-host", "h", "--project", "p",
+                ] + (["--all-environments"] if extra_args is None else extra_args), input=input)
+
+        return result, client
+
+    def test_each_scope_written_once_from_one_listing(self, tmp_path):
+        result, client = self._invoke(tmp_path, [
+            _make_variable("B", "2", environment_scope="uat"),
+            _make_variable("A", "1", environment_scope="uat"),
+            _make_variable("P", "p", environment_scope="prod"),
+            _make_variable("G", "g", environment_scope="*"),
+            _make_variable("R", "r", environment_scope="review/*"),
+        ])
+
+        assert result.exit_code == 0, result.output
+        client.http_list.assert_called_once()
+        assert (tmp_path / "uat.env").read_text() == "A=1\nB=2\n"
+        assert (tmp_path / "prod.env").read_text() == "P=p\n"
+        # Global variables only go to global.env, not into every scope
+        assert (tmp_path / "global.env").read_text() == "G=g\n"
+        assert (tmp_path / "review__.env").read_text() == "R=r\n"
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_colliding_scope_file_names_get_a_suffix(self, tmp_path):
+        result, _ = self._invoke(tmp_path, [
+            _make_variable("G", "g", environment_scope="*"),
+            _make_variable("L", "l", environment_scope="global"),
+            _make_variable("R", "r", environment_scope="review/*"),
+            _make_variable("U", "u", environment_scope="review_*"),
+        ])
+
+        assert result.exit_code == 0, result.output
+        assert (tmp_path / "global.env").read_text() == "G=g\n"
+        assert (tmp_path / "global-2.env").read_text() == "L=l\n"
+        assert (tmp_path / "review__.env").read_text() == "R=r\n"
+        assert (tmp_path / "review__-2.env").read_text() == "U=u\n"
+        assert "Scopes 'review/*' and 'review_*' share a file name" in result.output
+
+    def test_existing_files_are_kept_when_overwrite_declined(self, tmp_path):
+        (tmp_path / "uat.env").write_text("KEEP=1\n")
+
+        result, _ = self._invoke(tmp_path, [
+            _make_variable("A", "1", environment_scope="uat"),
+            _make_variable("P", "p", environment_scope="prod"),
+        ], input="n\n")
+
+        assert result.exit_code == 0, result.output
+        assert "Cancelled." in result.output
+        assert (tmp_path / "uat.env").read_text() == "KEEP=1\n"
+        assert not (tmp_path / "prod.env").exists()
+
+    def test_requires_exactly_one_of_environment_options(self, tmp_path):
+        result, _ = self._invoke(tmp_path, [], extra_args=["--environment", "uat", "--all-environments"])
+        assert result.exit_code == 2
+
+        result, _ = self._invoke(tmp_path, [], extra_args=[])
+        assert result.exit_code == 2
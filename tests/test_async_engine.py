@@ -0,0 +1,132 @@
+"""Tests for the asyncio engine, using an in-process httpx mock transport."""
+
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from populate_secrets_gitlab.async_engine import AsyncGitlab, iter_project_variables  # noqa: E402
+from populate_secrets_gitlab.rate_limit import RateLimiter  # noqa: E402
+
+
+def _variables_handler(variables, per_page=2, total_headers=True):
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request)
+        if request.method == "GET" and request.url.path.endswith("/variables"):
+            page = int(request.url.params.get("page", 1))
+            total_pages = max(1, -(-len(variables) // per_page))
+            chunk = variables[(page - 1) * per_page:page * per_page]
+            headers = {}
+            if total_headers:
+                headers["X-Total-Pages"] = str(total_pages)
+            if page < total_pages:
+                headers["X-Next-Page"] = str(page + 1)
+            return httpx.Response(200, json=chunk, headers=headers)
+        if request.method == "GET":
+            return httpx.Response(200, json={"id": 42, "name": "test-project"})
+        if request.method == "POST" and json.loads(request.content)["key"] == "BAD":
+            return httpx.Response(400, json={"message": "bad"})
+        return httpx.Response(201, json={})
+
+    return handler, requests_seen
+
+
+def _var(key, scope="*"):
+    return {"key": key, "value": "v", "environment_scope": scope, "masked": False}
+
+
+def _run(coro_fn, handler):
+    async def run():
+        async with AsyncGitlab("gitlab.example.com", "t", transport=httpx.MockTransport(handler)) as gl:
+            return await coro_fn(gl)
+
+    return asyncio.run(run())
+
+
+class TestListVariables:
+    def test_fetches_all_pages(self):
+        variables = [_var(f"VAR_{i}") for i in range(5)]
+        handler, seen = _variables_handler(variables)
+
+        result = _run(lambda gl: gl.list_variables(42), handler)
+
+        assert [v.key for v in result] == [f"VAR_{i}" for i in range(5)]
+        assert len(seen) == 3
+
+    def test_follows_next_page_without_totals(self):
+        variables = [_var(f"VAR_{i}") for i in range(5)]
+        handler, _ = _variables_handler(variables, total_headers=False)
+
+        result = _run(lambda gl: gl.list_variables(42), handler)
+
+        assert len(result) == 5
+
+    def test_project_path_is_url_encoded(self):
+        handler, seen = _variables_handler([])
+
+        project = _run(lambda gl: gl.get_project("group/project"), handler)
+
+        assert project.id == 42
+        assert seen[0].url.raw_path == b"/api/v4/projects/group%2Fproject"
+
+    def test_iter_project_variables_streams_in_page_order(self):
+        variables = [_var(f"VAR_{i}") for i in range(7)]
+        handler, _ = _variables_handler(variables)
+
+        project, stream = iter_project_variables(
+            "h", "t", 42, max_pages_buffered=1, transport=httpx.MockTransport(handler),
+        )
+
+        assert project.name == "test-project"
+        assert [v.key for v in stream] == [f"VAR_{i}" for i in range(7)]
+
+    def test_iter_project_variables_raises_for_missing_project(self):
+        def handler(request):
+            return httpx.Response(404, json={"message": "404 Project Not Found"})
+
+        with pytest.raises(Exception, match="404"):
+            iter_project_variables("h", "t", "missing", transport=httpx.MockTransport(handler))
+
+
+class TestWriteVariables:
+    def test_results_are_in_submission_order(self):
+        handler, seen = _variables_handler([])
+        pending = [
+            ("uat", "A", "1", False, None),
+            ("uat", "BAD", "2", False, None),
+            ("uat", "C", "3", True, object()),
+        ]
+
+        results = _run(lambda gl: gl.write_variables(42, pending), handler)
+
+        assert [r[1] for r in results] == ["A", "BAD", "C"]
+        assert results[0][3] is None
+        assert results[1][3] is not None
+        assert results[2][2] is True
+
+        put = next(r for r in seen if r.method == "PUT")
+        assert put.url.params["filter[environment_scope]"] == "uat"
+        assert json.loads(put.content)["masked"] is True
+
+
+class TestRateLimitedTransport:
+    def test_throttled_request_is_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(429, headers={"Retry-After": "0"})
+            return httpx.Response(200, json={"id": 1, "name": "p"})
+
+        async def run():
+            transport = httpx.MockTransport(handler)
+            async with AsyncGitlab("h", "t", transport=transport, limiter=RateLimiter(backoff_base=0)) as gl:
+                return await gl.get_project(1)
+
+        assert asyncio.run(run()).id == 1
+        assert len(calls) == 2
@@ -0,0 +1,198 @@
+import gzip
+import json
+import os
+import stat
+
+import pytest
+
+from populate_secrets_gitlab.backup import (
+    ArchiveWriter,
+    BackupError,
+    PassphraseRequired,
+    project_document,
+    read_archive,
+)
+
+from .fake_gitlab import invoke
+
+
+def _group_projects(count):
+    return [
+        {
+            "path": f"acme/{'team/' if i % 2 else ''}app-{i}",
+            "variables": [
+                {"key": "APP_ID", "value": str(i), "environment_scope": "*", "raw": True, "description": "App ID"},
+                {"key": "API_TOKEN", "value": f"token-{i:08d}", "environment_scope": "production",
+                 "masked": True, "protected": True, "variable_type": "file"},
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def _write_archive(path, documents, passphrase=None):
+    archive = ArchiveWriter(str(path), "gitlab.example.com", "acme", passphrase)
+    for document in documents:
+        archive.add(document)
+    archive.close()
+
+
+DOCUMENT = project_document(
+    {"id": 3, "path": "acme/app", "name": "app"},
+    [
+        {"key": "A", "value": "1", "environment_scope": "*"},
+        {"key": "B", "value": "secret-value", "environment_scope": "production", "masked": True, "protected": True},
+    ],
+)
+
+
+class TestArchive:
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "backup.jsonl.gz"
+        _write_archive(path, [DOCUMENT, DOCUMENT])
+
+        header, documents = read_archive(str(path))
+
+        assert header["group"] == "acme"
+        assert header["encrypted"] is False
+        assert list(documents) == [DOCUMENT, DOCUMENT]
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert not os.path.exists(f"{path}.tmp")
+
+    def test_abort_leaves_no_file(self, tmp_path):
+        path = tmp_path / "backup.jsonl.gz"
+        archive = ArchiveWriter(str(path), "gitlab.example.com", "acme")
+        archive.add(DOCUMENT)
+        archive.abort()
+
+        assert os.listdir(tmp_path) == []
+
+    def test_not_an_archive(self, tmp_path):
+        path = tmp_path / "backup.jsonl.gz"
+        path.write_text("plain text")
+
+        with pytest.raises(BackupError, match="Not a backup archive"):
+            read_archive(str(path))
+
+    def test_encrypted_round_trip(self, tmp_path):
+        pytest.importorskip("cryptography")
+        path = tmp_path / "backup.jsonl.gz"
+        _write_archive(path, [DOCUMENT], passphrase="correct horse")
+
+        with gzip.open(path, "rt") as f:
+            assert "secret-value" not in f.read()
+        header, documents = read_archive(str(path), "correct horse")
+        assert header["encrypted"] is True
+        assert list(documents) == [DOCUMENT]
+
+    def test_encrypted_needs_passphrase(self, tmp_path):
+        pytest.importorskip("cryptography")
+        path = tmp_path / "backup.jsonl.gz"
+        _write_archive(path, [DOCUMENT], passphrase="correct horse")
+
+        with pytest.raises(PassphraseRequired):
+            read_archive(str(path))
+        _, documents = read_archive(str(path), "wrong")
+        with pytest.raises(BackupError, match="wrong passphrase"):
+            list(documents)
+
+
+class TestBackupRestore:
+    def test_backup_group(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(extra_projects=_group_projects(30), page_size=20)
+        output = tmp_path / "backup.jsonl.gz"
+
+        result = invoke("backup", "--gitlab-host", fake_gitlab.url, "--group", "acme", "--output", str(output))
+
+        assert result.exit_code == 0, result.output
+        assert "Saved 60 variable(s) from 30 project(s)" in result.output
+        header, documents = read_archive(str(output))
+        documents = list(documents)
+        assert header["gitlab_url"] == fake_gitlab.url
+        assert sorted(d["project"]["path"] for d in documents) == sorted(p["path"] for p in _group_projects(30))
+        # Variables are stored as listed, so the type, raw flag and description survive
+        assert {
+            "key": "API_TOKEN", "value": "token-00000003", "environment_scope": "production", "masked": True,
+            "protected": True, "variable_type": "file", "raw": False, "description": None,
+        } in documents[3]["variables"]
+        by_route = fake_gitlab.stats()["by_route"]
+        assert by_route["GET /groups/:id/projects"] == 2
+        assert by_route["GET /projects/:id/variables"] == 30
+
+    def test_backup_missing_group(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset()
+
+        result = invoke(
+            "backup", "--gitlab-host", fake_gitlab.url, "--group", "nope", "--output", str(tmp_path / "b.jsonl.gz"),
+        )
+
+        assert result.exit_code == 1
+        assert "Could not find group: nope" in result.output
+        assert os.listdir(tmp_path) == []
+
+    def test_restore_rewrites_missing_and_changed(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(extra_projects=_group_projects(4))
+        output = tmp_path / "backup.jsonl.gz"
+        invoke("backup", "--gitlab-host", fake_gitlab.url, "--group", "acme", "--output", str(output))
+        damaged = _group_projects(4)
+        damaged[0]["variables"] = []
+        damaged[1]["variables"][0]["value"] = "changed"
+        damaged[2]["variables"][1]["variable_type"] = "env_var"
+        fake_gitlab.reset(extra_projects=damaged)
+
+        result = invoke("restore", str(output), "--concurrency", "4")
+
+        assert result.exit_code == 0, result.output
+        restored = fake_gitlab.project_variables()
+        for project in _group_projects(4):
+            assert sorted(restored[project["path"]], key=lambda v: v["key"]) == sorted(
+                ({"variable_type": "env_var", "raw": False, "description": None, "masked": False, "protected": False,
+                  **v} for v in project["variables"]),
+                key=lambda v: v["key"],
+            )
+        by_route = fake_gitlab.stats()["by_route"]
+        assert by_route["POST /projects/:id/variables"] == 2
+        assert by_route["PUT /projects/:id/variables/:key"] == 2
+
+    def test_restore_selected_project(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(extra_projects=_group_projects(2))
+        output = tmp_path / "backup.jsonl.gz"
+        invoke("backup", "--gitlab-host", fake_gitlab.url, "--group", "acme", "--output", str(output))
+        fake_gitlab.reset(extra_projects=[{"path": p["path"]} for p in _group_projects(2)])
+
+        result = invoke("restore", str(output), "--project", "acme/app-0", "--include", "APP_*")
+
+        assert result.exit_code == 0, result.output
+        restored = fake_gitlab.project_variables()
+        assert [v["key"] for v in restored["acme/app-0"]] == ["APP_ID"]
+        assert restored["acme/team/app-1"] == []
+
+    def test_restore_unknown_project(self, fake_gitlab, tmp_path):
+        output = tmp_path / "backup.jsonl.gz"
+        _write_archive(output, [DOCUMENT])
+
+        result = invoke("restore", str(output), "--project", "acme/other")
+
+        assert result.exit_code == 1
+        assert "Not in the backup: acme/other" in result.output
+
+    def test_encrypted_backup_and_restore(self, fake_gitlab, tmp_path):
+        pytest.importorskip("cryptography")
+        fake_gitlab.reset(extra_projects=_group_projects(2))
+        output = tmp_path / "backup.jsonl.gz"
+        env = {"POPULATE_SECRETS_GITLAB_BACKUP_PASSPHRASE": "correct horse"}
+
+        result = invoke(
+            "backup", "--gitlab-host", fake_gitlab.url, "--group", "acme", "--output", str(output), "--encrypt",
+            env=env,
+        )
+        assert result.exit_code == 0, result.output
+        with gzip.open(output, "rt") as f:
+            assert json.loads(f.readline())["encrypted"] is True
+            assert "token-0000" not in f.read()
+
+        fake_gitlab.reset(extra_projects=[{"path": p["path"]} for p in _group_projects(2)])
+        result = invoke("restore", str(output), env=env)
+
+        assert result.exit_code == 0, result.output
+        assert len(fake_gitlab.project_variables()["acme/app-0"]) == 2
@@ -0,0 +1,179 @@
+"""Offline benchmarks against the fake Gitlab server in `fake_gitlab.py`.
+
+Each scenario runs a command in-process against the fake server and records
+the number of API requests, wall time and peak Python memory of the client.
+Request counts are deterministic and asserted, so a change that adds round
+trips fails the suite; timings and memory are written to `bench_output.txt`
+for comparison between runs.
+
+The 10,000 variable scenarios take a while and only run with
+`POPULATE_SECRETS_GITLAB_BENCH_FULL=1`.
+"""
+
+import math
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+
+from .fake_gitlab import invoke
+
+PER_PAGE = 100
+OUTPUT_PATH = Path(__file__).resolve().parents[1] / "bench_output.txt"
+
+SIZES = [
+    10,
+    1_000,
+    pytest.param(10_000, marks=pytest.mark.skipif(
+        not os.environ.get("POPULATE_SECRETS_GITLAB_BENCH_FULL"),
+        reason="set POPULATE_SECRETS_GITLAB_BENCH_FULL=1 to run the 10k scenarios",
+    )),
+]
+
+_results = []
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _write_results():
+    yield
+
+    if _results:
+        lines = [f"{'scenario':<28}{'variables':>10}{'requests':>10}{'wall (s)':>10}{'peak (KiB)':>12}"]
+        lines += [
+            f"{name:<28}{size:>10}{requests:>10}{wall:>10.3f}{peak / 1024:>12.0f}"
+            for name, size, requests, wall, peak in _results
+        ]
+        OUTPUT_PATH.write_text("\n".join(lines) + "\n")
+
+
+def _variables(size, environment="uat"):
+    return [{"key": f"VAR_{i}", "value": f"value-{i}", "environment_scope": environment} for i in range(size)]
+
+
+def _run(fake, name, size, args):
+    """Invoke the CLI, record its cost and return ``(result, request count)``."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = invoke(*args, "--gitlab-host", fake.url, "--project", "group/project")
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result.exit_code == 0, result.output
+    requests = fake.stats()["requests"]
+    _results.append((name, size, requests, wall, peak))
+    return result, requests
+
+
+def _pages(size):
+    return max(1, math.ceil(size / PER_PAGE))
+
+
+@pytest.mark.parametrize("size", SIZES)
+class TestBenchmarks:
+    def test_write_creates(self, fake_gitlab, tmp_path, size):
+        fake_gitlab.reset()
+        env_file = tmp_path / ".env"
+        env_file.write_text("".join(f"VAR_{i}=value-{i}\n" for i in range(size)))
+
+        _, requests = _run(fake_gitlab, "write (all new)", size, [
+            "write", "--env-file", str(env_file), "--environment", "uat", "--concurrency", "8",
+        ])
+
+        assert requests == 1 + 1 + size
+        assert len(fake_gitlab.variables()) == size
+
+    def test_write_unchanged(self, fake_gitlab, tmp_path, size):
+        fake_gitlab.reset(_variables(size))
+        env_file = tmp_path / ".env"
+        env_file.write_text("".join(f"VAR_{i}=value-{i}\n" for i in range(size)))
+
+        _, requests = _run(fake_gitlab, "write (unchanged)", size, [
+            "write", "--env-file", str(env_file), "--environment", "uat",
+        ])
+
+        assert requests == 1 + _pages(size)
+
+    def test_list(self, fake_gitlab, size):
+        fake_gitlab.reset(_variables(size))
+
+        result, requests = _run(fake_gitlab, "list", size, ["list", "--environment", "uat"])
+
+        assert f"{size} variable(s) found." in result.output
+        assert requests == 1 + _pages(size)
+
+    def test_get(self, fake_gitlab, size):
+        fake_gitlab.reset(_variables(size))
+
+        _, requests = _run(fake_gitlab, "get", size, ["get", "--environment", "uat"])
+
+        assert requests == 1 + _pages(size)
+
+    def test_download(self, fake_gitlab, tmp_path, size):
+        fake_gitlab.reset(_variables(size))
+
+        _, requests = _run(fake_gitlab, "download", size, [
+            "download", "--environment", "uat", "--output-dir", str(tmp_path),
+        ])
+
+        assert len((tmp_path / "uat.env").read_text().splitlines()) == size
+        assert requests == 1 + _pages(size)
+
+    def test_download_all_environments(self, fake_gitlab, tmp_path, size):
+        # Spread the variables over 30 scopes
+        fake_gitlab.reset([
+            dict(v, environment_scope=f"env-{i % 30}") for i, v in enumerate(_variables(size))
+        ])
+
+        _, requests = _run(fake_gitlab, "download (all scopes)", size, [
+            "download", "--all-environments", "--output-dir", str(tmp_path),
+        ])
+
+        assert len(list(tmp_path.glob("*.env"))) == min(size, 30)
+        assert requests == 1 + _pages(size)
+
+
+class TestFaultTolerance:
+    def test_write_survives_rate_limiting(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(rate_limit=15, rate_window=1)
+        env_file = tmp_path / ".env"
+        env_file.write_text("".join(f"VAR_{i}=v\n" for i in range(30)))
+
+        _run(fake_gitlab, "write (rate limited)", 30, [
+            "write", "--env-file", str(env_file), "--environment", "uat", "--concurrency", "4",
+        ])
+
+        assert len(fake_gitlab.variables()) == 30
+
+    def test_list_survives_transient_errors(self, fake_gitlab):
+        fake_gitlab.reset(_variables(500), error_rate=0.2)
+
+        with patch("populate_secrets_gitlab.rate_limit.RateLimiter.retry_delay", return_value=0):
+            result, _ = _run(fake_gitlab, "list (5xx injected)", 500, ["list", "--environment", "uat"])
+
+        assert "500 variable(s) found." in result.output
+
+    def test_write_rerun_converges_after_transient_errors(self, fake_gitlab, tmp_path):
+        # Creates aren't idempotent, so a 5xx on one isn't retried and the key is left for a rerun.
+        # One worker keeps the seeded error sequence, and so the keys that fail, the same every run
+        fake_gitlab.reset(error_rate=0.3)
+        env_file = tmp_path / ".env"
+        env_file.write_text("".join(f"VAR_{i}=v\n" for i in range(30)))
+        args = ["write", "--env-file", str(env_file), "--environment", "uat", "--concurrency", "1"]
+
+        with patch("populate_secrets_gitlab.rate_limit.RateLimiter.retry_delay", return_value=0):
+            _run(fake_gitlab, "write (5xx injected)", 30, args)
+            missing = 30 - len(fake_gitlab.variables())
+            assert missing > 0
+
+            fake_gitlab.configure(error_rate=0, reset_stats=True)
+            _, requests = _run(fake_gitlab, "write (rerun)", 30, args)
+
+        assert len(fake_gitlab.variables()) == 30
+        # The rerun only creates the keys the first run left out
+        assert fake_gitlab.stats()["by_route"]["POST /projects/:id/variables"] == missing
+        assert requests == 1 + 1 + missing
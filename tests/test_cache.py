@@ -0,0 +1,250 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import click.testing
+import pytest
+
+from populate_secrets_gitlab import cache as variable_cache
+from populate_secrets_gitlab.app import cli
+from populate_secrets_gitlab.backup import ArchiveWriter, project_document
+from populate_secrets_gitlab.cache import Cache, iter_cached_variables, load_variables
+from populate_secrets_gitlab.variables import Variable
+
+from .fake_gitlab import invoke
+
+
+class _Response:
+    def __init__(self, status_code, variables=None, headers=None):
+        self.status_code = status_code
+        self._variables = variables or []
+        self.headers = headers or {}
+        self.text = ""
+        self.content = b""
+
+    def json(self):
+        return self._variables
+
+
+def _var(key, value="v", scope="uat"):
+    return {"key": key, "value": value, "environment_scope": scope, "masked": False, "protected": False}
+
+
+def _client(responses):
+    client = MagicMock()
+    client.api_url = "https://gitlab.example.com/api/v4"
+    client.headers = {"PRIVATE-TOKEN": "t"}
+    client.session.get.side_effect = list(responses)
+    return client
+
+
+class TestCache:
+    def test_project_lookup_round_trip(self):
+        cache = Cache("h", "t")
+        cache.set_project("group/project", 42, "project")
+        assert cache.get_project("group/project")["id"] == 42
+        assert cache.get_project("other") is None
+
+    def test_namespaced_by_token(self):
+        Cache("h", "token-a").set_project("p", 1, "p")
+        assert Cache("h", "token-b").get_project("p") is None
+
+    def test_files_are_private(self):
+        cache = Cache("h", "t")
+        cache.set_project("p", 1, "p")
+        assert os.stat(cache._projects_path()).st_mode & 0o077 == 0
+
+    def test_concurrent_project_writes_keep_every_entry(self):
+        cache = Cache("h", "t")
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: cache.set_project(f"group/project-{i}", i, f"project-{i}"), range(200)))
+
+        assert all(cache.get_project(f"group/project-{i}")["id"] == i for i in range(200))
+        assert not [name for name in os.listdir(cache.path) if name.endswith(".tmp")]
+
+    def test_least_recently_used_listing_is_evicted(self):
+        cache = Cache("h", "t")
+        for project_id in (1, 2, 3):
+            cache.set_listing(project_id, [])
+            past = time.time() - 100 + project_id
+            os.utime(cache._listing_path(project_id), (past, past))
+        cache.max_entries = 2
+        cache.get_listing(1)
+        cache.set_listing(4, [])
+
+        remaining = {pid for pid in (1, 2, 3, 4) if cache.get_listing(pid) is not None}
+        assert remaining == {1, 4}
+
+    def test_concurrent_listing_reads_and_evictions(self):
+        cache = Cache("h", "t")
+        cache.max_entries = 3
+
+        def use(i):
+            cache.set_listing(i % 8, [])
+            cache.get_listing((i + 1) % 8)
+            cache.invalidate_listing((i + 2) % 8)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(use, range(400)))
+
+        assert len([name for name in os.listdir(cache.path) if name.startswith("variables-")]) <= 3
+
+    def test_clear_removes_everything(self):
+        Cache("h", "t").set_project("p", 1, "p")
+        variable_cache.clear()
+        assert not os.path.exists(variable_cache.cache_dir())
+
+
+class TestLoadVariables:
+    def test_fresh_listing_is_served_from_disk(self):
+        cache = Cache("h", "t")
+        client = _client([_Response(200, [_var("A")], {"ETag": "W/1"})])
+
+        first = load_variables(client, cache, 42)
+        second = load_variables(client, cache, 42)
+
+        assert first == second == [Variable("A", "v", "uat", False, False)]
+        assert client.session.get.call_count == 1
+
+    def test_stale_listing_is_revalidated_with_etags(self):
+        cache = Cache("h", "t")
+        client = _client([
+            _Response(200, [_var("A")], {"ETag": "W/1", "X-Next-Page": "2"}),
+            _Response(200, [_var("B")], {"ETag": "W/2"}),
+            _Response(304),
+            _Response(200, [_var("B", "changed")], {"ETag": "W/3"}),
+        ])
+
+        load_variables(client, cache, 42)
+        variables = load_variables(client, cache, 42, max_age=0)
+
+        assert [(v.key, v.value) for v in variables] == [("A", "v"), ("B", "changed")]
+        revalidation = client.session.get.call_args_list[2]
+        assert revalidation.kwargs["headers"]["If-None-Match"] == "W/1"
+        assert revalidation.kwargs["headers"]["PRIVATE-TOKEN"] == "t"
+
+    def test_pages_stream_before_the_entry_is_written(self):
+        cache = Cache("h", "t")
+        client = _client([
+            _Response(200, [_var("A")], {"ETag": "W/1", "X-Next-Page": "2"}),
+            _Response(200, [_var("B")], {"ETag": "W/2"}),
+        ])
+
+        variables = iter_cached_variables(client, cache, 42)
+
+        assert next(variables).key == "A"
+        assert client.session.get.call_count == 1
+        assert cache.get_listing(42) is None
+        assert [v.key for v in variables] == ["B"]
+        assert len(cache.get_listing(42)["pages"]) == 2
+
+
+    def test_append_to_a_full_last_page_is_found(self):
+        cache = Cache("h", "t")
+        client = _client([
+            _Response(200, [_var("A")], {"ETag": "W/1", "X-Total-Pages": "1"}),
+            # Page 1 is unchanged, but a second page now follows it
+            _Response(304, headers={"X-Next-Page": "2", "X-Total-Pages": "2"}),
+            _Response(200, [_var("B")], {"ETag": "W/2", "X-Total-Pages": "2"}),
+        ])
+
+        load_variables(client, cache, 42)
+        variables = load_variables(client, cache, 42, max_age=0)
+
+        assert [v.key for v in variables] == ["A", "B"]
+        assert cache.get_listing(42)["pages"][0]["next"] == "2"
+
+
+class TestCachedCommands:
+    def test_repeated_list_reuses_project_and_listing(self, monkeypatch):
+        monkeypatch.delenv("POPULATE_SECRETS_GITLAB_NO_CACHE")
+        project = MagicMock()
+        project.id = 42
+        project.name = "test-project"
+        client = _client([_Response(200, [_var("A_VAR")], {"ETag": "W/1"})])
+        client.projects.get.return_value = project
+
+        runner = click.testing.CliRunner()
+        with patch.dict(os.environ, {"GITLAB_TOKEN": "fake-token"}):
+            with patch("populate_secrets_gitlab.app.gitlab_client", return_value=client):
+                for _ in range(2):
+                    result = runner.invoke(cli, [
+                        "list", "--environment", "uat",
+                        "--gitlab-host", "h", "--project", "g/p",
+                    ])
+                    assert result.exit_code == 0, result.output
+                    assert "A_VAR" in result.output
+                    assert "test-project (42)" in result.output
+
+        client.projects.get.assert_called_once()
+        assert client.session.get.call_count == 1
+
+    def test_concurrent_projects_share_the_cache(self, fake_gitlab, monkeypatch, tmp_path):
+        monkeypatch.delenv("POPULATE_SECRETS_GITLAB_NO_CACHE")
+        paths = [f"acme/app-{i}" for i in range(12)]
+        fake_gitlab.reset(extra_projects=[{"path": path} for path in paths])
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+        project_args = [arg for path in paths for arg in ("--project", path)]
+
+        result = invoke(
+            "write", "--env-file", str(env_file), "--environment", "uat", "--gitlab-host", fake_gitlab.url,
+            *project_args, "--project-concurrency", "12",
+        )
+        assert result.exit_code == 0, result.output
+
+        archive = tmp_path / "backup.jsonl.gz"
+        writer = ArchiveWriter(str(archive), fake_gitlab.url, "acme")
+        for path, variables in fake_gitlab.project_variables().items():
+            if path in paths:
+                writer.add(project_document({"path": path}, variables))
+        writer.close()
+        fake_gitlab.reset(extra_projects=[{"path": path} for path in paths])
+
+        result = invoke("restore", str(archive), "--project-concurrency", "12")
+
+        assert result.exit_code == 0, result.output
+        stored = fake_gitlab.project_variables()
+        assert all([(v["key"], v["value"]) for v in stored[path]] == [("A", "1")] for path in paths)
+        assert set(paths) <= set(variable_cache._read_json(Cache(fake_gitlab.url, "fake-token")._projects_path()))
+
+    def test_write_sees_variable_appended_after_a_full_page(self, fake_gitlab, monkeypatch, tmp_path):
+        monkeypatch.delenv("POPULATE_SECRETS_GITLAB_NO_CACHE")
+        full_page = [{"key": f"K{i:03}", "value": "v", "environment_scope": "uat"} for i in range(100)]
+        fake_gitlab.reset(full_page)
+        args = ["--environment", "uat", "--gitlab-host", fake_gitlab.url, "--project", "group/project"]
+        assert invoke("list", *args).exit_code == 0
+        fake_gitlab.configure(variables=full_page + [{"key": "K100", "value": "old", "environment_scope": "uat"}])
+        env_file = tmp_path / ".env"
+        env_file.write_text("K100=new\n")
+
+        result = invoke("write", "--env-file", str(env_file), *args)
+
+        assert result.exit_code == 0, result.output
+        assert ("K100", "new") in fake_gitlab.rows("key", "value")
+        assert "POST /projects/:id/variables" not in fake_gitlab.stats()["by_route"]
+
+    def test_async_write_invalidates_the_listing(self, fake_gitlab, monkeypatch, tmp_path):
+        pytest.importorskip("httpx")
+        monkeypatch.delenv("POPULATE_SECRETS_GITLAB_NO_CACHE")
+        fake_gitlab.reset([{"key": "A", "value": "old", "environment_scope": "uat"}])
+        args = ["--environment", "uat", "--gitlab-host", fake_gitlab.url, "--project", "group/project"]
+        assert invoke("get", *args).exit_code == 0
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=new\n")
+
+        result = invoke("write", "--env-file", str(env_file), "--engine", "async", *args)
+        assert result.exit_code == 0, result.output
+        result = invoke("get", *args)
+
+        assert result.exit_code == 0, result.output
+        assert "A=new" in result.output
+
+    def test_cache_clear_command(self):
+        Cache("h", "t").set_project("p", 1, "p")
+        result = click.testing.CliRunner().invoke(cli, ["cache", "clear"])
+
+        assert result.exit_code == 0, result.output
+        assert not os.path.exists(variable_cache.cache_dir())
@@ -0,0 +1,126 @@
+import hashlib
+import json
+
+from populate_secrets_gitlab.compare import diff, redact
+
+from .fake_gitlab import invoke
+
+
+def _compare(fake, *args):
+    return invoke("compare", "--gitlab-host", fake.url, "--project", "group/project", "--environment", "uat", *args)
+
+
+REMOTE = [
+    {"key": "SAME", "value": "1", "environment_scope": "uat"},
+    {"key": "SAME", "value": "1", "environment_scope": "production"},
+    {"key": "CHANGED", "value": "uat-value", "environment_scope": "uat"},
+    {"key": "CHANGED", "value": "prod-value", "environment_scope": "production"},
+    {"key": "UAT_ONLY", "value": "u", "environment_scope": "uat"},
+    {"key": "PROD_ONLY", "value": "p", "environment_scope": "production"},
+    {"key": "GLOBAL", "value": "g", "environment_scope": "*"},
+]
+
+
+class TestDiff:
+    def test_added_removed_changed(self):
+        result = diff({"A": "1", "B": "2", "C": "3"}, {"B": "2", "C": "4", "D": "5"}, sensitive=True)
+
+        assert result == {
+            "added": [{"key": "A", "value": "1"}],
+            "removed": [{"key": "D", "value": "5"}],
+            "changed": [{"key": "C", "value": "3", "against_value": "4"}],
+            "unchanged": 1,
+        }
+
+    def test_values_are_digests_by_default(self):
+        result = diff({"A": "secret"}, {"A": "other"}, digest_key=b"k")
+
+        assert result["changed"] == [
+            {"key": "A", "value": redact("secret", b"k"), "against_value": redact("other", b"k")},
+        ]
+        assert redact("secret", b"k").startswith("hmac:")
+        assert "secret" not in json.dumps(result)
+
+    def test_digests_are_keyed_per_report(self):
+        first = diff({"A": "secret", "B": "secret"}, {})["added"]
+        second = diff({"A": "secret"}, {})["added"]
+
+        # Equal within a report, but not comparable across reports or with a plain hash
+        assert first[0]["value"] == first[1]["value"]
+        assert first[0]["value"] != second[0]["value"]
+        assert hashlib.sha256(b"secret").hexdigest()[:12] not in first[0]["value"]
+
+    def test_none_values(self):
+        assert diff({"A": None}, {})["added"] == [{"key": "A", "value": None}]
+
+
+class TestCompareCommand:
+    def test_against_environment_json(self, fake_gitlab):
+        fake_gitlab.reset(REMOTE)
+
+        result = _compare(fake_gitlab, "--against", "production", "--json")
+
+        assert result.exit_code == 0, result.output
+        report = json.loads(result.output)
+        assert report["against"] == {"environment": "production"}
+        assert [e["key"] for e in report["added"]] == ["UAT_ONLY"]
+        assert [e["key"] for e in report["removed"]] == ["PROD_ONLY"]
+        [changed] = report["changed"]
+        assert changed["key"] == "CHANGED"
+        assert changed["value"].startswith("hmac:")
+        assert changed["value"] != changed["against_value"]
+        assert "uat-value" not in result.output
+        assert report["unchanged"] == 1
+        # A single listing serves both scopes
+        assert fake_gitlab.stats()["by_route"]["GET /projects/:id/variables"] == 1
+
+    def test_text_output_hides_values(self, fake_gitlab):
+        fake_gitlab.reset(REMOTE)
+
+        result = _compare(fake_gitlab, "--against", "production")
+
+        assert result.exit_code == 0, result.output
+        assert "+ UAT_ONLY" in result.output
+        assert "- PROD_ONLY" in result.output
+        assert "~ CHANGED" in result.output
+        assert "uat-value" not in result.output
+        assert "1 added, 1 removed, 1 changed, 1 unchanged" in result.output
+
+    def test_sensitive_shows_values(self, fake_gitlab):
+        fake_gitlab.reset(REMOTE)
+
+        result = _compare(fake_gitlab, "--against", "production", "--sensitive")
+
+        assert "~ CHANGED  prod-value -> uat-value" in result.output
+
+    def test_against_file(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        env_file = tmp_path / ".env"
+        env_file.write_text("SAME=1\nCHANGED=uat-value\nUAT_ONLY=u\n")
+
+        result = _compare(fake_gitlab, "--against-file", str(env_file), "--json", "--exit-code")
+
+        assert result.exit_code == 0, result.output
+        report = json.loads(result.output)
+        assert report["against"] == {"file": str(env_file)}
+        assert report["unchanged"] == 3
+
+    def test_exit_code_on_drift(self, fake_gitlab):
+        fake_gitlab.reset(REMOTE)
+
+        result = _compare(fake_gitlab, "--against", "production", "--exit-code")
+
+        assert result.exit_code == 1
+
+    def test_filters_apply_to_both_sides(self, fake_gitlab):
+        fake_gitlab.reset(REMOTE)
+
+        result = _compare(fake_gitlab, "--against", "production", "--exclude", "*_ONLY,CHANGED", "--exit-code")
+
+        assert result.exit_code == 0, result.output
+
+    def test_requires_one_baseline(self, fake_gitlab):
+        result = _compare(fake_gitlab)
+
+        assert result.exit_code == 2
+        assert "Provide either --against or --against-file" in result.output
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from populate_secrets_gitlab import cache as variable_cache
+
+from .fake_gitlab import invoke
+
+
+def _copy(fake, *args):
+    return invoke("copy", "--gitlab-host", fake.url, "--from-project", "group/project", *args)
+
+
+ROW = ("environment_scope", "key", "value", "masked", "protected")
+
+
+SOURCE = [
+    {"key": "PLAIN", "value": "1", "environment_scope": "uat"},
+    {"key": "API_TOKEN", "value": "secret-value", "environment_scope": "uat", "masked": True, "protected": True},
+    {"key": "SKIP_ME", "value": "1", "environment_scope": "uat"},
+    {"key": "PROD_ONLY", "value": "1", "environment_scope": "production"},
+    {"key": "GLOBAL", "value": "1", "environment_scope": "*"},
+]
+
+
+class TestCopy:
+    def test_copies_scope_within_project(self, fake_gitlab):
+        fake_gitlab.reset(SOURCE + [{"key": "PLAIN", "value": "old", "environment_scope": "staging"}])
+
+        result = _copy(fake_gitlab, "--from-env", "uat", "--to-env", "staging", "--exclude", "SKIP_ME")
+
+        assert result.exit_code == 0, result.output
+        assert [row for row in fake_gitlab.rows(*ROW) if row[0] == "staging"] == [
+            ("staging", "API_TOKEN", "secret-value", True, True),
+            ("staging", "PLAIN", "1", False, False),
+        ]
+        by_route = fake_gitlab.stats()["by_route"]
+        # One listing serves as both source and target
+        assert by_route["GET /projects/:id/variables"] == 1
+        assert by_route["POST /projects/:id/variables"] == 1
+        assert by_route["PUT /projects/:id/variables/:key"] == 1
+
+    def test_copies_to_another_project(self, fake_gitlab, caplog):
+        fake_gitlab.reset(SOURCE)
+
+        with caplog.at_level("INFO"):
+            result = _copy(
+                fake_gitlab, "--from-env", "uat", "--to-project", "group/other", "--include", "PLAIN,API_TOKEN",
+                "--concurrency", "4",
+            )
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows(*ROW, other=True) == [
+            ("uat", "API_TOKEN", "secret-value", True, True),
+            ("uat", "PLAIN", "1", False, False),
+        ]
+        assert "0 unchanged, 0 updated, 2 created, 0 failed" in caplog.text
+
+    @pytest.mark.parametrize("api", ["rest", "graphql"])
+    def test_keeps_type_raw_and_description(self, fake_gitlab, api):
+        fake_gitlab.reset([
+            {"key": "CA_CERT", "value": "-----cert-----", "environment_scope": "uat", "variable_type": "file",
+             "raw": True, "description": "TLS CA bundle"},
+        ], other_variables=[{"key": "CA_CERT", "value": "-----cert-----", "environment_scope": "uat"}])
+
+        result = _copy(fake_gitlab, "--from-env", "uat", "--to-project", "group/other", "--api", api)
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows("key", "variable_type", "raw", "description", other=True) == [
+            ("CA_CERT", "file", True, "TLS CA bundle"),
+        ]
+
+    def test_values_never_reach_the_cache(self, fake_gitlab, monkeypatch):
+        monkeypatch.delenv("POPULATE_SECRETS_GITLAB_NO_CACHE")
+        fake_gitlab.reset(SOURCE)
+
+        result = _copy(fake_gitlab, "--from-env", "uat", "--to-project", "group/other")
+
+        assert result.exit_code == 0, result.output
+        cached = [
+            os.path.join(root, name) for root, _, names in os.walk(variable_cache.cache_dir()) for name in names
+        ]
+        # Project lookups are still cached
+        assert any(path.endswith("projects.json") for path in cached)
+        for path in cached:
+            with open(path) as f:
+                assert "secret-value" not in f.read(), path
+
+    def test_rerun_is_a_no_op(self, fake_gitlab, caplog):
+        fake_gitlab.reset(SOURCE)
+        _copy(fake_gitlab, "--from-env", "uat", "--to-project", "group/other")
+        fake_gitlab.configure(reset_stats=True)
+
+        with caplog.at_level("INFO"):
+            result = _copy(fake_gitlab, "--from-env", "uat", "--to-project", "group/other")
+
+        assert result.exit_code == 0, result.output
+        assert "3 unchanged, 0 updated, 0 created, 0 failed" in caplog.text
+        assert not any(route.startswith(("POST", "PUT")) for route in fake_gitlab.stats()["by_route"])
+
+    def test_writes_no_files(self, fake_gitlab, tmp_path, monkeypatch):
+        fake_gitlab.reset(SOURCE)
+        monkeypatch.chdir(tmp_path)
+
+        result = _copy(fake_gitlab, "--from-env", "uat", "--to-env", "staging")
+
+        assert result.exit_code == 0, result.output
+        assert os.listdir(tmp_path) == []
+
+    def test_same_source_and_target_is_rejected(self, fake_gitlab):
+        result = _copy(fake_gitlab, "--from-env", "uat")
+
+        assert result.exit_code == 2
+        assert "different --to-project or --to-env" in result.output
+
+    def test_missing_project(self, fake_gitlab):
+        fake_gitlab.reset(SOURCE)
+
+        result = _copy(fake_gitlab, "--from-env", "uat", "--to-project", "group/missing")
+
+        assert result.exit_code == 1
+        assert "Could not find project: group/missing" in result.output
@@ -0,0 +1,187 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from populate_secrets_gitlab.effective import ListingCache, ancestor_groups, resolve, scope_matches
+from populate_secrets_gitlab.variables import Variable
+
+from .fake_gitlab import invoke
+
+
+def _invoke(fake, command, *args, projects=("group/project",)):
+    project_args = [arg for project in projects for arg in ("--project", project)]
+    return invoke(command, "--gitlab-host", fake.url, *project_args, "--environment", "uat", *args)
+
+
+def _var(key, value, scope="*"):
+    return Variable(key, value, scope, False, False)
+
+
+class TestScopes:
+    @pytest.mark.parametrize("scope, environment, expected", [
+        ("*", "uat", True),
+        ("uat", "uat", True),
+        ("uat", "production", False),
+        ("review/*", "review/feature-1", True),
+        ("review/*", "uat", False),
+        ("*-eu", "prod-eu", True),
+        ("review.*", "reviewX1", False),
+    ])
+    def test_scope_matches(self, scope, environment, expected):
+        assert scope_matches(scope, environment) is expected
+
+    def test_ancestor_groups(self):
+        assert ancestor_groups("a/b/c") == ["a", "a/b", "a/b/c"]
+        assert ancestor_groups("a") == ["a"]
+
+
+class TestResolve:
+    def test_project_overrides_groups_and_instance(self):
+        result = resolve(
+            "uat", "a/b/app",
+            [_var("SHARED", "project")],
+            [("a", [_var("SHARED", "top"), _var("TOP_ONLY", "t")]), ("a/b", [_var("SHARED", "sub")])],
+            [_var("SHARED", "instance"), _var("INSTANCE_ONLY", "i")],
+        )
+
+        assert [(v.key, v.value, v.level, v.source) for v in result] == [
+            ("INSTANCE_ONLY", "i", "instance", None),
+            ("SHARED", "project", "project", "a/b/app"),
+            ("TOP_ONLY", "t", "group", "a"),
+        ]
+
+    def test_nearest_group_wins(self):
+        result = resolve("uat", "a/b/app", [], [("a", [_var("X", "top")]), ("a/b", [_var("X", "sub")])], [])
+
+        assert [(v.value, v.source) for v in result] == [("sub", "a/b")]
+
+    def test_most_specific_scope_wins_within_level(self):
+        project_vars = [
+            _var("X", "any"), _var("X", "review", "review/*"), _var("X", "exact", "review/one"),
+            _var("Y", "any"), _var("Y", "review", "review/*"),
+            _var("Z", "other", "production"),
+        ]
+
+        result = resolve("review/one", "group/project", project_vars, [], [])
+
+        assert [(v.key, v.value, v.environment_scope) for v in result] == [
+            ("X", "exact", "review/one"),
+            ("Y", "review", "review/*"),
+        ]
+
+    def test_scoped_group_variable_loses_to_any_scope_project_variable(self):
+        result = resolve("uat", "g/app", [_var("X", "project")], [("g", [_var("X", "group", "uat")])], [])
+
+        assert [(v.value, v.level) for v in result] == [("project", "project")]
+
+
+class TestListingCache:
+    def test_concurrent_callers_share_one_fetch(self):
+        cache = ListingCache()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return ["listing"]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(cache.get, "key", fetch) for _ in range(4)]
+            results = [f.result() for f in futures]
+
+        assert results == [["listing"]] * 4
+        assert len(calls) == 1
+
+    def test_errors_are_shared(self):
+        cache = ListingCache()
+
+        def fetch():
+            raise RuntimeError("boom")
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="boom"):
+                cache.get("key", fetch)
+
+
+GROUP_VARIABLES = {
+    "group": [
+        {"key": "SHARED", "value": "from-group", "environment_scope": "*"},
+        {"key": "GROUP_ONLY", "value": "g", "environment_scope": "uat"},
+        {"key": "GROUP_PROD", "value": "p", "environment_scope": "production"},
+    ],
+}
+INSTANCE_VARIABLES = [
+    {"key": "SHARED", "value": "from-instance"},
+    {"key": "INSTANCE_ONLY", "value": "i"},
+]
+PROJECT_VARIABLES = [
+    {"key": "SHARED", "value": "from-project", "environment_scope": "uat"},
+    {"key": "PROJECT_ONLY", "value": "p", "environment_scope": "*"},
+]
+
+
+class TestEffectiveCommands:
+    def test_list_effective(self, fake_gitlab):
+        fake_gitlab.reset(PROJECT_VARIABLES, group_variables=GROUP_VARIABLES, instance_variables=INSTANCE_VARIABLES)
+
+        result = _invoke(fake_gitlab, "list", "--effective")
+
+        assert result.exit_code == 0, result.output
+        lines = [line.split() for line in result.output.splitlines() if line.startswith("  ")]
+        assert lines == [
+            ["group", "group", "[uat]", "GROUP_ONLY", "g"],
+            ["instance", "INSTANCE_ONLY", "i"],
+            ["project", "group/project", "[*]", "PROJECT_ONLY", "p"],
+            ["project", "group/project", "[uat]", "SHARED", "from-project"],
+        ]
+        assert "4 variable(s) found." in result.output
+
+    def test_get_effective(self, fake_gitlab):
+        fake_gitlab.reset(PROJECT_VARIABLES, group_variables=GROUP_VARIABLES, instance_variables=INSTANCE_VARIABLES)
+
+        result = _invoke(fake_gitlab, "get", "--effective", "--include", "SHARED,INSTANCE_ONLY")
+
+        assert result.exit_code == 0, result.output
+        assert "[instance] INSTANCE_ONLY=i" in result.output
+        assert "[project group/project [uat]] SHARED=from-project" in result.output
+        assert "GROUP_ONLY" not in result.output
+
+    def test_unreadable_instance_variables_are_left_out(self, fake_gitlab, caplog):
+        fake_gitlab.reset(PROJECT_VARIABLES, group_variables=GROUP_VARIABLES, instance_variables=None)
+
+        with caplog.at_level(logging.WARNING):
+            result = _invoke(fake_gitlab, "list", "--effective")
+
+        assert result.exit_code == 0, result.output
+        assert "INSTANCE_ONLY" not in result.output
+        assert "GROUP_ONLY" in result.output
+        assert "Can't read instance variables" in caplog.text
+
+    def test_group_listings_shared_between_projects(self, fake_gitlab):
+        fake_gitlab.reset(
+            PROJECT_VARIABLES, other_variables=[{"key": "OTHER", "value": "o"}],
+            group_variables=GROUP_VARIABLES, instance_variables=INSTANCE_VARIABLES,
+        )
+
+        result = _invoke(fake_gitlab, "list", "--effective", projects=("group/project", "group/other"))
+
+        assert result.exit_code == 0, result.output
+        assert "OTHER" in result.output
+        by_route = fake_gitlab.stats()["by_route"]
+        assert by_route["GET /groups/:id/variables"] == 1
+        assert by_route["GET /admin/ci/variables"] == 1
+        assert by_route["GET /projects/:id/variables"] == 2
+
+    def test_async_engine_rejected(self, fake_gitlab):
+        result = _invoke(fake_gitlab, "list", "--effective", "--engine", "async")
+
+        assert result.exit_code == 2
+        assert "--effective is only supported by the default engine" in result.output
+
+    def test_get_effective_export_rejected(self, fake_gitlab):
+        result = _invoke(fake_gitlab, "get", "--effective", "--export")
+
+        assert result.exit_code == 2
+        assert "--export can't be combined with --effective" in result.output
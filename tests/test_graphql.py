@@ -0,0 +1,76 @@
+from .fake_gitlab import invoke
+
+
+def _variables(size, environment="uat"):
+    return [{"key": f"VAR_{i:03}", "value": f"value-{i}", "environment_scope": environment} for i in range(size)]
+
+
+def _graphql(fake, command, *args, project="group/project"):
+    return invoke(
+        command, "--gitlab-host", fake.url, "--environment", "uat", "--project", project, "--api", "graphql", *args,
+    )
+
+
+class TestGraphqlApi:
+    def test_list_pages_through_graphql(self, fake_gitlab):
+        fake_gitlab.reset(_variables(250))
+
+        result = _graphql(fake_gitlab, "list")
+
+        assert result.exit_code == 0, result.output
+        assert "250 variable(s) found." in result.output
+        # The project lookup shares a round trip with the first page
+        assert fake_gitlab.stats()["by_route"] == {"POST /api/graphql": 3}
+
+    def test_numeric_project_id(self, fake_gitlab):
+        fake_gitlab.reset(_variables(2))
+
+        result = _graphql(fake_gitlab, "get", project="1")
+
+        assert result.exit_code == 0, result.output
+        assert "Getting vars from project (1)" in result.output
+        assert "[uat] VAR_001=value-1" in result.output
+
+    def test_missing_project(self, fake_gitlab):
+        fake_gitlab.reset()
+
+        result = _graphql(fake_gitlab, "list", project="nope/nope")
+
+        assert result.exit_code == 1
+        assert "Could not find project: nope/nope" in result.output
+
+    def test_falls_back_to_rest_when_graphql_is_unavailable(self, fake_gitlab):
+        fake_gitlab.reset(_variables(5), graphql=False)
+
+        result = _graphql(fake_gitlab, "list")
+
+        assert result.exit_code == 0, result.output
+        assert "5 variable(s) found." in result.output
+        assert fake_gitlab.stats()["by_route"] == {
+            "POST /api/graphql": 1,
+            "GET /projects/:id": 1,
+            "GET /projects/:id/variables": 1,
+        }
+
+    def test_write_diffs_via_graphql_and_writes_via_rest(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(_variables(3))
+        env_file = tmp_path / ".env"
+        env_file.write_text("VAR_000=value-0\nVAR_001=changed\nNEW=1\n")
+
+        result = _graphql(fake_gitlab, "write", "--env-file", str(env_file))
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.stats()["by_route"] == {
+            "POST /api/graphql": 1,
+            "PUT /projects/:id/variables/:key": 1,
+            "POST /projects/:id/variables": 1,
+        }
+        values = {v["key"]: v["value"] for v in fake_gitlab.variables()}
+        assert values["VAR_001"] == "changed"
+        assert values["NEW"] == "1"
+
+    def test_rejected_with_async_engine(self, fake_gitlab):
+        result = _graphql(fake_gitlab, "list", "--engine", "async")
+
+        assert result.exit_code == 2
+        assert "--api graphql is only supported by the default engine" in result.output
@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+
+from populate_secrets_gitlab.journal import Journal, journal_dir, remaining_writes
+from populate_secrets_gitlab.variables import Variable
+
+from .fake_gitlab import invoke
+
+
+def _write(fake, env_file, *extra_args):
+    return invoke(
+        "write", "--env-file", str(env_file), "--environment", "uat",
+        "--gitlab-host", fake.url, "--project", "group/project", *extra_args,
+    )
+
+
+class TestJournal:
+    def test_round_trip_ignores_torn_last_line(self, tmp_path):
+        journal = Journal(str(tmp_path / "j.jsonl"))
+        journal.start([
+            ("uat", "A", "s3cret", False, None),
+            ("uat", "B", "s3cret", True, Variable("B", "old", "uat")),
+        ])
+        journal.record("uat", "A")
+        journal.close()
+        with open(journal.path, "a") as f:
+            f.write('{"written": ["uat", "B"')
+
+        plan, written = journal.load()
+
+        assert plan == [("uat", "A", False, False), ("uat", "B", True, True)]
+        assert written == {("uat", "A")}
+        assert "s3cret" not in Path(journal.path).read_text()
+
+    def test_remaining_writes_rebuilds_updates_and_creates(self):
+        plan = [("uat", "A", False, False), ("uat", "B", True, True), ("uat", "C", False, False)]
+
+        pending = remaining_writes(plan, {("uat", "A")}, {"A": "1", "B": "2", "C": "3"})
+
+        assert [(e, k, v, m) for e, k, v, m, _ in pending] == [("uat", "B", "2", True), ("uat", "C", "3", False)]
+        assert pending[0][4] is not None
+        assert pending[1][4] is None
+
+
+class TestResume:
+    def test_resume_writes_only_outstanding_keys_without_listing(self, fake_gitlab, tmp_path, caplog):
+        fake_gitlab.reset(fail_keys=["VAR_3", "VAR_7"])
+        env_file = tmp_path / ".env"
+        env_file.write_text("".join(f"VAR_{i}=value-{i}\n" for i in range(10)))
+
+        result = _write(fake_gitlab, env_file)
+        assert result.exit_code == 0, result.output
+        assert len(fake_gitlab.variables()) == 8
+        [journal_file] = os.listdir(journal_dir())
+
+        fake_gitlab.reset(fake_gitlab.variables())
+        with caplog.at_level("INFO"):
+            result = _write(fake_gitlab, env_file, "--resume")
+
+        assert result.exit_code == 0, result.output
+        assert "Resuming uat from journal: 8 already written, 2 remaining" in caplog.text
+        assert fake_gitlab.stats()["by_route"] == {"GET /projects/:id": 1, "POST /projects/:id/variables": 2}
+        assert len(fake_gitlab.variables()) == 10
+        # Finished journals are cleaned up
+        assert journal_file not in os.listdir(journal_dir())
+
+    def test_changed_env_file_is_diffed_afresh(self, fake_gitlab, tmp_path, caplog):
+        fake_gitlab.reset(fail_keys=["B"])
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\nB=2\n")
+        _write(fake_gitlab, env_file)
+
+        env_file.write_text("A=1\nB=3\n")
+        fake_gitlab.reset(fake_gitlab.variables())
+        with caplog.at_level("INFO"):
+            result = _write(fake_gitlab, env_file, "--resume")
+
+        assert result.exit_code == 0, result.output
+        assert "Resuming" not in caplog.text
+        assert fake_gitlab.stats()["by_route"] == {
+            "GET /projects/:id": 1,
+            "GET /projects/:id/variables": 1,
+            "POST /projects/:id/variables": 1,
+        }
+
+    def test_successful_run_leaves_no_journal(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset()
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+
+        result = _write(fake_gitlab, env_file)
+
+        assert result.exit_code == 0, result.output
+        assert not os.path.exists(journal_dir()) or not os.listdir(journal_dir())
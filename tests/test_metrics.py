@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from populate_secrets_gitlab.metrics import (
+    RequestMetrics,
+    endpoint_template,
+    format_summary,
+    percentile,
+    request_phase,
+)
+
+from .fake_gitlab import invoke
+
+
+class TestClassification:
+    @pytest.mark.parametrize("url, endpoint", [
+        ("https://gitlab.example.com/api/v4/projects/group%2Fproject", "/projects/:id"),
+        ("https://gitlab.example.com/api/v4/projects/12/variables?page=3&per_page=100", "/projects/:id/variables"),
+        ("https://gitlab.example.com/api/v4/projects/12/variables/API_KEY?filter%5Benvironment_scope%5D=uat",
+         "/projects/:id/variables/:key"),
+        ("https://gitlab.example.com/api/v4/groups/7/variables", "/groups/:id/variables"),
+    ])
+    def test_endpoint_template(self, url, endpoint):
+        assert endpoint_template(url) == endpoint
+
+    @pytest.mark.parametrize("method, endpoint, phase", [
+        ("GET", "/projects/:id", "lookup"),
+        ("GET", "/projects/:id/variables", "list"),
+        ("POST", "/projects/:id/variables", "write"),
+        ("PUT", "/projects/:id/variables/:key", "write"),
+        ("DELETE", "/projects/:id/variables/:key", "delete"),
+        ("GET", "/user", "other"),
+    ])
+    def test_request_phase(self, method, endpoint, phase):
+        assert request_phase(method, endpoint) == phase
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([3.0], 95) == 3.0
+
+
+class TestSummary:
+    def test_groups_requests_by_phase(self):
+        metrics = RequestMetrics()
+        metrics.record("GET", "https://h/api/v4/projects/1", 200, 0.010, 0, 100)
+        for i in range(1, 11):
+            metrics.record("GET", f"https://h/api/v4/projects/1/variables?page={i}", 200, i / 100, 0, 1000)
+        metrics.record("POST", "https://h/api/v4/projects/1/variables", 400, 0.05, 2, 10)
+
+        summary = metrics.summary()
+
+        assert summary["requests"] == 12
+        assert summary["retries"] == 2
+        assert summary["bytes"] == 10110
+        assert summary["phases"]["list"]["p50"] == 0.05
+        assert summary["phases"]["list"]["max"] == 0.1
+        assert summary["phases"]["write"]["errors"] == 1
+        assert summary["endpoints"] == {
+            "GET /projects/:id": 1,
+            "GET /projects/:id/variables": 10,
+            "POST /projects/:id/variables": 1,
+        }
+        assert "list" in format_summary(summary)
+
+
+class TestCommandMetrics:
+    def test_write_reports_timings_and_json(self, fake_gitlab, tmp_path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\nB=2\n")
+        metrics_path = tmp_path / "metrics.json"
+        fake_gitlab.reset()
+
+        result = invoke(
+            "write", "--env-file", str(env_file), "--environment", "uat",
+            "--gitlab-host", fake_gitlab.url, "--project", "group/project",
+            "--timings", "--metrics-json", str(metrics_path),
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "4 request(s)" in result.output
+        data = json.loads(metrics_path.read_text())
+        assert data["endpoints"] == {
+            "GET /projects/:id": 1,
+            "GET /projects/:id/variables": 1,
+            "POST /projects/:id/variables": 2,
+        }
+        assert [r["phase"] for r in data["records"]].count("write") == 2
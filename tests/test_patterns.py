@@ -0,0 +1,107 @@
+import pytest
+
+from populate_secrets_gitlab.patterns import (
+    DEFAULT_MASK_PATTERNS,
+    Matcher,
+    PatternError,
+    selected,
+)
+
+
+class TestMatcher:
+    def test_literal(self):
+        matcher = Matcher(["NODE_ENV"])
+
+        assert "NODE_ENV" in matcher
+        assert "NODE_ENV_X" not in matcher
+
+    def test_glob_matches_whole_key(self):
+        matcher = Matcher(["AWS_*"])
+
+        assert "AWS_ACCESS_KEY_ID" in matcher
+        assert "MY_AWS_KEY" not in matcher
+
+    def test_glob_is_case_sensitive(self):
+        assert "aws_key" not in Matcher(["AWS_*"])
+
+    def test_regex(self):
+        matcher = Matcher(["re:.*_PASSWORD$"])
+
+        assert "DB_PASSWORD" in matcher
+        assert "DB_PASSWORD_HINT" not in matcher
+
+    def test_mixed_patterns(self):
+        matcher = Matcher(["NODE_ENV", "AWS_*", "re:DB_(HOST|PORT)"])
+
+        assert [key in matcher for key in ("NODE_ENV", "AWS_REGION", "DB_PORT", "DB_USER")] == [
+            True, True, True, False,
+        ]
+        assert matcher.literals == {"NODE_ENV"}
+
+    def test_many_literals_stay_in_the_set(self):
+        matcher = Matcher(f"KEY_{i}" for i in range(5000))
+
+        assert "KEY_4999" in matcher
+        assert matcher._regex is None
+
+    def test_regex_with_inline_flags(self):
+        matcher = Matcher(["AWS_*", "re:(?i).*_password$"])
+
+        assert "db_Password" in matcher
+        assert "AWS_REGION" in matcher
+        assert "aws_region" not in matcher
+
+    def test_backreferences_keep_their_group_numbers(self):
+        matcher = Matcher(["re:(A)\\1", "re:(B)\\1"])
+
+        assert "AA" in matcher
+        assert "BB" in matcher
+        assert "AB" not in matcher
+
+    def test_repeated_group_names(self):
+        matcher = Matcher(["re:(?P<name>A)_(?P=name)", "re:(?P<name>B)+"])
+
+        assert "A_A" in matcher
+        assert "BBB" in matcher
+        assert "A_B" not in matcher
+
+    def test_invalid_regex(self):
+        with pytest.raises(PatternError, match="Invalid regular expression 're:\\(unclosed'"):
+            Matcher(["re:(unclosed"])
+
+    def test_from_csv_skips_blanks(self):
+        matcher = Matcher.from_csv("A, B ,,")
+
+        assert list(matcher) == ["A", "B"]
+        assert len(Matcher.from_csv("")) == 0
+
+    def test_from_file(self, tmp_path):
+        rules = tmp_path / "mask-rules"
+        rules.write_text("# Secrets\n*_PASSWORD\n\nre:.*_(KEY|TOKEN)  # API credentials\nDSN\n")
+
+        matcher = Matcher.from_file(rules)
+
+        assert list(matcher) == ["*_PASSWORD", "re:.*_(KEY|TOKEN)", "DSN"]
+        assert "API_TOKEN" in matcher
+        assert "DSN" in matcher
+        assert "APP_NAME" not in matcher
+
+    def test_default_mask_patterns_match_substrings(self):
+        matcher = Matcher(DEFAULT_MASK_PATTERNS)
+
+        assert "MY_SECRET_VALUE" in matcher
+        assert "KEYRING" in matcher
+        assert "APP_NAME" not in matcher
+
+
+class TestSelected:
+    def test_no_filters(self):
+        assert selected("ANY", Matcher(), Matcher())
+
+    def test_include_and_exclude(self):
+        include = Matcher(["AWS_*"])
+        exclude = Matcher(["AWS_SECRET_*"])
+
+        assert selected("AWS_REGION", include, exclude)
+        assert not selected("AWS_SECRET_ACCESS_KEY", include, exclude)
+        assert not selected("NODE_ENV", include, exclude)
@@ -0,0 +1,128 @@
+import json
+import os
+import stat
+
+import pytest
+
+from .fake_gitlab import invoke
+
+ROW = ("environment_scope", "key", "value")
+
+
+def _plan(fake, env_file, plan_file, *extra_args):
+    return invoke(
+        "write", "--env-file", str(env_file), "--environment", "uat",
+        "--gitlab-host", fake.url, "--project", "group/project", "--plan-out", str(plan_file), *extra_args,
+    )
+
+
+REMOTE = [
+    {"key": "SAME", "value": "1", "environment_scope": "uat"},
+    {"key": "CHANGED", "value": "old", "environment_scope": "uat"},
+    {"key": "STALE", "value": "1", "environment_scope": "uat"},
+    {"key": "OTHER", "value": "1", "environment_scope": "prod"},
+]
+
+
+@pytest.fixture
+def env_file(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SAME=1\nCHANGED=new\nNEW=2\n")
+    return env_file
+
+
+class TestPlanOut:
+    def test_plan_writes_nothing(self, fake_gitlab, env_file, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        plan_file = tmp_path / "plan.json"
+
+        result = _plan(fake_gitlab, env_file, plan_file)
+
+        assert result.exit_code == 0, result.output
+        assert "+ [uat] NEW" in result.output
+        assert "~ [uat] CHANGED" in result.output
+        assert "1 to create, 1 to update, 0 to delete, 1 unchanged" in result.output
+        assert fake_gitlab.rows(*ROW) == sorted(tuple(v[field] for field in ROW) for v in REMOTE)
+        assert not any(route.startswith(("POST", "PUT")) for route in fake_gitlab.stats()["by_route"])
+
+        plan = json.loads(plan_file.read_text())
+        assert [(c["action"], c["key"]) for c in plan["projects"][0]["changes"]] == [
+            ("update", "CHANGED"), ("create", "NEW"),
+        ]
+
+    def test_plan_file_is_private(self, fake_gitlab, env_file, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        plan_file = tmp_path / "plan.json"
+
+        _plan(fake_gitlab, env_file, plan_file)
+
+        assert stat.S_IMODE(os.stat(plan_file).st_mode) == 0o600
+
+    def test_plan_includes_prune_deletions(self, fake_gitlab, env_file, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        plan_file = tmp_path / "plan.json"
+
+        result = _plan(fake_gitlab, env_file, plan_file, "--prune")
+
+        assert result.exit_code == 0, result.output
+        assert "- [uat] STALE" in result.output
+        assert ("uat", "STALE", "1") in fake_gitlab.rows(*ROW)
+
+    def test_rejects_async_engine(self, fake_gitlab, env_file, tmp_path):
+        result = _plan(fake_gitlab, env_file, tmp_path / "plan.json", "--engine", "async")
+
+        assert result.exit_code == 2
+        assert "--plan-out can't be combined" in result.output
+
+
+class TestApply:
+    def test_applies_exactly_the_plan(self, fake_gitlab, env_file, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        plan_file = tmp_path / "plan.json"
+        _plan(fake_gitlab, env_file, plan_file, "--prune")
+        fake_gitlab.reset(REMOTE)
+
+        result = invoke("apply", str(plan_file), "--concurrency", "4")
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows(*ROW) == [
+            ("prod", "OTHER", "1"), ("uat", "CHANGED", "new"), ("uat", "NEW", "2"), ("uat", "SAME", "1"),
+        ]
+        by_route = fake_gitlab.stats()["by_route"]
+        # One listing for the drift check, then only the planned writes
+        assert by_route["GET /projects/:id/variables"] == 1
+        assert by_route["POST /projects/:id/variables"] == 1
+        assert by_route["PUT /projects/:id/variables/:key"] == 1
+        assert by_route["DELETE /projects/:id/variables/:key"] == 1
+        assert "GET /projects/:id" not in by_route
+
+    def test_refuses_when_remote_drifted(self, fake_gitlab, env_file, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        plan_file = tmp_path / "plan.json"
+        _plan(fake_gitlab, env_file, plan_file)
+        fake_gitlab.reset([*REMOTE[:-2], {"key": "STALE", "value": "2", "environment_scope": "uat"}, REMOTE[-1]])
+
+        result = invoke("apply", str(plan_file))
+
+        assert result.exit_code == 1
+        assert "Variables changed since the plan was made in: group/project" in result.output
+        assert not any(route.startswith(("POST", "PUT")) for route in fake_gitlab.stats()["by_route"])
+
+    def test_changes_in_other_scopes_are_not_drift(self, fake_gitlab, env_file, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        plan_file = tmp_path / "plan.json"
+        _plan(fake_gitlab, env_file, plan_file)
+        fake_gitlab.reset([*REMOTE[:-1], {"key": "OTHER", "value": "2", "environment_scope": "prod"}])
+
+        result = invoke("apply", str(plan_file))
+
+        assert result.exit_code == 0, result.output
+
+    def test_rejects_invalid_plan_file(self, tmp_path):
+        plan_file = tmp_path / "plan.json"
+        plan_file.write_text("not json")
+
+        result = invoke("apply", str(plan_file))
+
+        assert result.exit_code == 1
+        assert "Not a valid plan file" in result.output
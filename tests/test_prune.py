@@ -0,0 +1,62 @@
+
+import pytest
+
+from .fake_gitlab import invoke
+
+
+def _sync(fake, env_file, *extra_args):
+    return invoke(
+        "sync", "--env-file", str(env_file), "--environment", "uat",
+        "--gitlab-host", fake.url, "--project", "group/project", *extra_args,
+    )
+
+
+REMOTE = [
+    {"key": "KEEP", "value": "1", "environment_scope": "uat"},
+    {"key": "STALE", "value": "1", "environment_scope": "uat"},
+    {"key": "STALE_TOO", "value": "1", "environment_scope": "uat"},
+    {"key": "PROTECTED", "value": "1", "environment_scope": "uat"},
+    {"key": "STALE", "value": "1", "environment_scope": "prod"},
+    {"key": "GLOBAL", "value": "1", "environment_scope": "*"},
+]
+
+
+class TestPrune:
+    @pytest.mark.parametrize("engine", ["gitlab", "async"])
+    def test_deletes_remote_only_keys_in_target_scope(self, fake_gitlab, tmp_path, engine):
+        fake_gitlab.reset(REMOTE)
+        env_file = tmp_path / ".env"
+        env_file.write_text("KEEP=1\nNEW=2\n")
+
+        result = _sync(fake_gitlab, env_file, "--prune", "--exclude", "PROTECTED", "--engine", engine)
+
+        assert result.exit_code == 0, result.output
+        assert "Pruning 2 variable(s) missing from the .env file:" in result.output
+        assert "[uat] STALE_TOO" in result.output
+        assert fake_gitlab.rows("environment_scope", "key") == [
+            ("*", "GLOBAL"), ("prod", "STALE"), ("uat", "KEEP"), ("uat", "NEW"), ("uat", "PROTECTED"),
+        ]
+        assert fake_gitlab.stats()["by_route"]["DELETE /projects/:id/variables/:key"] == 2
+
+    def test_include_limits_deletions(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        env_file = tmp_path / ".env"
+        env_file.write_text("KEEP=1\n")
+
+        result = _sync(fake_gitlab, env_file, "--prune", "--include", "KEEP,STALE")
+
+        assert result.exit_code == 0, result.output
+        assert ("uat", "STALE") not in fake_gitlab.rows("environment_scope", "key")
+        assert ("uat", "STALE_TOO") in fake_gitlab.rows("environment_scope", "key")
+        assert ("uat", "PROTECTED") in fake_gitlab.rows("environment_scope", "key")
+
+    def test_without_prune_nothing_is_deleted(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset(REMOTE)
+        env_file = tmp_path / ".env"
+        env_file.write_text("KEEP=1\n")
+
+        result = _sync(fake_gitlab, env_file)
+
+        assert result.exit_code == 0, result.output
+        assert len(fake_gitlab.rows("environment_scope", "key")) == len(REMOTE)
+        assert "Pruning" not in result.output
@@ -0,0 +1,136 @@
+import time
+from unittest.mock import patch
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from populate_secrets_gitlab.metrics import RequestMetrics
+from populate_secrets_gitlab.rate_limit import RateLimitedSession, RateLimiter, TokenBucket
+
+
+class _ScriptedAdapter(BaseAdapter):
+    """Returns canned (status, headers) responses in order."""
+
+    def __init__(self, script):
+        super().__init__()
+        self.script = list(script)
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        status, headers = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response.request = request
+        response._content = b"{}"
+        return response
+
+    def close(self):
+        pass
+
+
+def _session(script, **limiter_kwargs):
+    session = RateLimitedSession(RateLimiter(**limiter_kwargs))
+    adapter = _ScriptedAdapter(script)
+    session.mount("https://", adapter)
+    return session, adapter
+
+
+class TestTokenBucket:
+    def test_unlimited_never_waits(self):
+        bucket = TokenBucket()
+        assert all(bucket.reserve() == 0 for _ in range(100))
+
+    def test_waits_queue_up_once_tokens_run_out(self):
+        bucket = TokenBucket(rate=10, capacity=1)
+        assert bucket.reserve() == 0
+        assert 0.09 < bucket.reserve() <= 0.1
+        assert 0.19 < bucket.reserve() <= 0.2
+
+
+class TestRateLimiter:
+    def test_slows_down_when_budget_nearly_spent(self):
+        limiter = RateLimiter()
+        limiter.observe({
+            "RateLimit-Limit": "600",
+            "RateLimit-Remaining": "10",
+            "RateLimit-Reset": str(time.time() + 20),
+        })
+        assert limiter.bucket.rate is not None
+        assert limiter.bucket.rate <= 0.6
+
+    def test_stays_unlimited_with_plenty_of_budget(self):
+        limiter = RateLimiter()
+        limiter.observe({
+            "RateLimit-Limit": "600",
+            "RateLimit-Remaining": "500",
+            "RateLimit-Reset": str(time.time() + 20),
+        })
+        assert limiter.bucket.rate is None
+
+    def test_retry_after_seconds_is_honoured(self):
+        assert RateLimiter().retry_delay({"Retry-After": "7"}, 0) == 7
+
+    def test_backoff_is_jittered_and_capped(self):
+        limiter = RateLimiter(backoff_base=1, backoff_max=5)
+        assert all(0 <= limiter.retry_delay({}, 10) <= 5 for _ in range(50))
+
+    def test_post_not_retried_on_plain_500(self):
+        limiter = RateLimiter()
+        assert not limiter.should_retry("POST", 500, 0)
+        assert limiter.should_retry("PUT", 500, 0)
+        assert limiter.should_retry("POST", 429, 0)
+
+    @pytest.mark.parametrize("status", [502, 503, 504])
+    def test_post_not_retried_on_gateway_errors(self, status):
+        limiter = RateLimiter()
+        assert not limiter.should_retry("POST", status, 0, {})
+        assert limiter.should_retry("GET", status, 0, {})
+
+    def test_post_retried_on_503_with_retry_after(self):
+        assert RateLimiter().should_retry("POST", 503, 0, {"Retry-After": "1"})
+
+
+class TestRateLimitedSession:
+    @patch("populate_secrets_gitlab.rate_limit.time.sleep")
+    def test_retries_429_until_success(self, sleep):
+        session, adapter = _session([(429, {"Retry-After": "2"}), (429, {"Retry-After": "2"}), (200, {})])
+
+        response = session.get("https://gitlab.example.com/api/v4/projects/1")
+
+        assert response.status_code == 200
+        assert adapter.calls == 3
+        assert 2 in [c.args[0] for c in sleep.call_args_list]
+
+    @patch("populate_secrets_gitlab.rate_limit.time.sleep")
+    def test_gives_up_after_max_retries(self, sleep):
+        session, adapter = _session([(503, {})], max_retries=2)
+
+        response = session.get("https://gitlab.example.com/api/v4/projects/1")
+
+        assert response.status_code == 503
+        assert adapter.calls == 3
+
+    @patch("populate_secrets_gitlab.rate_limit.time.sleep")
+    def test_client_errors_are_not_retried(self, sleep):
+        session, adapter = _session([(404, {})])
+
+        assert session.get("https://gitlab.example.com/x").status_code == 404
+        assert adapter.calls == 1
+
+    @patch("populate_secrets_gitlab.rate_limit.time.sleep")
+    def test_records_one_metric_per_logical_request(self, sleep):
+        session, _ = _session([(429, {"Retry-After": "1"}), (200, {})])
+        session.metrics = RequestMetrics()
+
+        session.get("https://gitlab.example.com/api/v4/projects/group%2Fproject/variables?page=2")
+
+        [record] = session.metrics.records
+        assert record.method == "GET"
+        assert record.endpoint == "/projects/:id/variables"
+        assert record.phase == "list"
+        assert record.status == 200
+        assert record.retries == 1
+        assert record.bytes == 2
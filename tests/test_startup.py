@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = {"gitlab", "requests", "dotenv", "httpx"}
+
+
+def _imported_modules(*args, env=None):
+    """Run the CLI under `-X importtime` and return ``(result, top-level modules imported)``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "populate_secrets_gitlab", *args],
+        check=False,
+        capture_output=True,
+        text=True,
+        env={**{k: v for k, v in os.environ.items() if k != "GITLAB_TOKEN"}, **(env or {})},
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            name = line.rsplit("|", 1)[1].strip()
+            modules.add(name.split(".")[0])
+    return result, modules
+
+
+class TestStartup:
+    @pytest.mark.parametrize("args", [
+        ["--help"],
+        ["write", "--help"],
+        ["list", "--help"],
+    ])
+    def test_help_does_not_load_gitlab(self, args):
+        result, modules = _imported_modules(*args)
+
+        assert result.returncode == 0, result.stderr
+        assert "populate_secrets_gitlab" in modules
+        assert not modules & HEAVY_MODULES
+
+    @pytest.mark.parametrize("args, env", [
+        # Missing required option, rejected by click
+        (["list", "--environment", "uat"], {}),
+        # Missing token, rejected by the command
+        (["get", "--environment", "uat", "--gitlab-host", "h", "--project", "p"], {}),
+        # Neither --env-file nor --env-dir, rejected before any .env file is read
+        (["write", "--gitlab-host", "h", "--project", "p"], {"GITLAB_TOKEN": "t"}),
+    ])
+    def test_argument_errors_do_not_load_gitlab(self, args, env):
+        result, modules = _imported_modules(*args, env=env)
+
+        assert result.returncode != 0
+        assert not modules & HEAVY_MODULES
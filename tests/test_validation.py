@@ -0,0 +1,56 @@
+import pytest
+
+from populate_secrets_gitlab.validation import Violation, check, validate
+from populate_secrets_gitlab.variables import Variable
+
+
+class TestCheck:
+    @pytest.mark.parametrize("key, value, masked", [
+        ("MY_VAR", "anything goes\nhere", False),
+        ("API_TOKEN", "abcdEFGH1234+/=", True),
+        ("API_TOKEN", "user@example.com:pass~1.2-3_4", True),
+        ("X", "", False),
+    ])
+    def test_valid(self, key, value, masked):
+        assert check(key, value, masked) == []
+
+    @pytest.mark.parametrize("key, value, masked, reason", [
+        ("MY-VAR", "1", False, "key may only contain letters, digits and _"),
+        ("K" * 256, "1", False, "key is longer than 255 characters"),
+        ("MY_VAR", None, False, "has no value"),
+        ("MY_VAR", "x" * 10_001, False, "value is longer than 10000 characters"),
+        ("API_TOKEN", "short", True, "masked value is shorter than 8 characters"),
+        ("API_TOKEN", "line-one\nline-two", True, "masked value spans more than one line"),
+        ("API_TOKEN", "has spaces in it", True, "masked value contains characters other than Base64 and @:.~"),
+    ])
+    def test_invalid(self, key, value, masked, reason):
+        assert check(key, value, masked) == [reason]
+
+    def test_reports_every_problem(self):
+        assert check("BAD KEY", "a b", True) == [
+            "key may only contain letters, digits and _",
+            "masked value is shorter than 8 characters",
+            "masked value contains characters other than Base64 and @:.~",
+        ]
+
+
+class TestValidate:
+    def test_splits_valid_and_invalid(self):
+        pending = [
+            ("uat", "GOOD", "1", False, None),
+            ("uat", "API_TOKEN", "short", True, None),
+            ("uat", "MASKED", "short", False, Variable("MASKED", "long-enough", "uat", masked=True)),
+        ]
+
+        valid, violations = validate(pending)
+
+        assert valid == pending[:1]
+        assert violations == [
+            Violation("uat", "API_TOKEN", "masked value is shorter than 8 characters"),
+            Violation("uat", "MASKED", "masked value is shorter than 8 characters"),
+        ]
+
+    def test_keeps_extra_fields(self):
+        pending = [("uat", "KEY", "value", False, None, True)]
+
+        assert validate(pending) == (pending, [])
@@ -0,0 +1,61 @@
+import tracemalloc
+
+import gitlab
+from gitlab.v4.objects import ProjectVariable
+
+from populate_secrets_gitlab.variables import Variable, iter_variables
+
+
+def _json(i):
+    return {
+        "variable_type": "env_var",
+        "key": f"VARIABLE_{i}",
+        "value": f"value-{i}",
+        "protected": False,
+        "masked": i % 2 == 0,
+        "raw": False,
+        "environment_scope": "uat",
+        "description": None,
+    }
+
+
+def _peak_memory(build):
+    # Payloads are built outside the measurement so only the records are counted
+    payloads = [_json(i) for i in range(10_000)]
+    tracemalloc.start()
+    records = build(payloads)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(records) == 10_000
+    return current
+
+
+class TestVariable:
+    def test_from_json_keeps_only_used_fields(self):
+        v = Variable.from_json(_json(0))
+        assert v == Variable("VARIABLE_0", "value-0", "uat", True, False)
+
+    def test_iter_variables_requests_raw_pages(self):
+        class Client:
+            def http_list(self, path, **kwargs):
+                self.call = (path, kwargs)
+                return iter([_json(1), _json(2)])
+
+        client = Client()
+        keys = [v.key for v in iter_variables(client, 7)]
+
+        assert keys == ["VARIABLE_1", "VARIABLE_2"]
+        assert client.call == ("/projects/7/variables", {"iterator": True, "per_page": 100})
+
+
+class TestMemoryBenchmark:
+    def test_records_use_far_less_memory_than_rest_objects(self):
+        gl = gitlab.Gitlab("https://gitlab.example.com")
+        manager = gl.projects.get(1, lazy=True).variables
+
+        rest_objects = _peak_memory(
+            lambda payloads: [ProjectVariable(manager, p, created_from_list=True) for p in payloads]
+        )
+        records = _peak_memory(lambda payloads: [Variable.from_json(p) for p in payloads])
+
+        assert records * 3 < rest_objects
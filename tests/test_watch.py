@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from populate_secrets_gitlab import app, watch
+
+from .fake_gitlab import invoke
+
+ROW = ("environment_scope", "key", "value")
+
+
+class ScriptedWatcher:
+    """Answers `wait` from a list of results, then stops the generator under test."""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.timeouts = []
+
+    def wait(self, timeout=None):
+        self.timeouts.append(timeout)
+        if not self.results:
+            raise KeyboardInterrupt
+        return self.results.pop(0)
+
+
+class TestChanges:
+    def test_burst_of_changes_yields_once(self):
+        watcher = ScriptedWatcher([True, True, True, False])
+        changes = watch.changes(watcher, 0.5)
+
+        next(changes)
+
+        assert watcher.timeouts == [None, 0.5, 0.5, 0.5]
+
+    def test_unrelated_wakeups_are_ignored(self):
+        watcher = ScriptedWatcher([False, True, False, True, False])
+        changes = watch.changes(watcher, 0.1)
+
+        next(changes)
+        next(changes)
+
+        assert watcher.results == []
+
+
+@pytest.mark.parametrize("make_watcher", [
+    pytest.param(watch.file_watcher, id="default"),
+    pytest.param(lambda paths: watch.PollingWatcher(paths, interval=0.01), id="polling"),
+])
+class TestFileWatcher:
+    def test_detects_replace_by_rename(self, tmp_path, make_watcher):
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+        watcher = make_watcher([str(env_file)])
+        try:
+            time.sleep(0.02)
+            tmp_file = tmp_path / ".env.swp"
+            tmp_file.write_text("A=22\n")
+            os.replace(tmp_file, env_file)
+
+            assert watcher.wait(5)
+        finally:
+            watcher.close()
+
+    def test_times_out_without_changes(self, tmp_path, make_watcher):
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+        (tmp_path / "unrelated").write_text("")
+        watcher = make_watcher([str(env_file)])
+        try:
+            assert not watcher.wait(0.05)
+        finally:
+            watcher.close()
+
+    def test_wakes_a_blocked_wait(self, tmp_path, make_watcher):
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+        watcher = make_watcher([str(env_file)])
+        try:
+            timer = threading.Timer(0.05, lambda: env_file.write_text("A=2\n"))
+            timer.start()
+            assert watcher.wait(5)
+            timer.join()
+        finally:
+            watcher.close()
+
+
+def _saves(env_file, *contents):
+    """Stands in for `watch.changes`, saving the .env file before each batch."""
+    def changes(watcher, debounce):
+        for content in contents:
+            env_file.write_text(content)
+            yield
+    return changes
+
+
+def _watch(fake, env_file, *extra_args):
+    return invoke(
+        "write", "--env-file", str(env_file), "--environment", "uat",
+        "--gitlab-host", fake.url, "--project", "group/project", "--watch", *extra_args,
+    )
+
+
+class TestWatch:
+    def test_pushes_only_changed_keys(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset([{"key": "A", "value": "1", "environment_scope": "uat"}])
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\nB=2\n")
+
+        with patch.object(watch, "changes", _saves(env_file, "A=1\nB=3\n", "A=1\nB=3\nC=4\n", "A=1\nB=3\nC=4\n")):
+            result = _watch(fake_gitlab, env_file)
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows(*ROW) == [("uat", "A", "1"), ("uat", "B", "3"), ("uat", "C", "4")]
+        by_route = fake_gitlab.stats()["by_route"]
+        # Listed once at startup; later batches diff against what was pushed
+        assert by_route["GET /projects/:id/variables"] == 1
+        assert by_route["POST /projects/:id/variables"] == 2
+        assert by_route["PUT /projects/:id/variables/:key"] == 1
+
+    def test_prune_deletes_removed_keys(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset([{"key": "A", "value": "1", "environment_scope": "uat"}])
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\nB=2\n")
+
+        with patch.object(watch, "changes", _saves(env_file, "B=2\n")):
+            result = _watch(fake_gitlab, env_file, "--prune")
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows(*ROW) == [("uat", "B", "2")]
+
+    def test_failed_keys_are_retried_on_next_change(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset([], fail_keys=["B"])
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\nB=2\n")
+
+        def changes(watcher, debounce):
+            fake_gitlab.configure(fail_keys=[])
+            env_file.write_text("A=1\nB=2\nC=3\n")
+            yield
+
+        with patch.object(watch, "changes", changes):
+            result = _watch(fake_gitlab, env_file)
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows(*ROW) == [("uat", "A", "1"), ("uat", "B", "2"), ("uat", "C", "3")]
+
+    def test_save_during_first_push_is_picked_up(self, fake_gitlab, tmp_path):
+        fake_gitlab.reset([])
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+        push_changes = app._push_changes
+
+        def save_then_push(*args, **kwargs):
+            if not env_file.read_text().startswith("B"):
+                time.sleep(0.02)
+                env_file.write_text("B=2\n")
+            return push_changes(*args, **kwargs)
+
+        def changes(watcher, debounce):
+            # Only the save made while the first push ran can wake this
+            if watcher.wait(0.5):
+                yield
+
+        with patch.object(app, "_push_changes", save_then_push), \
+                patch.object(watch, "file_watcher", lambda paths: watch.PollingWatcher(paths, interval=0.01)), \
+                patch.object(watch, "changes", changes):
+            result = _watch(fake_gitlab, env_file)
+
+        assert result.exit_code == 0, result.output
+        assert fake_gitlab.rows(*ROW) == [("uat", "A", "1"), ("uat", "B", "2")]
+
+    def test_rejects_async_engine(self, fake_gitlab, tmp_path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("A=1\n")
+
+        result = _watch(fake_gitlab, env_file, "--engine", "async")
+
+        assert result.exit_code == 2
+        assert "--watch can't be combined" in result.output